@@ -1,6 +1,7 @@
+# Run from 05_src: python -m 00_standalone_examples.04_vector_similarity
 import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+
+from utils.lexical_search import LexicalIndex
 
 documents = [
     "Freedom consists not in doing what we like, but in having the right to do what we ought.",
@@ -14,11 +15,12 @@ documents = [
     "Life without liberty is like a body without spirit."
 ]
 
-vectorizer = TfidfVectorizer()
-X = vectorizer.fit_transform(documents)
-cosine_similarities = cosine_similarity(X)
-
-simlarities_df = pd.DataFrame(cosine_similarities)
-
+# TF-IDF cosine similarity of the first document to every document. The
+# index only scores documents that share a term with the query, instead of
+# computing the full n x n cosine_similarity matrix
+index = LexicalIndex().fit(documents)
+similarities = pd.Series(0.0, index=range(len(documents)))
+for doc_id, score in index.search(documents[0], k=len(documents)):
+    similarities[doc_id] = score
 
-simlarities_df.loc[0,:].plot(kind='bar')
\ No newline at end of file
+similarities.plot(kind='bar')
@@ -1,36 +1,31 @@
-from animals_chat.main import get_animals_chat_agent
-from langchain_core.messages import HumanMessage, AIMessage
+from animals_chat.main import get_animals_chat_agent, thread_input
+from animals_chat.checkpoint import get_checkpointer
 import gradio as gr
 from dotenv import load_dotenv
 import os
 
 from utils.logger import get_logger
+from utils.tracing import serve_stats, span
 
 _logs = get_logger(__name__)
 
-llm = get_animals_chat_agent()
-
 load_dotenv('.secrets')
 
-def animals_chat(message: str, history: list[dict]) -> str:
-    langchain_messages = []
-    n = 0
-    _logs.debug(f"History: {history}")
-    for msg in history:
-        if msg['role'] == 'user':
-            langchain_messages.append(HumanMessage(content=msg['content']))
-        elif msg['role'] == 'assistant':
-            langchain_messages.append(AIMessage(content=msg['content']))
-            n += 1
-    langchain_messages.append(HumanMessage(content=message))
-
-    state = {
-        "messages": langchain_messages,
-        "llm_calls": n
-    }
-
-    response = llm.invoke(state)
-    return response['messages'][len(response['messages']) - 1].content
+# Conversations, tool results included, are stored per Gradio session
+checkpointer = get_checkpointer()
+llm = get_animals_chat_agent(checkpointer)
+
+def animals_chat(message: str, history: list[dict], request: gr.Request = None) -> str:
+    thread_id = request.session_hash if request is not None and request.session_hash else "default"
+    with span("animals_chat", kind="turn", thread_id=thread_id):
+        _logs.debug("Session %s: %s", thread_id, message)
+
+        config = {"configurable": {"thread_id": thread_id}}
+        # Follows Gradio's retry, undo and edit, which change the history
+        state = thread_input(llm, config, history, message)
+        # Save the session once per turn rather than after every graph step
+        response = llm.invoke(state, config, durability="exit")
+        return response['messages'][-1].content
 
 chat = gr.ChatInterface(
     fn=animals_chat,
@@ -39,4 +34,5 @@ chat = gr.ChatInterface(
 
 if __name__ == "__main__":
     _logs.info('Starting Animals Chat App...')
+    serve_stats()
     chat.launch()
@@ -0,0 +1,356 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict, defaultdict
+
+from dotenv import load_dotenv
+from langgraph.checkpoint.base import CheckpointTuple, copy_checkpoint, get_checkpoint_id, get_checkpoint_metadata
+from langgraph.checkpoint.memory import InMemorySaver
+
+from utils.logger import get_logger
+
+_logs = get_logger(__name__)
+
+load_dotenv()
+
+# "memory" keeps sessions for the life of the process, "file" also stores them in SQLite
+ANIMALS_CHECKPOINTER = os.getenv("ANIMALS_CHECKPOINTER", "memory")
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", "./checkpoints/")
+# Checkpoints kept per session; older ones are only needed for time travel
+CHECKPOINT_KEEP_LAST = int(os.getenv("CHECKPOINT_KEEP_LAST", "2"))
+# Sessions kept in memory; the least recently used one is dropped beyond that
+CHECKPOINT_MAX_SESSIONS = int(os.getenv("CHECKPOINT_MAX_SESSIONS", "1000"))
+
+
+class SessionSaver(InMemorySaver):
+    """
+    In-memory checkpointer that keeps only the latest checkpoints of each session.
+
+    LangGraph writes a checkpoint after every step, and each one stores the full
+    message list, so keeping them all grows quadratically with the conversation.
+    Older checkpoints, their pending writes and the blobs only they reference
+    are dropped after every put.
+
+    The latest checkpoint of each session is also kept deserialized, so that
+    starting a turn does not decode the whole message list again.
+
+    At most max_sessions sessions are kept; beyond that the least recently
+    used one is forgotten, and the app rebuilds it from the Gradio history
+    if it comes back.
+
+    This works on the storage, writes and blobs dicts of InMemorySaver, which
+    are not a public API: pyproject.toml pins langgraph-checkpoint to the
+    minor version whose layout this code expects.
+    """
+
+    def __init__(self, keep_last: int = CHECKPOINT_KEEP_LAST, max_sessions: int = CHECKPOINT_MAX_SESSIONS, **kwargs):
+        super().__init__(**kwargs)
+        if keep_last < 1:
+            raise ValueError("keep_last must be at least 1")
+        if max_sessions < 1:
+            raise ValueError("max_sessions must be at least 1")
+        self.keep_last = keep_last
+        self.max_sessions = max_sessions
+        # thread_id of every session in memory, least recently used first
+        self._sessions = OrderedDict()
+        # Blob keys per (thread_id, checkpoint_ns), so pruning never scans other sessions
+        self._blob_keys = defaultdict(set)
+        # (thread_id, checkpoint_ns) -> (checkpoint, metadata, parent_id) of the latest put
+        self._latest = {}
+        self._lock = threading.RLock()
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        with self._lock:
+            thread_id = config["configurable"]["thread_id"]
+            checkpoint_ns = config["configurable"]["checkpoint_ns"]
+            self._touch(thread_id)
+            result = super().put(config, checkpoint, metadata, new_versions)
+            self._blob_keys[(thread_id, checkpoint_ns)].update(
+                (thread_id, checkpoint_ns, k, v) for k, v in new_versions.items()
+            )
+            self._remember(config, checkpoint, metadata)
+            self._prune(thread_id, checkpoint_ns)
+            return result
+
+    def _remember(self, config, checkpoint, metadata):
+        configurable = config["configurable"]
+        self._latest[(configurable["thread_id"], configurable["checkpoint_ns"])] = (
+            copy_checkpoint(checkpoint),
+            get_checkpoint_metadata(config, metadata),
+            configurable.get("checkpoint_id"),
+        )
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        with self._lock:
+            self._touch(config["configurable"]["thread_id"])
+            super().put_writes(config, writes, task_id, task_path)
+
+    def get_tuple(self, config):
+        with self._lock:
+            self._touch(config["configurable"]["thread_id"])
+            latest = self._latest_tuple(config)
+            return latest if latest is not None else super().get_tuple(config)
+
+    def _latest_tuple(self, config):
+        """
+        Build the tuple of the latest checkpoint from the deserialized copy, or
+        return None when a specific or unknown checkpoint is asked for.
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        latest = self._latest.get((thread_id, checkpoint_ns))
+        checkpoints = self.storage.get(thread_id, {}).get(checkpoint_ns)
+        if latest is None or not checkpoints:
+            return None
+        checkpoint, metadata, parent_id = latest
+        checkpoint_id = get_checkpoint_id(config)
+        if checkpoint_id is not None and checkpoint_id != checkpoint["id"]:
+            return None
+        if checkpoint["id"] != max(checkpoints):
+            return None
+        writes = self.writes.get((thread_id, checkpoint_ns, checkpoint["id"]), {}).values()
+        return CheckpointTuple(
+            config={"configurable": {
+                "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"],
+            }},
+            # Copied because the graph updates the checkpoint it resumes from
+            checkpoint=copy_checkpoint(checkpoint),
+            metadata=dict(metadata),
+            pending_writes=[(task_id, c, self.serde.loads_typed(v)) for task_id, c, v, _ in writes],
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_id}}
+                if parent_id else None
+            ),
+        )
+
+    def _prune(self, thread_id: str, checkpoint_ns: str) -> tuple[list, list]:
+        """
+        Drop all but the keep_last newest checkpoints of a session.
+        Returns the dropped checkpoint ids and blob keys.
+        """
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.keep_last:
+            return [], []
+        # Checkpoint ids are time-ordered
+        ids = sorted(checkpoints)
+        dropped = ids[:-self.keep_last]
+        for checkpoint_id in dropped:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+
+        referenced = set()
+        for checkpoint, _, _ in checkpoints.values():
+            versions = self.serde.loads_typed(checkpoint)["channel_versions"]
+            referenced.update((thread_id, checkpoint_ns, k, v) for k, v in versions.items())
+        keys = self._blob_keys[(thread_id, checkpoint_ns)]
+        stale = [key for key in keys if key not in referenced]
+        for key in stale:
+            keys.discard(key)
+            self.blobs.pop(key, None)
+        return dropped, stale
+
+    def _touch(self, thread_id: str):
+        """
+        Mark a session as just used, and drop the least recently used ones
+        beyond max_sessions.
+        """
+        self._sessions[thread_id] = None
+        self._sessions.move_to_end(thread_id)
+        while len(self._sessions) > self.max_sessions:
+            oldest, _ = self._sessions.popitem(last=False)
+            _logs.debug(f"Dropping checkpoints of idle session {oldest} from memory")
+            self._evict(oldest)
+
+    def _evict(self, thread_id: str):
+        self._forget(thread_id)
+
+    def _forget(self, thread_id: str):
+        """
+        Drop everything held in memory for a session.
+        """
+        namespaces = self.storage.pop(thread_id, {})
+        for checkpoint_ns, checkpoints in namespaces.items():
+            self._latest.pop((thread_id, checkpoint_ns), None)
+            for checkpoint_id in checkpoints:
+                self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+            for key in self._blob_keys.pop((thread_id, checkpoint_ns), ()):
+                self.blobs.pop(key, None)
+
+    def delete_thread(self, thread_id: str) -> None:
+        """
+        Forget a session, e.g. when the user clears the chat.
+        """
+        with self._lock:
+            self._sessions.pop(thread_id, None)
+            self._forget(thread_id)
+
+
+class FileSessionSaver(SessionSaver):
+    """
+    SessionSaver that also writes every checkpoint through to SQLite, so
+    sessions survive a restart. Use one process per file: sessions are read
+    from the file once and then served from memory.
+
+    Only the rows a put adds are written, and a session is read back from the
+    file the first time it is used in this process, or again after it was
+    dropped from memory as the least recently used.
+    """
+
+    def __init__(self, name: str = "animals_chat", checkpoint_dir: str = CHECKPOINT_DIR, **kwargs):
+        super().__init__(**kwargs)
+        if not os.path.exists(checkpoint_dir):
+            os.makedirs(checkpoint_dir)
+        self.path = os.path.join(checkpoint_dir, f"{name}.sqlite")
+        self._local = threading.local()
+        self._loaded = set()
+
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints ("
+                "thread_id TEXT, checkpoint_ns TEXT, checkpoint_id TEXT, "
+                "checkpoint_type TEXT, checkpoint BLOB, metadata_type TEXT, metadata BLOB, parent_id TEXT, "
+                "PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS writes ("
+                "thread_id TEXT, checkpoint_ns TEXT, checkpoint_id TEXT, task_id TEXT, idx INTEGER, "
+                "channel TEXT, value_type TEXT, value BLOB, task_path TEXT, "
+                "PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                "thread_id TEXT, checkpoint_ns TEXT, channel TEXT, version TEXT, "
+                "value_type TEXT, value BLOB, "
+                "PRIMARY KEY (thread_id, checkpoint_ns, channel, version))"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections cannot be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _load(self, thread_id: str):
+        """
+        Read a session from the file into memory the first time it is used.
+        """
+        if thread_id in self._loaded:
+            return
+        conn = self._connection()
+        for ns, checkpoint_id, ctype, checkpoint, mtype, metadata, parent_id in conn.execute(
+            "SELECT checkpoint_ns, checkpoint_id, checkpoint_type, checkpoint, metadata_type, metadata, parent_id "
+            "FROM checkpoints WHERE thread_id = ?", (thread_id,)
+        ):
+            self.storage[thread_id][ns][checkpoint_id] = ((ctype, checkpoint), (mtype, metadata), parent_id)
+        for ns, checkpoint_id, task_id, idx, channel, vtype, value, task_path in conn.execute(
+            "SELECT checkpoint_ns, checkpoint_id, task_id, idx, channel, value_type, value, task_path "
+            "FROM writes WHERE thread_id = ?", (thread_id,)
+        ):
+            self.writes[(thread_id, ns, checkpoint_id)][(task_id, idx)] = (task_id, channel, (vtype, value), task_path)
+        for ns, channel, version, vtype, value in conn.execute(
+            "SELECT checkpoint_ns, channel, version, value_type, value FROM blobs WHERE thread_id = ?", (thread_id,)
+        ):
+            key = (thread_id, ns, channel, version)
+            self.blobs[key] = (vtype, value)
+            self._blob_keys[(thread_id, ns)].add(key)
+        self._loaded.add(thread_id)
+
+    def get_tuple(self, config):
+        with self._lock:
+            self._load(config["configurable"]["thread_id"])
+            return super().get_tuple(config)
+
+    def _evict(self, thread_id: str):
+        # Still in the file
+        self._forget(thread_id)
+        self._loaded.discard(thread_id)
+
+    def list(self, config, **kwargs):
+        # Without a config only the sessions in memory are listed
+        with self._lock:
+            if config:
+                self._touch(config["configurable"]["thread_id"])
+                self._load(config["configurable"]["thread_id"])
+            return iter(list(super().list(config, **kwargs)))
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self._lock:
+            self._touch(thread_id)
+            self._load(thread_id)
+            # Skip SessionSaver.put: the rows it prunes must also leave the file
+            result = InMemorySaver.put(self, config, checkpoint, metadata, new_versions)
+            new_blobs = [(thread_id, checkpoint_ns, k, v) for k, v in new_versions.items()]
+            self._blob_keys[(thread_id, checkpoint_ns)].update(new_blobs)
+            self._remember(config, checkpoint, metadata)
+            saved, saved_metadata, parent_id = self.storage[thread_id][checkpoint_ns][checkpoint["id"]]
+            dropped, stale = self._prune(thread_id, checkpoint_ns)
+
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)",
+                    [(*key, *self.blobs[key]) for key in new_blobs if key in self.blobs],
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, checkpoint["id"], *saved, *saved_metadata, parent_id),
+                )
+                conn.executemany(
+                    "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    [(thread_id, checkpoint_ns, checkpoint_id) for checkpoint_id in dropped],
+                )
+                conn.executemany(
+                    "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    [(thread_id, checkpoint_ns, checkpoint_id) for checkpoint_id in dropped],
+                )
+                conn.executemany(
+                    "DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                    stale,
+                )
+            return result
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        with self._lock:
+            self._load(thread_id)
+            super().put_writes(config, writes, task_id, task_path)
+            rows = [
+                (thread_id, checkpoint_ns, checkpoint_id, task, idx, channel, *value, path)
+                for (task, idx), (_, channel, value, path)
+                in self.writes[(thread_id, checkpoint_ns, checkpoint_id)].items()
+                if task == task_id
+            ]
+            conn = self._connection()
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            super().delete_thread(thread_id)
+            self._loaded.discard(thread_id)
+            conn = self._connection()
+            with conn:
+                for table in ("checkpoints", "writes", "blobs"):
+                    conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+
+
+def get_checkpointer(backend: str = ANIMALS_CHECKPOINTER) -> SessionSaver:
+    """
+    Returns the checkpointer selected by ANIMALS_CHECKPOINTER: "memory" or "file".
+    """
+    if backend == "memory":
+        return SessionSaver()
+    if backend == "file":
+        saver = FileSessionSaver()
+        _logs.info(f"Storing animals chat sessions in {saver.path}")
+        return saver
+    raise ValueError(f"Unknown checkpointer backend: {backend}")
@@ -0,0 +1,198 @@
+from collections import OrderedDict, deque
+import hashlib
+import json
+import os
+import threading
+import time
+
+from utils.logger import get_logger
+from utils.tracing import record_cache
+
+_logs = get_logger(__name__)
+
+
+def fact_hash(fact: str) -> str:
+    return hashlib.sha1(" ".join(fact.split()).casefold().encode("utf-8")).hexdigest()
+
+
+class FactPool:
+    """
+    Local reservoir of facts from one source, refilled in the background.
+
+    take(n) serves facts from memory. Whenever the pool drops below
+    low_water, a worker thread fetches batches until it is back at capacity.
+    Facts are deduplicated by hash against the pool and the most recently
+    served facts. Only when the pool runs dry does take() fetch the rest
+    directly. With a path, the pool is saved after every refill batch and loaded
+    again on start, so a restart does not begin empty.
+    """
+
+    def __init__(self, name: str, fetch, capacity: int = 100, low_water: int = 25,
+                 batch: int = 25, path: str = None, retry_after: float = 30.0):
+        """
+        fetch(n) returns a list of up to n facts from the source.
+        """
+        if not 0 <= low_water < capacity:
+            raise ValueError("low_water must be between 0 and capacity")
+        self.name = name
+        self.fetch = fetch
+        self.capacity = capacity
+        self.low_water = low_water
+        self.batch = batch
+        self.path = path
+        self.retry_after = retry_after
+        self.served = 0
+        self.direct_fetches = 0
+        # Batches fetched by the worker
+        self.refills = 0
+        self.duplicates = 0
+        self.failures = 0
+        self._facts = deque()
+        self._hashes = set()
+        # Hashes of served facts, so a refill does not bring them straight back
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._worker = None
+        self._failed_at = None
+        if path:
+            self._load()
+
+    def _add(self, facts: list[str]) -> int:
+        """
+        Add new facts, skipping duplicates. Call with the lock held.
+        """
+        added = 0
+        for fact in facts:
+            h = fact_hash(fact)
+            if h in self._hashes or h in self._recent:
+                self.duplicates += 1
+                continue
+            if len(self._facts) >= self.capacity:
+                break
+            self._facts.append(fact)
+            self._hashes.add(h)
+            added += 1
+        return added
+
+    def _served(self, facts: list[str]):
+        """
+        Remember served facts. Call with the lock held.
+        """
+        for fact in facts:
+            h = fact_hash(fact)
+            self._hashes.discard(h)
+            self._recent[h] = None
+            self._recent.move_to_end(h)
+        while len(self._recent) > self.capacity:
+            self._recent.popitem(last=False)
+
+    def take(self, n: int = 1) -> list[str]:
+        """
+        Return n facts, from the pool when it has them.
+        """
+        self.start()
+        with self._lock:
+            facts = [self._facts.popleft() for _ in range(min(n, len(self._facts)))]
+            self._served(facts)
+            self.served += len(facts)
+            low = len(self._facts) < self.low_water
+        if low:
+            self._wake.set()
+        record_cache(self.name, len(facts) == n)
+        if len(facts) < n:
+            # The pool ran dry: the caller waits for the source this time
+            with self._lock:
+                self.direct_fetches += 1
+            fetched = self.fetch(n - len(facts))
+            with self._lock:
+                self._served(fetched)
+            facts += fetched
+        return facts
+
+    def start(self):
+        """
+        Start the refill worker; take() calls this on first use.
+        """
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is not None:
+                return
+            self._worker = threading.Thread(target=self._run, name=f"fact-pool-{self.name}", daemon=True)
+            self._worker.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            if self._failed_at is not None and time.monotonic() - self._failed_at < self.retry_after:
+                # Do not hammer a failing source; the next take() after the pause retries
+                continue
+            try:
+                self.refill()
+            except Exception as e:
+                self._failed_at = time.monotonic()
+                with self._lock:
+                    self.failures += 1
+                _logs.warning(f"Refilling the {self.name} pool failed: {e}")
+            else:
+                self._failed_at = None
+
+    def refill(self):
+        """
+        Fetch batches until the pool is full or the source has nothing new.
+        """
+        with self._lock:
+            if len(self._facts) >= self.low_water and self._facts:
+                return
+        while True:
+            with self._lock:
+                missing = self.capacity - len(self._facts)
+            if missing <= 0:
+                break
+            fetched = self.fetch(min(self.batch, missing))
+            with self._lock:
+                added = self._add(fetched)
+                self.refills += 1
+                size = len(self._facts)
+            _logs.debug("Added %d facts to the %s pool, now %d", added, self.name, size)
+            if self.path:
+                self._save()
+            if not added:
+                break
+
+    def _save(self):
+        with self._lock:
+            facts = list(self._facts)
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(facts, f)
+        os.replace(tmp, self.path)
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                facts = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            _logs.warning(f"Could not load the {self.name} pool from {self.path}: {e}")
+            return
+        with self._lock:
+            self._add(facts)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._facts),
+                "served_from_pool": self.served,
+                "direct_fetches": self.direct_fetches,
+                "refills": self.refills,
+                "duplicates": self.duplicates,
+                "failures": self.failures,
+            }
@@ -1,16 +1,20 @@
 from typing import Literal
 from langgraph.graph import StateGraph, START, END
-from langchain.chat_models import init_chat_model
 from langchain.tools import tool
-from langchain_core.messages import AnyMessage, SystemMessage, ToolMessage
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage, SystemMessage, ToolMessage
 from typing_extensions import TypedDict, Annotated
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import operator
+import time
 
 from dotenv import load_dotenv
-from animals_chat.prompts import return_instructions_root
 import json
-import requests
+from animals_chat.fact_pool import FactPool
 from utils.logger import get_logger
+from utils.http_client import get_http_client
+from utils.model_registry import get_chat_model
+from utils.memory import SUMMARY_PREFIX, ConversationMemory, make_summarizer
+from utils.tracing import in_context, span, token_usage
 import os
 
 
@@ -19,47 +23,107 @@ _logs = get_logger(__name__)
 load_dotenv(".env")
 load_dotenv(".secrets")
 
+# Facts are served from local pools that refill in the background; set
+# FACT_POOL_DIR to keep them on disk across restarts
+FACT_POOL_DIR = os.getenv("FACT_POOL_DIR", "")
+FACT_POOL_SIZE = int(os.getenv("FACT_POOL_SIZE", "100"))
+FACT_POOL_LOW_WATER = int(os.getenv("FACT_POOL_LOW_WATER", "25"))
 
 
-@tool
-def get_cat_facts(n:int=1):
+def fetch_cat_facts(n: int) -> list[str]:
     """
-    Returns n cat facts from the Meowfacts API.
+    Fetches n cat facts from the Meowfacts API.
     """
     url = "https://meowfacts.herokuapp.com/"
     params = {
         "count": n
     }
-    response = requests.get(url, params=params)
+    response = get_http_client().get(url, params=params)
     resp_dict = json.loads(response.text)
-    facts_list = resp_dict.get("data", [])
-    facts = "\n".join([f"{i+1}. {fact}\n" for i, fact in enumerate(facts_list)])
-    return facts
+    return resp_dict.get("data", [])
 
-@tool
-def get_dog_facts(n:int=1):
+def fetch_dog_facts(n: int) -> list[str]:
     """
-    Returns n dog facts from the Dog API.
+    Fetches n dog facts from the Dog API.
     """
     url = "http://dogapi.dog/api/v2/facts"
     params = {
         "limit": n
     }
-    response = requests.get(url, params=params)
+    response = get_http_client().get(url, params=params)
     resp_dict = json.loads(response.text)
-    facts_list = resp_dict.get("data", [])
-    facts = "\n".join([f"{i+1}. {fact['attributes']['body']}\n" for i, fact in enumerate(facts_list)])
+    return [fact["attributes"]["body"] for fact in resp_dict.get("data", [])]
+
+def fact_pool_path(name: str):
+    return os.path.join(FACT_POOL_DIR, f"{name}.json") if FACT_POOL_DIR else None
+
+cat_fact_pool = FactPool("cat_facts", fetch_cat_facts, capacity=FACT_POOL_SIZE,
+                         low_water=FACT_POOL_LOW_WATER, path=fact_pool_path("cat_facts"))
+dog_fact_pool = FactPool("dog_facts", fetch_dog_facts, capacity=FACT_POOL_SIZE,
+                         low_water=FACT_POOL_LOW_WATER, path=fact_pool_path("dog_facts"))
+
+@tool
+def get_cat_facts(n:int=1):
+    """
+    Returns n cat facts from the Meowfacts API.
+    """
+    facts_list = cat_fact_pool.take(n)
+    facts = "\n".join([f"{i+1}. {fact}\n" for i, fact in enumerate(facts_list)])
+    return facts
+
+@tool
+def get_dog_facts(n:int=1):
+    """
+    Returns n dog facts from the Dog API.
+    """
+    facts_list = dog_fact_pool.take(n)
+    facts = "\n".join([f"{i+1}. {fact}\n" for i, fact in enumerate(facts_list)])
     return facts
 
+TOOLS = [get_cat_facts, get_dog_facts]
+TOOLS_BY_NAME = {tool.name: tool for tool in TOOLS}
+
+# Seconds one tool call may take, and all tool calls of one model turn together
+TOOL_TIMEOUT = float(os.getenv("ANIMALS_TOOL_TIMEOUT", "10"))
+TOOL_TURN_DEADLINE = float(os.getenv("ANIMALS_TOOL_TURN_DEADLINE", "15"))
+# Per-tool overrides of TOOL_TIMEOUT
+TOOL_TIMEOUTS = {}
+
+# Shared rather than per turn: a timed-out call cannot be cancelled, and
+# shutting down a per-turn pool would wait for it
+tool_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("ANIMALS_TOOL_WORKERS", "16")),
+    thread_name_prefix="animals-tool",
+)
+
+CHAT_MODEL = "openai:gpt-4o-mini"
+
 def get_model_with_tools():
-    model = init_chat_model(
-        "openai:gpt-4o-mini",
-        temperature=0.7
-    )
-    # Augment the LLM with tools
-    tools = [get_cat_facts, get_dog_facts]
-    model_with_tools = model.bind_tools(tools)
-    return model_with_tools
+    # Built once per process by the model registry, then reused on every step
+    return get_chat_model(CHAT_MODEL, tools=TOOLS, temperature=0.7)
+
+# Older turns of a thread are folded into a rolling summary to keep requests bounded
+memory = ConversationMemory(make_summarizer(
+    lambda prompt: get_chat_model(CHAT_MODEL, temperature=0).invoke(prompt).content
+))
+
+MEMORY_ROLES = {"human": "user", "ai": "assistant", "tool": "tool", "system": "system"}
+
+def memory_message(message: AnyMessage) -> dict:
+    return {"role": MEMORY_ROLES.get(message.type, message.type), "content": message.text()}
+
+def context_window(messages: list[AnyMessage]) -> list[AnyMessage]:
+    """
+    Returns the messages to send for the current turn, which starts at the
+    last HumanMessage and is always sent verbatim. Earlier turns go through
+    memory: the oldest are folded into a summary once they outgrow its budget.
+    Folds end before a HumanMessage, so tool calls stay with their results.
+    """
+    current = next((i for i in range(len(messages) - 1, -1, -1) if isinstance(messages[i], HumanMessage)), 0)
+    summary, start = memory.fold([memory_message(m) for m in messages[:current]])
+    if summary:
+        return [SystemMessage(content=SUMMARY_PREFIX + summary)] + messages[start:]
+    return messages[start:]
 
 class MessagesState(TypedDict):
     messages: Annotated[list[AnyMessage], operator.add]
@@ -68,29 +132,62 @@ class MessagesState(TypedDict):
 def llm_call(state: dict):
     """LLM decides whether to call a tool or not"""
     model_with_tools = get_model_with_tools()
+    with span("llm_call", kind="llm", model=CHAT_MODEL) as llm_span:
+        message = model_with_tools.invoke(
+            [
+                SystemMessage(
+                    content="You are a helpful assistant tasked with stating interesting and fun facts about cats and dogs."
+                )
+            ]
+            + context_window(state["messages"])
+        )
+        llm_span.set(**token_usage(getattr(message, "usage_metadata", None)))
     return {
-        "messages": [
-            model_with_tools.invoke(
-                [
-                    SystemMessage(
-                        content="You are a helpful assistant tasked with stating interesting and fun facts about cats and dogs."
-                    )
-                ]
-                + state["messages"]
-            )
-        ],
+        "messages": [message],
         "llm_calls": state.get('llm_calls', 0) + 1
     }
 
+def tool_error(tool_call: dict, error: str) -> ToolMessage:
+    _logs.error(f"Tool call {tool_call['name']} failed: {error}")
+    return ToolMessage(content=f"Error: {error}", tool_call_id=tool_call["id"], status="error")
+
+def run_tool(tool_call: dict):
+    with span(tool_call["name"], kind="tool", arguments=tool_call["args"]):
+        return TOOLS_BY_NAME[tool_call["name"]].invoke(tool_call["args"])
+
 def tool_node(state: dict):
-    """Performs the tool call"""
-    tools = [get_cat_facts, get_dog_facts]
-    tools_by_name = {tool.name: tool for tool in tools}
+    """
+    Performs the tool calls of the last model message concurrently. A call
+    that fails or runs past TOOL_TIMEOUT, or past TOOL_TURN_DEADLINE for the
+    whole turn, is answered with an error ToolMessage, so the model still
+    gets the other results. Messages keep the order of the tool calls.
+    """
+    tool_calls = state["messages"][-1].tool_calls
+    started = time.monotonic()
+    turn_deadline = started + TOOL_TURN_DEADLINE
+    # Each call runs in a copy of this context, so its spans belong to the turn
+    futures = [
+        tool_executor.submit(in_context(run_tool), tool_call)
+        if tool_call["name"] in TOOLS_BY_NAME else None
+        for tool_call in tool_calls
+    ]
 
     result = []
-    for tool_call in state["messages"][-1].tool_calls:
-        tool = tools_by_name[tool_call["name"]]
-        observation = tool.invoke(tool_call["args"])
+    for tool_call, future in zip(tool_calls, futures):
+        if future is None:
+            result.append(tool_error(tool_call, f"unknown tool {tool_call['name']}"))
+            continue
+        deadline = min(started + TOOL_TIMEOUTS.get(tool_call["name"], TOOL_TIMEOUT), turn_deadline)
+        try:
+            observation = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            future.cancel()
+            limit = "the turn deadline" if deadline == turn_deadline else "its timeout"
+            result.append(tool_error(tool_call, f"{tool_call['name']} timed out after {deadline - started:.1f}s ({limit})"))
+            continue
+        except Exception as e:
+            result.append(tool_error(tool_call, f"{tool_call['name']} raised {type(e).__name__}: {e}"))
+            continue
         result.append(ToolMessage(content=observation, tool_call_id=tool_call["id"]))
     return {"messages": result}
 
@@ -107,8 +204,11 @@ def should_continue(state: MessagesState) -> Literal["tool_node", END]:
     # Otherwise, we stop (reply to the user)
     return END
 
-def get_animals_chat_agent():
-    """Returns the animals chat agent"""    
+def get_animals_chat_agent(checkpointer=None):
+    """
+    Returns the animals chat agent. With a checkpointer, the conversation is
+    stored per thread_id and each turn only needs to send the new message.
+    """
     # Build workflow
     agent_builder = StateGraph(MessagesState)
 
@@ -124,4 +224,39 @@ def get_animals_chat_agent():
         ["tool_node", END]
     )
     agent_builder.add_edge("tool_node", "llm_call")
-    return agent_builder.compile()
\ No newline at end of file
+    return agent_builder.compile(checkpointer=checkpointer)
+
+def thread_input(agent, config: dict, history: list[dict], message: str) -> dict:
+    """
+    Returns the input of a turn on the checkpointed thread in config: just the
+    new message while the thread matches the Gradio history. After a retry,
+    an undo or an edit, or in a cleared chat, the two differ. The thread is
+    then cut back to the turns that still match, which keep their tool
+    results, and the rest of the history is sent along as plain messages.
+    """
+    state = agent.get_state(config).values
+    messages = state.get("messages", [])
+    visible = [{"role": m["role"], "content": m["content"]} for m in history]
+    keep, matched = 0, 0
+    starts = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+    for start, end in zip(starts, starts[1:] + [len(messages)]):
+        # What Gradio shows of a turn: the question and the final answer
+        turn = [{"role": "user", "content": messages[start].content}]
+        last = messages[end - 1]
+        if end - start > 1 and isinstance(last, AIMessage) and not last.tool_calls:
+            turn.append({"role": "assistant", "content": last.content})
+        if start != keep or visible[matched:matched + len(turn)] != turn:
+            break
+        keep, matched = end, matched + len(turn)
+
+    new_message = HumanMessage(content=message)
+    if keep == len(messages) and matched == len(visible):
+        return {"messages": [new_message]}
+    _logs.debug("Thread %s differs from the history, keeping %d of %d messages",
+                config["configurable"]["thread_id"], keep, len(messages))
+    agent.checkpointer.delete_thread(config["configurable"]["thread_id"])
+    replayed = [
+        HumanMessage(content=m["content"]) if m["role"] == "user" else AIMessage(content=m["content"])
+        for m in visible[matched:] if m["role"] in ("user", "assistant")
+    ]
+    return {"messages": messages[:keep] + replayed + [new_message], "llm_calls": state.get("llm_calls", 0)}
@@ -0,0 +1,214 @@
+## Async Task Runner
+
+import asyncio
+import contextlib
+import time
+from typing import (
+    Any,
+    AsyncIterable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Union,
+)
+
+from langchain_core.runnables import RunnableConfig
+
+from observation_cache import ObservationCache
+from output_parser import Task
+from task_executor import ExecutionReport, TaskTiming, resolve_args, task_tool_name
+
+
+class AsyncTaskRunner:
+    """Run LLMCompiler `Task` graphs on the event loop through `tool.ainvoke`.
+
+    One runner can be shared by many concurrent plans: the per-tool semaphores
+    live on the runner, so a limit such as `{"search": 8}` applies across every
+    plan executing on the loop.
+    """
+
+    def __init__(
+        self,
+        tool_concurrency: Optional[Dict[str, int]] = None,
+        default_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        tool_timeouts: Optional[Dict[str, float]] = None,
+        cache: Optional[ObservationCache] = None,
+    ):
+        """
+        `tool_concurrency` caps in-flight calls per tool name; other tools are
+        capped by `default_concurrency` (unlimited if None). `timeout` applies to
+        every call unless overridden per tool in `tool_timeouts`. Calls are
+        memoized in `cache` when one is given.
+        """
+        self.tool_concurrency = tool_concurrency or {}
+        self.default_concurrency = default_concurrency
+        self.timeout = timeout
+        self.tool_timeouts = tool_timeouts or {}
+        self.cache = cache
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _limit(self, tool_name: str):
+        limit = self.tool_concurrency.get(tool_name, self.default_concurrency)
+        if limit is None:
+            return contextlib.nullcontext()
+        if tool_name not in self._semaphores:
+            self._semaphores[tool_name] = asyncio.Semaphore(limit)
+        return self._semaphores[tool_name]
+
+    async def run(
+        self,
+        tasks: Union[Iterable[Task], AsyncIterable[Task]],
+        observations: Optional[Dict[int, Any]] = None,
+        config: Optional[RunnableConfig] = None,
+    ) -> ExecutionReport:
+        """Execute `tasks` and return the observations.
+
+        `tasks` may be an async stream such as `planner.astream(...)`; a plain
+        iterable is consumed directly, so it should not block. When a task fails
+        or times out, every task that depends on it is skipped.
+        """
+        if observations is None:
+            observations = {}
+        report = ExecutionReport(observations=observations)
+        loop = asyncio.get_running_loop()
+        completions: Dict[int, asyncio.Future] = {}
+        registered: Set[int] = set()
+        missing: Set[int] = set()
+        running: List[asyncio.Task] = []
+
+        def completion(idx: int) -> asyncio.Future:
+            if idx not in completions:
+                completions[idx] = loop.create_future()
+            return completions[idx]
+
+        def complete(idx: int):
+            future = completion(idx)
+            if not future.done():
+                future.set_result(None)
+
+        async def run_task(task: Task, deps: List[int]):
+            idx = task["idx"]
+            timing = report.timings[idx]
+            try:
+                if deps:
+                    await asyncio.gather(*(completion(dep) for dep in deps))
+                timing.ready_at = time.perf_counter()
+                unresolved = [dep for dep in deps if dep in missing]
+                failed = [dep for dep in deps if dep in report.failed]
+                if unresolved:
+                    reason = f"unresolved dependencies {unresolved}"
+                    report.graph_errors[idx] = reason
+                    report.failed.add(idx)
+                    observations[idx] = f"ERROR(Task {idx} was not executed: {reason}.)"
+                elif failed:
+                    report.failed.add(idx)
+                    observations[idx] = (
+                        f"ERROR(Task {idx} was cancelled: dependencies {failed} failed.)"
+                    )
+                else:
+                    observations[idx] = await self._invoke(
+                        task, observations, config, timing, report
+                    )
+            finally:
+                complete(idx)
+
+        def register(task: Task):
+            idx = task["idx"]
+            now = time.perf_counter()
+            if idx in registered or idx in observations:
+                report.graph_errors.setdefault(idx, "duplicate task index")
+                return
+            registered.add(idx)
+            report.timings[idx] = TaskTiming(idx, task_tool_name(task), now)
+            deps = [
+                dep
+                for dep in task["dependencies"] or ()
+                if dep not in observations or dep in report.failed
+            ]
+            forward = [dep for dep in deps if dep >= idx]
+            if forward:
+                reason = f"forward reference to {forward}"
+                report.graph_errors[idx] = reason
+                report.failed.add(idx)
+                observations[idx] = f"ERROR(Task {idx} was not executed: {reason}.)"
+                complete(idx)
+                return
+            # Create the futures now rather than in run_task: with a plain
+            # iterable no task runs before the never-planned sweep below.
+            for dep in deps:
+                completion(dep)
+            running.append(loop.create_task(run_task(task, deps)))
+
+        try:
+            if hasattr(tasks, "__aiter__"):
+                async for task in tasks:
+                    register(task)
+            else:
+                for task in tasks:
+                    register(task)
+            # No more tasks can arrive: release anything waiting on a task
+            # that was never planned.
+            for idx in list(completions):
+                if idx not in registered:
+                    missing.add(idx)
+                    complete(idx)
+            await asyncio.gather(*running)
+        except BaseException:
+            for pending in running:
+                pending.cancel()
+            raise
+        return report
+
+    async def _invoke(
+        self,
+        task: Task,
+        observations: Dict[int, Any],
+        config: Optional[RunnableConfig],
+        timing: TaskTiming,
+        report: ExecutionReport,
+    ):
+        tool = task["tool"]
+        if isinstance(tool, str):
+            timing.started_at = timing.finished_at = time.perf_counter()
+            return tool
+        idx = task["idx"]
+        args = task["args"]
+        try:
+            resolved_args = resolve_args(args, observations)
+        except Exception as e:
+            report.failed.add(idx)
+            return (
+                f"ERROR(Failed to call {tool.name} with args {args}.)"
+                f" Args could not be resolved. Error: {repr(e)}"
+            )
+        timeout = self.tool_timeouts.get(tool.name, self.timeout)
+
+        async def call_tool():
+            async with self._limit(tool.name):
+                timing.started_at = time.perf_counter()
+                try:
+                    return await asyncio.wait_for(
+                        tool.ainvoke(resolved_args, config), timeout
+                    )
+                except asyncio.TimeoutError:
+                    report.failed.add(idx)
+                    return f"ERROR(Timed out calling {tool.name} after {timeout}s.)"
+                except Exception as e:
+                    report.failed.add(idx)
+                    return (
+                        f"ERROR(Failed to call {tool.name} with args {args}."
+                        + f" Args resolved to {resolved_args}. Error: {repr(e)})"
+                    )
+                finally:
+                    timing.finished_at = time.perf_counter()
+
+        if self.cache is None:
+            return await call_tool()
+        observation = await self.cache.acall(tool.name, resolved_args, call_tool)
+        if timing.started_at is None:
+            # Served from the cache
+            timing.started_at = timing.finished_at = time.perf_counter()
+        return observation
@@ -0,0 +1,244 @@
+"""Check the checkpointed animals_chat agent against a stub model and stub fact APIs.
+
+The stub model asks for get_cat_facts or get_dog_facts unless a result for that
+animal is already in the messages it is sent, and otherwise answers. A session
+of TURNS turns is replayed three ways:
+
+- rebuilt: the old app, which rebuilt the messages from the Gradio history
+  on every turn, so tool results were lost and facts were fetched again;
+- memory / file: the checkpointed app, which sends only the new message.
+
+The script checks that every checkpointed turn sends one message, that facts
+are fetched once per session while their results are in the model's context
+window, that pruning keeps the stored state bounded, and that the file backend
+picks a session up again after a restart. Beyond max_sessions the least
+recently used session is dropped from memory, and the file backend reads it
+back when it returns.
+
+It also checks that the thread follows the Gradio history through a retry,
+an undo, an edit and a cleared chat, and that in long sessions older turns
+are folded into the memory summary: requests stay within its budget and
+never start the verbatim part on an orphaned tool result. It then times
+turns deep into longer sessions: LangGraph still serializes the whole
+message list once per turn.
+"""
+
+import os
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage  # noqa: E402
+
+from animals_chat import main  # noqa: E402
+from animals_chat.checkpoint import FileSessionSaver, SessionSaver  # noqa: E402
+
+TURNS = 40
+LONG_SESSIONS = (40, 200, 800)
+
+
+class StubModel:
+    def __init__(self):
+        self.calls = 0
+        self.tool_calls = 0
+        self.max_history_tokens = 0
+        self.summarized_requests = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        self.check_request(messages)
+        last = messages[-1]
+        if isinstance(last, ToolMessage):
+            return AIMessage(content=f"Here you go: {last.content.strip()}")
+        animal = "cat" if "cat" in last.content else "dog"
+        fetched = any(isinstance(m, ToolMessage) and animal in m.content for m in messages)
+        if fetched:
+            return AIMessage(content=f"As I said, {animal}s are great.")
+        self.tool_calls += 1
+        return AIMessage(content="", tool_calls=[{
+            "name": f"get_{animal}_facts", "args": {"n": 1}, "id": f"call_{self.calls}",
+        }])
+
+
+    def check_request(self, messages):
+        # System prompt, optional summary, then whole turns up to the current one
+        verbatim = [m for m in messages[1:] if not isinstance(m, SystemMessage)]
+        assert isinstance(verbatim[0], HumanMessage), verbatim[0]
+        current = max(i for i, m in enumerate(messages) if isinstance(m, HumanMessage))
+        history = sum(main.memory.counter.count_message(main.memory_message(m)) for m in messages[1:current])
+        self.max_history_tokens = max(self.max_history_tokens, history)
+        self.summarized_requests += isinstance(messages[1], SystemMessage)
+
+
+def stub_summarize(summary, messages):
+    return f"{summary} {len(messages)} more messages about cats and dogs."
+
+
+def install_stubs():
+    model = StubModel()
+    main.get_model_with_tools = lambda: model
+    main.memory.summarize = stub_summarize
+    main.cat_fact_pool.take = lambda n: ["A cat fact."] * n
+    main.dog_fact_pool.take = lambda n: ["A dog fact."] * n
+    return model
+
+
+def message(turn):
+    return f"Tell me a {'cat' if turn % 2 == 0 else 'dog'} fact (turn {turn})"
+
+
+def run_rebuilt():
+    model = install_stubs()
+    agent = main.get_animals_chat_agent()
+    history = []
+    for turn in range(TURNS):
+        messages = [HumanMessage(m["content"]) if m["role"] == "user" else AIMessage(m["content"]) for m in history]
+        response = agent.invoke({"messages": messages + [HumanMessage(message(turn))]})
+        history += [{"role": "user", "content": message(turn)},
+                    {"role": "assistant", "content": response["messages"][-1].content}]
+    return model.tool_calls
+
+
+def run_checkpointed(saver, turns, thread_id="session"):
+    model = install_stubs()
+    agent = main.get_animals_chat_agent(saver)
+    config = {"configurable": {"thread_id": thread_id}}
+    times = []
+    for turn in turns:
+        state = {"messages": [HumanMessage(message(turn))]}
+        start = time.perf_counter()
+        response = agent.invoke(state, config, durability="exit")
+        times.append(time.perf_counter() - start)
+        # The graph input is one message, whatever the length of the session
+        assert len(state["messages"]) == 1
+    return agent, response, model.tool_calls, times
+
+
+def run_gradio_turn(agent, history, message):
+    config = {"configurable": {"thread_id": "session"}}
+    state = main.thread_input(agent, config, history, message)
+    response = agent.invoke(state, config, durability="exit")
+    answer = response["messages"][-1].content
+    thread = response["messages"]
+    return history + [{"role": "user", "content": message}, {"role": "assistant", "content": answer}], state, thread
+
+
+def check_history_sync():
+    model = install_stubs()
+    agent = main.get_animals_chat_agent(SessionSaver())
+    history = []
+    for turn in range(3):
+        history, state, thread = run_gradio_turn(agent, history, message(turn))
+        assert len(state["messages"]) == 1
+
+    def questions(thread):
+        return [m.content for m in thread if isinstance(m, HumanMessage)]
+
+    # Retry: Gradio drops the last exchange and sends its question again
+    _, state, thread = run_gradio_turn(agent, history[:-2], message(2))
+    assert questions(thread) == [message(0), message(1), message(2)], questions(thread)
+    # The kept turns still have their tool results
+    assert sum(isinstance(m, ToolMessage) for m in thread) == 2 and model.tool_calls == 2, model.tool_calls
+    # Undo, then an edited question
+    history, _, thread = run_gradio_turn(agent, history[:2], "Tell me a dog fact, edited")
+    assert questions(thread) == [message(0), "Tell me a dog fact, edited"], questions(thread)
+    history, state, thread = run_gradio_turn(agent, history, message(3))
+    assert len(state["messages"]) == 1
+    # A history the thread never saw, e.g. after a restart with the memory backend
+    other = [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello"}]
+    _, state, thread = run_gradio_turn(agent, other, message(4))
+    assert questions(thread) == ["Hi", message(4)] and len(state["messages"]) == 3
+    # Cleared chat
+    _, _, thread = run_gradio_turn(agent, [], message(5))
+    assert questions(thread) == [message(5)]
+    print("thread follows the history through retry, undo, edit and a cleared chat")
+
+
+def check_eviction():
+    saver = SessionSaver(max_sessions=2)
+    for thread_id in ("a", "b", "c"):
+        run_checkpointed(saver, range(2), thread_id)
+    # "a" was the least recently used; nothing of it is left in memory
+    assert set(saver.storage) == {"b", "c"}, set(saver.storage)
+    assert {thread_id for thread_id, _ in saver._latest} == {"b", "c"}
+    assert all(key[0] != "a" for key in saver.blobs) and all(key[0] != "a" for key in saver.writes)
+
+    with tempfile.TemporaryDirectory() as checkpoint_dir:
+        saver = FileSessionSaver(checkpoint_dir=checkpoint_dir, max_sessions=1)
+        _, _, fetches_a, _ = run_checkpointed(saver, range(2), "a")
+        run_checkpointed(saver, range(2), "b")
+        assert set(saver.storage) == {"b"} and saver._loaded == {"b"}, (set(saver.storage), saver._loaded)
+        # Read back from the file: the fact results are still in the session
+        _, response, fetches_again, _ = run_checkpointed(saver, range(2, 4), "a")
+        assert fetches_a == 2 and fetches_again == 0, (fetches_a, fetches_again)
+        assert response["llm_calls"] == 6
+    print("least recently used sessions leave memory; the file backend reads them back")
+
+
+def check_summary(turns):
+    summaries = main.memory.summaries
+    run_checkpointed(SessionSaver(), range(turns))
+    model = main.get_model_with_tools()
+    print(f"{turns} turns: {main.memory.summaries - summaries} summaries, {model.summarized_requests} of "
+          f"{model.calls} requests with a summary, at most {model.max_history_tokens} history tokens "
+          f"(budget {main.memory.max_tokens})")
+    assert model.summarized_requests and model.max_history_tokens <= main.memory.max_tokens
+
+
+def report(name, fetches, times, saver):
+    stored = sum(len(c) for c in saver.storage["session"].values())
+    print(f"  {name:<8} {fetches:>3} fact tool calls, turn p50 {sorted(times)[len(times) // 2] * 1e3:6.2f} ms, "
+          f"last turn {times[-1] * 1e3:6.2f} ms, {stored} checkpoints and {len(saver.blobs)} blobs stored")
+
+
+def main_bench():
+    print(f"{TURNS} turns alternating cat and dog questions")
+    print(f"  rebuilt  {run_rebuilt():>3} fact tool calls")
+
+    saver = SessionSaver()
+    agent, response, fetches, times = run_checkpointed(saver, range(TURNS))
+    assert fetches == 2, fetches
+    assert response["llm_calls"] == TURNS + 2
+    # Tool results from the first turns are still in the state
+    assert sum(isinstance(m, ToolMessage) for m in response["messages"]) == 2
+    assert len(saver.storage["session"][""]) <= saver.keep_last
+    report("memory", fetches, times, saver)
+
+    with tempfile.TemporaryDirectory() as checkpoint_dir:
+        half = TURNS // 2
+        saver = FileSessionSaver(checkpoint_dir=checkpoint_dir)
+        _, _, fetches_before, times = run_checkpointed(saver, range(half))
+        # A new process: nothing in memory, the session is read from the file
+        saver = FileSessionSaver(checkpoint_dir=checkpoint_dir)
+        agent, response, fetches_after, more_times = run_checkpointed(saver, range(half, TURNS))
+        assert fetches_before == 2 and fetches_after == 0, (fetches_before, fetches_after)
+        assert response["llm_calls"] == TURNS + 2
+        assert len(response["messages"]) == len(agent.get_state({"configurable": {"thread_id": "session"}}).values["messages"])
+        report("file", fetches_before + fetches_after, times + more_times, saver)
+        conn = saver._connection()
+        rows = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in ("checkpoints", "writes", "blobs")}
+        print(f"           rows in the file after restart: {rows}")
+        assert rows["checkpoints"] <= saver.keep_last
+
+        saver.delete_thread("session")
+        assert saver.get_tuple({"configurable": {"thread_id": "session"}}) is None
+        assert FileSessionSaver(checkpoint_dir=checkpoint_dir).get_tuple(
+            {"configurable": {"thread_id": "session"}}) is None
+
+    check_history_sync()
+    check_eviction()
+    check_summary(LONG_SESSIONS[1])
+
+    print("time per turn after n turns")
+    for n in LONG_SESSIONS:
+        for name, saver_class in (("memory", SessionSaver), ("file", FileSessionSaver)):
+            with tempfile.TemporaryDirectory() as checkpoint_dir:
+                kwargs = {"checkpoint_dir": checkpoint_dir} if saver_class is FileSessionSaver else {}
+                _, _, _, times = run_checkpointed(saver_class(**kwargs), range(n + 20))
+            print(f"  {name:<8} n={n:<5} {sum(times[-20:]) / 20 * 1e3:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,88 @@
+"""Check animals_chat.tool_node with local stub tools that inject latency.
+
+Each scenario gives tool_node one model message with several tool calls and
+checks the wall time, that the ToolMessages come back in tool call order, and
+which of them carry the error marker (status="error"):
+
+- two slow calls run concurrently instead of back to back;
+- a call past its timeout is reported while the others still return;
+- calls past the turn deadline are reported even when their own timeout is
+  longer;
+- a tool that raises and a tool the model made up are reported, not raised.
+"""
+
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+
+from langchain.tools import tool  # noqa: E402
+from langchain_core.messages import AIMessage  # noqa: E402
+
+from animals_chat import main  # noqa: E402
+
+
+def slow_tool(name, delay):
+    def run(n: int = 1) -> str:
+        time.sleep(delay)
+        return f"{name} after {delay}s"
+    run.__doc__ = f"Stub {name} that takes {delay}s."
+    return tool(name, run)
+
+
+@tool
+def broken_tool(n: int = 1) -> str:
+    """Stub tool that fails."""
+    raise ConnectionError("upstream closed the connection")
+
+
+def run(calls, timeout, deadline, timeouts=None):
+    main.TOOL_TIMEOUT = timeout
+    main.TOOL_TURN_DEADLINE = deadline
+    main.TOOL_TIMEOUTS = timeouts or {}
+    tool_calls = [{"name": name, "args": {"n": 1}, "id": f"call_{i}"} for i, name in enumerate(calls)]
+    start = time.perf_counter()
+    messages = main.tool_node({"messages": [AIMessage(content="", tool_calls=tool_calls)]})["messages"]
+    elapsed = time.perf_counter() - start
+    assert [m.tool_call_id for m in messages] == [c["id"] for c in tool_calls]
+    return elapsed, [m.status for m in messages], messages
+
+
+def sequential(calls):
+    start = time.perf_counter()
+    for name in calls:
+        main.TOOLS_BY_NAME[name].invoke({"n": 1})
+    return time.perf_counter() - start
+
+
+def main_bench():
+    main.TOOLS_BY_NAME = {t.name: t for t in (
+        slow_tool("cat_facts", 0.3), slow_tool("dog_facts", 0.3),
+        slow_tool("fast", 0.05), slow_tool("slow", 0.8), slow_tool("very_slow", 2.0),
+        broken_tool,
+    )}
+
+    calls = ["cat_facts", "dog_facts"]
+    elapsed, statuses, _ = run(calls, timeout=5, deadline=5)
+    assert statuses == ["success", "success"] and elapsed < 0.45, elapsed
+    print(f"cat + dog, 0.3s each:        sequential {sequential(calls):.2f}s, tool_node {elapsed:.2f}s")
+
+    elapsed, statuses, messages = run(["very_slow", "fast"], timeout=0.5, deadline=5)
+    assert statuses == ["error", "success"] and elapsed < 0.6, (statuses, elapsed)
+    print(f"2s call, 0.5s timeout:       {elapsed:.2f}s, {statuses}: {messages[0].content!r}")
+
+    elapsed, statuses, _ = run(["fast", "slow", "very_slow"], timeout=5, deadline=0.5,
+                               timeouts={"very_slow": 10})
+    assert statuses == ["success", "error", "error"] and elapsed < 0.6, (statuses, elapsed)
+    print(f"0.5s turn deadline:          {elapsed:.2f}s, {statuses}")
+
+    elapsed, statuses, messages = run(["broken_tool", "made_up_tool", "fast"], timeout=5, deadline=5)
+    assert statuses == ["error", "error", "success"], statuses
+    print(f"failing and unknown tools:   {elapsed:.2f}s, {statuses}")
+    for message in messages[:2]:
+        print(f"  {message.tool_call_id}: {message.content}")
+
+
+if __name__ == "__main__":
+    main_bench()
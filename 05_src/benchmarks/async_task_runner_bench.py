@@ -0,0 +1,88 @@
+"""Throughput of AsyncTaskRunner as the number of concurrent plans grows.
+
+It first checks that a task depending on a task that was never planned is
+reported as unresolved, not left waiting, for both a plain list of tasks and
+an async stream.
+"""
+
+import asyncio
+import time
+
+from async_task_runner import AsyncTaskRunner
+
+TOOL_LATENCY = 0.02
+
+
+class SleepTool:
+    """Stand-in for an I/O-bound tool such as a search API."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    async def ainvoke(self, args, config=None):
+        await asyncio.sleep(TOOL_LATENCY)
+        return f"{self.name} done"
+
+
+def make_plan(tools, levels: int = 3, width: int = 4):
+    tasks = []
+    previous = []
+    idx = 1
+    for level in range(levels):
+        layer = []
+        for i in range(width):
+            tool = tools[(level + i) % len(tools)]
+            args = {"query": " ".join(f"${dep}" for dep in previous) or "start"}
+            tasks.append(
+                {"idx": idx, "tool": tool, "args": args, "dependencies": list(previous), "thought": None}
+            )
+            layer.append(idx)
+            idx += 1
+        previous = layer
+    tasks.append({"idx": idx, "tool": "join", "args": (), "dependencies": range(1, idx), "thought": None})
+    return tasks
+
+
+async def run_plans(runner: AsyncTaskRunner, tools, n_plans: int) -> float:
+    start = time.perf_counter()
+    reports = await asyncio.gather(
+        *(runner.run(make_plan(tools)) for _ in range(n_plans))
+    )
+    elapsed = time.perf_counter() - start
+    assert not any(report.failed for report in reports)
+    return elapsed
+
+
+async def check_missing_dependency(tools):
+    tasks = [
+        {"idx": 1, "tool": tools[0], "args": {"query": "start"}, "dependencies": [], "thought": None},
+        {"idx": 3, "tool": tools[1], "args": {"query": "$2"}, "dependencies": [2], "thought": None},
+    ]
+
+    async def stream():
+        for task in tasks:
+            yield task
+
+    for source in (tasks, stream()):
+        report = await asyncio.wait_for(AsyncTaskRunner().run(source), 3)
+        assert report.failed == {3} and "unresolved" in report.graph_errors[3], report
+    print("a dependency on a task that was never planned is reported, from a list and a stream")
+
+
+async def main():
+    tools = [SleepTool("search"), SleepTool("math")]
+    await check_missing_dependency(tools)
+    for limit in (None, 64):
+        runner = AsyncTaskRunner(default_concurrency=limit)
+        print(f"per-tool concurrency limit: {limit or 'unlimited'}")
+        for n_plans in (1, 10, 100, 500, 1000):
+            elapsed = await run_plans(runner, tools, n_plans)
+            n_tasks = n_plans * 12
+            print(
+                f"  plans={n_plans:5d} elapsed={elapsed:6.3f}s "
+                f"plans/s={n_plans / elapsed:8.1f} tool calls/s={n_tasks / elapsed:9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
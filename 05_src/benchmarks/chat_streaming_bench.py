@@ -0,0 +1,199 @@
+"""Time to first token of the blocking and streaming chat handlers.
+
+A local stub serves the OpenAI Responses API (horoscope_chat) and the Chat
+Completions API (simple_chat). It produces ANSWER_TOKENS tokens, TOKEN_DELAY
+seconds apart, either as one JSON body or as server-sent events. On its
+first horoscope request the stub streams a short preamble and asks for a
+get_horoscope call, which takes TOOL_DELAY, so the streaming handler also has
+to finish a tool round before the answer streams.
+
+The script checks that the preamble and the answer are shown as separate
+paragraphs, and that the recorded tokens per second only count the time
+spent streaming, not the tool round in between.
+"""
+
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from openai import OpenAI
+
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+from langchain.chat_models import init_chat_model  # noqa: E402
+
+from horoscope_chat import main as horoscope_main  # noqa: E402
+from horoscope_chat.cache import HoroscopeCache  # noqa: E402
+from simple_chat import app as simple_app  # noqa: E402
+from utils.response_cache import ResponseCache  # noqa: E402
+from utils.stream_metrics import recent_turns  # noqa: E402
+
+ANSWER_TOKENS = 60
+TOKEN_DELAY = 0.01
+PREAMBLE = ["Let ", "me ", "look ", "that ", "up."]
+TOOL_DELAY = 0.3
+USAGE = {
+    "input_tokens": 10, "output_tokens": ANSWER_TOKENS, "total_tokens": 10 + ANSWER_TOKENS,
+    "input_tokens_details": {"cached_tokens": 0}, "output_tokens_details": {"reasoning_tokens": 0},
+}
+
+
+def answer_tokens():
+    for i in range(ANSWER_TOKENS):
+        time.sleep(TOKEN_DELAY)
+        yield f"word{i} "
+
+
+def preamble_tokens():
+    for token in PREAMBLE:
+        time.sleep(TOKEN_DELAY)
+        yield token
+
+
+def slow_horoscope(sign, date):
+    time.sleep(TOOL_DELAY)
+    return f"{sign} on {date}: stub."
+
+
+class StubOpenAI(BaseHTTPRequestHandler):
+    # HTTP/1.0: the streamed body ends when the connection closes
+    protocol_version = "HTTP/1.0"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path.endswith("/responses"):
+            self.responses_api(body)
+        else:
+            self.chat_completions(body)
+
+    def responses_api(self, body):
+        wants_tool = body.get("tool_choice") != "none" and not any(
+            item.get("type") == "function_call_output" for item in body["input"]
+        )
+        if wants_tool:
+            output = [{
+                "type": "function_call", "id": "fc_0", "call_id": "call_0", "name": "get_horoscope",
+                "status": "completed", "arguments": json.dumps({"sign": "Leo", "date": "TODAY"}),
+            }]
+            tokens = preamble_tokens() if body.get("stream") else []
+        else:
+            tokens = answer_tokens()
+        if not body.get("stream"):
+            if not wants_tool:
+                text = "".join(tokens)
+                output = [self.message(text)]
+            return self.send_json(self.response_body(output))
+
+        self.start_events()
+        for i, token in enumerate(tokens):
+            self.event({"type": "response.output_text.delta", "item_id": "msg_0", "output_index": 0,
+                        "content_index": 0, "delta": token, "sequence_number": i, "logprobs": []})
+        if not wants_tool:
+            output = [self.message(f"{ANSWER_TOKENS} words")]
+        self.event({"type": "response.completed", "sequence_number": ANSWER_TOKENS,
+                    "response": self.response_body(output)})
+
+    def chat_completions(self, body):
+        if not body.get("stream"):
+            text = "".join(answer_tokens())
+            return self.send_json({
+                "id": "c0", "object": "chat.completion", "created": 0, "model": "stub",
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": text}}],
+            })
+        self.start_events()
+        chunk = {"id": "c0", "object": "chat.completion.chunk", "created": 0, "model": "stub"}
+        for token in answer_tokens():
+            self.event({**chunk, "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]})
+        self.event({**chunk, "choices": [], "usage": {
+            "prompt_tokens": 10, "completion_tokens": ANSWER_TOKENS, "total_tokens": 10 + ANSWER_TOKENS}})
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def message(self, text):
+        return {"type": "message", "id": "msg_0", "role": "assistant", "status": "completed",
+                "content": [{"type": "output_text", "text": text, "annotations": []}]}
+
+    def response_body(self, output):
+        return {"id": "resp_0", "object": "response", "created_at": 0, "model": "stub",
+                "status": "completed", "output": output, "parallel_tool_calls": True,
+                "tool_choice": "auto", "tools": [], "usage": USAGE}
+
+    def send_json(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def start_events(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+
+    def event(self, payload):
+        self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def time_blocking(handler, *args, **kwargs):
+    start = time.perf_counter()
+    handler(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    # Nothing is shown until the handler returns
+    return elapsed, elapsed
+
+
+def time_streaming(handler, *args, **kwargs):
+    start = time.perf_counter()
+    first = None
+    for partial in handler(*args, **kwargs):
+        if first is None:
+            first = time.perf_counter() - start
+    return first, time.perf_counter() - start, partial
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOpenAI)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    horoscope_main.client = OpenAI(base_url=base_url, api_key="stub")
+    # max_age=0 so that both handlers run the tool round
+    horoscope_main.horoscope_cache = HoroscopeCache(slow_horoscope, max_age=0)
+    simple_app.llm = init_chat_model("gpt-4o-mini", model_provider="openai",
+                                     base_url=base_url, api_key="stub", stream_usage=True)
+    # Entries expire at once, so both handlers reach the model
+    simple_app.response_cache = ResponseCache(ttl=0)
+
+    print(f"stub model: {ANSWER_TOKENS} tokens, {TOKEN_DELAY * 1000:.0f} ms apart")
+    try:
+        for name, blocking, streaming in (
+            ("horoscope_chat", horoscope_main.horoscope_chat, horoscope_main.horoscope_chat_stream),
+            ("simple_chat", simple_app.simple_chat, simple_app.simple_chat_stream),
+        ):
+            ttft_blocking, total_blocking = time_blocking(blocking, "Horoscope for Leo", [])
+            ttft_streaming, total_streaming, answer = time_streaming(streaming, "Horoscope for Leo", [])
+            words = " ".join(f"word{i}" for i in range(ANSWER_TOKENS))
+            if name == "horoscope_chat":
+                assert answer.strip() == "".join(PREAMBLE) + "\n\n" + words, answer
+            else:
+                assert answer.strip() == words, answer
+            turn = recent_turns(name)[-1]
+            # Tokens arrive TOKEN_DELAY apart; the tool round must not count
+            assert turn["tokens_per_s"] > 0.7 / TOKEN_DELAY, turn
+            print(f"{name}")
+            print(f"  blocking:  first text after {ttft_blocking * 1000:6.0f} ms, total {total_blocking * 1000:6.0f} ms")
+            print(f"  streaming: first text after {ttft_streaming * 1000:6.0f} ms, total {total_streaming * 1000:6.0f} ms")
+            print(f"  recorded:  ttft {turn['ttft_s'] * 1000:.0f} ms, {turn['tokens']} tokens, "
+                  f"{turn['tokens_per_s']:.0f} tokens/s")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Serve facts from FactPool against a slow stub source.
+
+The stub source takes FETCH_LATENCY per request and returns random facts from
+a corpus of CORPUS distinct facts, so batches overlap and deduplication is
+exercised. The script checks that:
+
+- after warm-up, get_cat_facts serves n facts from memory in microseconds,
+  while a direct fetch costs the source latency;
+- the worker refills below the low-water mark, so steady traffic never
+  reaches the source on the request path;
+- no fact is in the pool twice;
+- an empty pool falls back to a direct fetch;
+- a pool saved to disk starts full after a restart;
+- a failing source is not retried in a tight loop.
+"""
+
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+
+from animals_chat import main  # noqa: E402
+from animals_chat.fact_pool import FactPool, fact_hash  # noqa: E402
+
+FETCH_LATENCY = 0.2
+CORPUS = 5000
+CALLS = 500
+# Pause between tool calls: about 200 facts/s, below what the refill delivers
+CALL_INTERVAL = 0.01
+
+
+class StubSource:
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.fail = False
+        self.lock = threading.Lock()
+
+    def __call__(self, n):
+        with self.lock:
+            self.requests += 1
+        time.sleep(FETCH_LATENCY)
+        if self.fail:
+            raise ConnectionError("source unavailable")
+        return [f"Cat fact number {self.rng.randrange(CORPUS)}." for _ in range(n)]
+
+
+def wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError
+        time.sleep(0.01)
+
+
+def saved_size(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return len(json.load(f))
+    except FileNotFoundError:
+        return 0
+
+
+def percentiles(times):
+    times = sorted(times)
+    return statistics.median(times) * 1e6, times[int(0.99 * len(times))] * 1e6
+
+
+def main_bench():
+    source = StubSource()
+    pool = FactPool("cat_facts", source, capacity=200, low_water=50, batch=50)
+    main.cat_fact_pool = pool
+
+    # First call: the pool is empty, so it goes to the source
+    start = time.perf_counter()
+    main.get_cat_facts.invoke({"n": 3})
+    cold = time.perf_counter() - start
+    wait_for(lambda: pool.stats()["size"] >= 150)
+
+    requests_before = source.requests
+    times = []
+    for i in range(CALLS):
+        n = 1 + i % 3
+        start = time.perf_counter()
+        facts = main.get_cat_facts.invoke({"n": n})
+        times.append(time.perf_counter() - start)
+        assert facts.count("Cat fact number") == n
+        time.sleep(CALL_INTERVAL)
+    p50, p99 = percentiles(times)
+    stats = pool.stats()
+    with pool._lock:
+        hashes = [fact_hash(f) for f in pool._facts]
+    assert len(hashes) == len(set(hashes))
+    print(f"direct fetch: {cold * 1e3:.0f} ms")
+    print(f"{CALLS} tool calls from the pool: p50 {p50:.1f} us, p99 {p99:.1f} us")
+    print(f"  {stats}, {source.requests - requests_before} source requests in the background")
+    assert stats["direct_fetches"] == 1, stats
+
+    # Raw take() cost, without the LangChain tool wrapper
+    take_times = []
+    for _ in range(50):
+        start = time.perf_counter()
+        pool.take(1)
+        take_times.append(time.perf_counter() - start)
+    print(f"  FactPool.take(1): p50 {percentiles(take_times)[0]:.1f} us")
+
+    # Empty pool: serve what is left and fetch the rest directly
+    empty = FactPool("cat_facts", StubSource(1), capacity=10, low_water=2, batch=10)
+    empty._worker = threading.current_thread()  # keep the worker from refilling
+    start = time.perf_counter()
+    facts = empty.take(4)
+    assert len(facts) == 4 and empty.stats()["direct_fetches"] == 1
+    print(f"empty pool fallback: 4 facts in {(time.perf_counter() - start) * 1e3:.0f} ms")
+
+    # Warm restart from disk
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cat_facts.json")
+        saved = FactPool("cat_facts", StubSource(2), capacity=100, low_water=25, path=path)
+        saved.start()
+        wait_for(lambda: saved_size(path) == 100)
+        restarted_source = StubSource(3)
+        restarted = FactPool("cat_facts", restarted_source, capacity=100, low_water=25, path=path)
+        size = restarted.stats()["size"]
+        start = time.perf_counter()
+        restarted.take(3)
+        print(f"restart with {size} facts from disk: first take {(time.perf_counter() - start) * 1e6:.0f} us, "
+              f"{restarted.stats()['direct_fetches']} direct fetches")
+        assert size == 100 and restarted.stats()["direct_fetches"] == 0
+
+    # A failing source: one refill attempt, then a pause before the next one
+    failing_source = StubSource(4)
+    failing_source.fail = True
+    failing = FactPool("cat_facts", failing_source, capacity=10, low_water=2, retry_after=30)
+    failing.start()
+    wait_for(lambda: failing.stats()["failures"] == 1)
+    for _ in range(5):
+        failing._wake.set()
+        time.sleep(0.01)
+    assert failing_source.requests == 1, failing_source.requests
+    print(f"failing source: {failing.stats()['failures']} failed refill, {failing_source.requests} request")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,209 @@
+"""Load test of the thread-based and async horoscope_chat request paths.
+
+Every session asks about one sign. A local stub plays both the Responses API
+and the horoscope service: the model asks for one get_horoscope call and then
+answers, taking MODEL_LATENCY per call, and the horoscope service takes
+FETCH_LATENCY.
+
+The thread path runs horoscope_chat on THREAD_WORKERS worker threads, which
+is how Gradio runs sync handlers (anyio's default of 40 threads). The async
+path awaits horoscope_chat_async for every session on one event loop.
+
+The stub runs in its own process so that it does not compete with the
+client for the GIL. Once the client side is CPU bound (request building and
+response parsing in the SDK), neither path can go faster; raising
+HOROSCOPE_MAX_CONCURRENT_CHATS past that point only adds latency. The async
+path is slower than the threads from 200 sessions on, whatever the limit,
+so the Gradio app uses the threaded handler unless HOROSCOPE_ASYNC=true.
+
+Before the load test, the script checks that cancelling the session that
+started a shared horoscope fetch, as a user disconnecting does, leaves the
+other sessions waiting for the same sign with their horoscope.
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from openai import AsyncOpenAI, OpenAI  # noqa: E402
+
+from horoscope_chat import main  # noqa: E402
+from horoscope_chat.cache import SIGNS, HoroscopeCache  # noqa: E402
+
+MODEL_LATENCY = 0.1
+FETCH_LATENCY = 0.05
+THREAD_WORKERS = 40
+SESSIONS = (50, 200, 500)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 2048
+
+    def __init__(self, in_flight, max_in_flight):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        # Shared with the benchmark process
+        self.in_flight = in_flight
+        self.max_in_flight = max_in_flight
+
+    def enter(self):
+        with self.in_flight.get_lock():
+            self.in_flight.value += 1
+            self.max_in_flight.value = max(self.max_in_flight.value, self.in_flight.value)
+
+    def leave(self):
+        with self.in_flight.get_lock():
+            self.in_flight.value -= 1
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.enter()
+        try:
+            time.sleep(MODEL_LATENCY)
+        finally:
+            self.server.leave()
+        items = body["input"]
+        if any(item.get("type") == "function_call_output" for item in items):
+            output = [{
+                "type": "message", "id": "msg_0", "role": "assistant", "status": "completed",
+                "content": [{"type": "output_text", "text": "Your horoscope.", "annotations": []}],
+            }]
+        else:
+            sign = items[-1]["content"].split()[-1]
+            output = [{
+                "type": "function_call", "id": "fc_0", "call_id": "call_0", "name": "get_horoscope",
+                "status": "completed", "arguments": json.dumps({"sign": sign, "date": "TODAY"}),
+            }]
+        self.send_json({
+            "id": "resp_0", "object": "response", "created_at": 0, "model": "stub",
+            "status": "completed", "output": output, "parallel_tool_calls": True,
+            "tool_choice": "auto", "tools": [],
+        })
+
+    def do_GET(self):
+        time.sleep(FETCH_LATENCY)
+        query = parse_qs(urlsplit(self.path).query)
+        self.send_json({"data": {"date": "2025-01-01", "horoscope_data": f"{query['sign'][0]}: stub."}})
+
+    def send_json(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, in_flight, max_in_flight):
+    server = StubServer(in_flight, max_in_flight)
+    port.put(server.server_address[1])
+    server.serve_forever()
+
+
+def messages(n):
+    return [f"What is the horoscope for {SIGNS[i % len(SIGNS)]}" for i in range(n)]
+
+
+def run_threads(n):
+    def session(message):
+        start = time.perf_counter()
+        main.horoscope_chat(message, [])
+        return time.perf_counter() - start
+
+    submitted = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREAD_WORKERS) as executor:
+        finished = list(executor.map(lambda m: (session(m), time.perf_counter()), messages(n)))
+    # Latency as a user sees it, including the wait for a free worker
+    return [done - submitted for _, done in finished]
+
+
+async def run_async(n, base_url):
+    main.async_client = AsyncOpenAI(base_url=base_url, api_key="stub")
+
+    async def session(message):
+        start = time.perf_counter()
+        await main.horoscope_chat_async(message, [])
+        return time.perf_counter() - start
+
+    latencies = await asyncio.gather(*(session(m) for m in messages(n)))
+    await main.async_client.close()
+    return latencies
+
+
+async def check_cancelled_leader():
+    fetches = []
+
+    async def afetch(sign, date):
+        fetches.append(sign)
+        await asyncio.sleep(0.1)
+        return f"{sign}: stub."
+
+    cache = HoroscopeCache(None, afetch=afetch)
+    leader = asyncio.create_task(cache.aget("Leo"))
+    await asyncio.sleep(0.01)
+    followers = [asyncio.create_task(cache.aget("Leo")) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    leader.cancel()
+    results = await asyncio.gather(*followers, return_exceptions=True)
+    print(f"leader cancelled during a shared fetch: followers got {results}, {len(fetches)} fetch")
+    assert results == ["Leo: stub."] * 3 and fetches == ["Leo"] and leader.cancelled()
+
+
+def report(name, latencies, elapsed, max_in_flight):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+    print(f"  {name:<7} p50 {statistics.median(latencies) * 1000:7.0f} ms   p99 {p99 * 1000:7.0f} ms   "
+          f"wall {elapsed:5.2f} s   max concurrent sessions {max_in_flight}")
+
+
+def main_bench():
+    asyncio.run(check_cancelled_leader())
+    port = multiprocessing.Queue()
+    in_flight = multiprocessing.Value("i", 0)
+    max_in_flight = multiprocessing.Value("i", 0)
+    server = multiprocessing.Process(target=serve, args=(port, in_flight, max_in_flight), daemon=True)
+    server.start()
+    base_url = f"http://127.0.0.1:{port.get()}"
+    main.client = OpenAI(base_url=f"{base_url}/v1", api_key="stub")
+    main.HOROSCOPE_API_URL = f"{base_url}/horoscope"
+
+    unloaded = 2 * MODEL_LATENCY + FETCH_LATENCY
+    print(f"model {MODEL_LATENCY * 1000:.0f} ms per call, horoscope fetch {FETCH_LATENCY * 1000:.0f} ms, "
+          f"~{unloaded * 1000:.0f} ms per unloaded session, {THREAD_WORKERS} worker threads, "
+          f"async limit {main.MAX_CONCURRENT_CHATS} chats")
+    try:
+        for n in SESSIONS:
+            print(f"{n} concurrent sessions")
+            for name in ("threads", "async"):
+                # max_age=0 so every run goes to the horoscope service
+                main.horoscope_cache = HoroscopeCache(main.fetch_horoscope, max_age=0, afetch=main.afetch_horoscope)
+                max_in_flight.value = 0
+                start = time.perf_counter()
+                if name == "threads":
+                    latencies = run_threads(n)
+                else:
+                    latencies = asyncio.run(run_async(n, f"{base_url}/v1"))
+                report(name, latencies, time.perf_counter() - start, max_in_flight.value)
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,118 @@
+"""Round trips and latency of a multi-sign horoscope_chat turn.
+
+A local stub of the OpenAI Responses API asks for one get_horoscope call per
+sign named in the user message, then answers once it has the outputs. The
+horoscope service is replaced with a fetch that sleeps for FETCH_LATENCY.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from openai import OpenAI
+
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+from horoscope_chat import main  # noqa: E402
+from horoscope_chat.cache import SIGNS, HoroscopeCache  # noqa: E402
+
+MODEL_LATENCY = 0.05
+FETCH_LATENCY = 0.2
+
+
+class StubResponses(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    calls = []
+    # When set, the stub keeps asking for tools until tool_choice is "none"
+    greedy = False
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        StubResponses.calls.append(body)
+        time.sleep(MODEL_LATENCY)
+        items = body["input"]
+        outputs = [item for item in items if item.get("type") == "function_call_output"]
+        if body.get("tool_choice") == "none" or (outputs and not StubResponses.greedy):
+            output = [self.message(f"Here are {len(outputs)} horoscopes.")]
+        else:
+            text = items[0]["content"]
+            signs = [sign for sign in SIGNS if re.search(sign, text, re.IGNORECASE)]
+            output = [self.function_call(i + len(outputs), sign) for i, sign in enumerate(signs)]
+        self.reply(output)
+
+    def function_call(self, i, sign):
+        return {
+            "type": "function_call", "id": f"fc_{i}", "call_id": f"call_{i}",
+            "name": "get_horoscope", "status": "completed",
+            "arguments": json.dumps({"sign": sign, "date": "TODAY"}),
+        }
+
+    def message(self, text):
+        return {
+            "type": "message", "id": "msg_0", "role": "assistant", "status": "completed",
+            "content": [{"type": "output_text", "text": text, "annotations": []}],
+        }
+
+    def reply(self, output):
+        body = json.dumps({
+            "id": "resp_0", "object": "response", "created_at": 0, "model": "stub",
+            "status": "completed", "output": output, "parallel_tool_calls": True,
+            "tool_choice": "auto", "tools": [],
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def slow_fetch(sign, date):
+    time.sleep(FETCH_LATENCY)
+    return f"Horoscope for {sign} on {date}: stub."
+
+
+def run_turn(message, max_tool_rounds=None):
+    # A fresh cache so every turn pays for the fetches
+    main.horoscope_cache = HoroscopeCache(slow_fetch)
+    StubResponses.calls = []
+    start = time.perf_counter()
+    answer = main.horoscope_chat(message, [], max_tool_rounds=max_tool_rounds)
+    return answer, len(StubResponses.calls), time.perf_counter() - start
+
+
+def main_bench():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubResponses)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    main.client = OpenAI(base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", api_key="stub")
+
+    try:
+        print(f"model latency {MODEL_LATENCY * 1000:.0f} ms, horoscope fetch {FETCH_LATENCY * 1000:.0f} ms")
+        for signs in (SIGNS[:1], SIGNS[:3], SIGNS[:6], SIGNS):
+            answer, model_calls, elapsed = run_turn(f"Horoscopes for {', '.join(signs)} please")
+            sequential = (len(signs) + 1) * MODEL_LATENCY + len(signs) * FETCH_LATENCY
+            print(f"{len(signs):>2} signs: {model_calls} model calls, {elapsed * 1000:.0f} ms "
+                  f"(one call per sign: {len(signs) + 1} calls, ~{sequential * 1000:.0f} ms) "
+                  f"-> {answer!r}")
+            assert model_calls == 2
+
+        StubResponses.greedy = True
+        for cap in (1, 2, 3):
+            answer, model_calls, _ = run_turn("Horoscope for Leo", max_tool_rounds=cap)
+            last_choice = StubResponses.calls[-1].get("tool_choice")
+            print(f"model that always wants tools, cap {cap}: {model_calls} model calls, "
+                  f"last tool_choice={last_choice!r} -> {answer!r}")
+            assert model_calls == cap + 1 and last_choice == "none"
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main_bench()
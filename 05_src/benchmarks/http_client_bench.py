@@ -0,0 +1,226 @@
+"""Connection reuse, retries, timeouts and circuit breaking in HttpClient.
+
+A local HTTP server stands in for the fact and horoscope APIs:
+
+    /ok      answers immediately
+    /slow    sleeps for ?delay= seconds before answering
+    /flaky   fails with a 503 every other request
+    /error   always fails with a 500
+
+POST is answered like GET. Besides timing, the script checks that:
+
+- non-idempotent requests (POST) are not retried;
+- a half-open circuit whose trial request is cancelled, or fails before
+  reaching the host (an invalid URL), lets the next request try again;
+- the async client of a closed event loop is closed when a new loop starts.
+"""
+
+import asyncio
+import contextlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+import requests
+
+from utils.http_client import CircuitOpenError, HttpClient
+
+REQUESTS = 200
+CONCURRENCY = 50
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; don't let Nagle hold the body back
+    disable_nagle_algorithm = True
+    flaky_calls = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+        status = 200
+        if parts.path == "/slow":
+            time.sleep(float(query.get("delay", ["0.05"])[0]))
+        elif parts.path == "/flaky":
+            with StubHandler.lock:
+                StubHandler.flaky_calls += 1
+                status = 503 if StubHandler.flaky_calls % 2 else 200
+        elif parts.path == "/error":
+            status = 500
+        body = json.dumps({"data": ["A cat fact."]}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except BrokenPipeError:
+            pass  # the client gave up waiting (timeout demo)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    request_queue_size = 256
+
+
+def start_server():
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def bench_keepalive(base):
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        requests.get(f"{base}/ok", params={"count": 1})
+    bare = time.perf_counter() - start
+
+    client = HttpClient()
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        client.get(f"{base}/ok", params={"count": 1})
+    pooled = time.perf_counter() - start
+    client.close()
+
+    print(f"{REQUESTS} sequential GETs")
+    print(f"  requests.get (new connection each): {bare * 1000 / REQUESTS:.3f} ms/request")
+    print(f"  HttpClient (keep-alive pool):       {pooled * 1000 / REQUESTS:.3f} ms/request")
+    print(f"  speedup: {bare / pooled:.1f}x")
+
+
+def bench_retries(base):
+    client = HttpClient(backoff=0.01)
+    statuses = [client.get(f"{base}/flaky").status_code for _ in range(20)]
+    print("Flaky endpoint (every other request is a 503)")
+    print(f"  successful responses: {statuses.count(200)}/20")
+    print(f"  metrics: {client.metrics()}")
+    client.close()
+
+
+def bench_timeout(base):
+    client = HttpClient(read_timeout=0.1, retries=1, backoff=0.01)
+    start = time.perf_counter()
+    try:
+        client.get(f"{base}/slow", params={"delay": 2})
+        outcome = "no timeout"
+    except httpx.TimeoutException as e:
+        outcome = type(e).__name__
+    print("Slow endpoint (2 s) with a 0.1 s read timeout and one retry")
+    print(f"  {outcome} after {time.perf_counter() - start:.2f} s")
+    client.close()
+
+
+def bench_circuit(base):
+    client = HttpClient(retries=0, failure_threshold=5, reset_timeout=0.2)
+    rejected = 0
+    for _ in range(20):
+        try:
+            client.get(f"{base}/error")
+        except CircuitOpenError:
+            rejected += 1
+    reached = client.metrics()[urlsplit(base).netloc]["requests"]
+    print("Failing endpoint, breaker threshold of 5 failures")
+    print(f"  requests that reached the host: {reached}, rejected without a request: {rejected}")
+    time.sleep(0.25)
+    client.get(f"{base}/error")
+    print(f"  after the reset timeout a single trial request is let through: "
+          f"{client.metrics()[urlsplit(base).netloc]['circuit']} again after it failed")
+    client.close()
+
+
+def check_idempotent(base):
+    client = HttpClient(retries=2, backoff=0.01, failure_threshold=100)
+    client.get(f"{base}/error")
+    client.request("POST", f"{base}/error", json={"sign": "Leo"})
+    reached = client.metrics()[urlsplit(base).netloc]["requests"]
+    print(f"GET and POST to a failing endpoint, 2 retries: {reached} requests reached the host")
+    assert reached == 3 + 1
+    client.close()
+
+
+def check_half_open_trial(base):
+    client = HttpClient(retries=0, failure_threshold=1, reset_timeout=0.1)
+    host = urlsplit(base).netloc
+
+    def open_circuit():
+        client.get(f"{base}/error")
+        time.sleep(0.15)
+        assert client.metrics()[host]["circuit"] == "half-open"
+
+    async def cancelled_trial():
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(client.aget(f"{base}/slow", params={"delay": 1}), 0.05)
+        await client.aclose()
+
+    open_circuit()
+    asyncio.run(cancelled_trial())
+    assert client.get(f"{base}/ok").status_code == 200
+    open_circuit()
+    with contextlib.suppress(httpx.InvalidURL):
+        client.get(f"{base}/bad\x00path")
+    assert client.get(f"{base}/ok").status_code == 200
+    print(f"half-open trial cancelled or with an invalid URL: the next request goes through, "
+          f"circuit {client.metrics()[host]['circuit']}")
+    client.close()
+
+
+def check_loop_change(base):
+    client = HttpClient()
+    asyncio.run(client.aget(f"{base}/ok"))
+    (old,) = client._async_clients.values()
+    sockets = [connection._connection._network_stream.get_extra_info("socket")
+               for connection in old._transport._pool.connections]
+    asyncio.run(client.aget(f"{base}/ok"))
+    print(f"a second event loop: {len(client._async_clients)} async client kept, "
+          f"{sum(sock.fileno() == -1 for sock in sockets)}/{len(sockets)} sockets of the old one closed")
+    assert len(client._async_clients) == 1 and sockets and all(sock.fileno() == -1 for sock in sockets)
+    client.close()
+
+
+async def bench_async(base):
+    client = HttpClient()
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one():
+        async with semaphore:
+            return await client.aget(f"{base}/slow", params={"delay": 0.05})
+
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(one() for _ in range(REQUESTS)))
+    elapsed = time.perf_counter() - start
+    print(f"{REQUESTS} async GETs to a 50 ms endpoint, {CONCURRENCY} at a time")
+    print(f"  {sum(r.status_code == 200 for r in responses)} ok in {elapsed:.2f} s "
+          f"(sequential would take {REQUESTS * 0.05:.0f} s)")
+    print(f"  metrics: {client.metrics()}")
+    await client.aclose()
+    client.close()
+
+
+def main():
+    server, base = start_server()
+    try:
+        bench_keepalive(base)
+        bench_retries(base)
+        bench_timeout(base)
+        bench_circuit(base)
+        asyncio.run(bench_async(base))
+        check_idempotent(base)
+        check_half_open_trial(base)
+        check_loop_change(base)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""LexicalIndex against the dense cosine_similarity approach of 04_vector_similarity.
+
+The corpus is synthetic: documents of 20-50 words drawn from a Zipf-like
+distribution over a 30k-word vocabulary, so a few words are in most
+documents and most words are rare, as in real text. Queries are the first
+six words of randomly chosen documents.
+
+For each corpus size the script reports:
+
+- the time to fit the index and the size of its matrices;
+- the latency of one query, and of QUERIES queries in one search_batch call;
+- the dense approaches: cosine_similarity(query, X) plus a full argsort per
+  query, and, where it fits in memory, the all-pairs cosine_similarity(X)
+  of the example, whose n x n float64 result is shown for every size;
+- that the index returns the same top-k scores as the dense ranking;
+- at the largest size, the cost of add() and that added documents are found.
+
+    python -m benchmarks.lexical_search_bench
+    python -m benchmarks.lexical_search_bench --sizes 10000 100000
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+import numpy as np
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from sklearn.metrics.pairwise import cosine_similarity  # noqa: E402
+
+from utils.lexical_search import LexicalIndex  # noqa: E402
+
+VOCABULARY = 30_000
+QUERIES = 200
+K = 10
+# Largest corpus for which the all-pairs matrix is computed
+ALL_PAIRS_MAX = 10_000
+LETTERS = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+
+
+def make_vocabulary(rng):
+    lengths = rng.integers(3, 10, VOCABULARY)
+    words = {"".join(rng.choice(LETTERS, n)) for n in lengths}
+    return np.array(sorted(words))
+
+
+def make_corpus(n, vocabulary, rng):
+    weights = 1.0 / np.arange(1, len(vocabulary) + 1) ** 1.05
+    weights /= weights.sum()
+    lengths = rng.integers(20, 51, n)
+    tokens = vocabulary[rng.choice(len(vocabulary), lengths.sum(), p=weights)]
+    bounds = np.concatenate([[0], np.cumsum(lengths)])
+    return [" ".join(tokens[bounds[i]:bounds[i + 1]]) for i in range(n)]
+
+
+def dense_search(matrix, query_vector, k):
+    """The dense way: score every document, then sort all of them."""
+    scores = cosine_similarity(query_vector, matrix).ravel()
+    order = np.argsort(-scores, kind="stable")[:k]
+    return [(int(i), float(scores[i])) for i in order if scores[i] > 0]
+
+
+def bench_size(n, vocabulary, rng):
+    documents = make_corpus(n, vocabulary, rng)
+    queries = [" ".join(documents[i].split()[:6]) for i in rng.integers(0, n, QUERIES)]
+
+    start = time.perf_counter()
+    index = LexicalIndex().fit(documents)
+    fit_s = time.perf_counter() - start
+    matrix = index.matrix
+    index_mb = 2 * (matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / 1e6
+    print(f"{n:>9,} documents: fit {fit_s:6.1f} s, {matrix.nnz:,} nonzeros, "
+          f"CSR rows + inverted index {index_mb:,.0f} MB")
+
+    single = []
+    for query in queries[:100]:
+        t = time.perf_counter()
+        index.search(query, K)
+        single.append(time.perf_counter() - t)
+    t = time.perf_counter()
+    batched = index.search_batch(queries, K)
+    batch_s = time.perf_counter() - t
+    print(f"  LexicalIndex     one query p50 {statistics.median(single) * 1000:8.2f} ms   "
+          f"{QUERIES} batched {batch_s * 1000 / QUERIES:8.2f} ms/query")
+
+    # The dense ranking is slow at scale: time a few queries and check those
+    dense_queries = 20 if n <= 100_000 else 5
+    query_matrix = index.vectorizer.transform(queries[:dense_queries])
+    dense = []
+    for i in range(dense_queries):
+        t = time.perf_counter()
+        expected = dense_search(matrix, query_matrix[i], K)
+        dense.append(time.perf_counter() - t)
+        got = batched[i]
+        assert np.allclose([s for _, s in got], [s for _, s in expected], atol=1e-5), (got, expected)
+        # Ids can only differ between documents with the same score
+        for (got_id, got_score), (expected_id, expected_score) in zip(got, expected):
+            assert got_id == expected_id or abs(got_score - expected_score) < 1e-5
+    dense_ms = statistics.median(dense) * 1000
+    print(f"  dense per query  one query p50 {dense_ms:8.2f} ms   "
+          f"({dense_ms / (statistics.median(single) * 1000):.0f}x slower, same top {K} scores)")
+
+    all_pairs_gb = n * n * 8 / 1e9
+    if n <= ALL_PAIRS_MAX:
+        t = time.perf_counter()
+        similarities = cosine_similarity(matrix)
+        all_pairs_s = time.perf_counter() - t
+        print(f"  dense all-pairs  cosine_similarity(X) {all_pairs_s:6.1f} s, "
+              f"{similarities.nbytes / 1e9:.1f} GB result")
+        del similarities
+    else:
+        print(f"  dense all-pairs  skipped: the {n:,} x {n:,} result alone needs {all_pairs_gb:,.0f} GB")
+    return index, documents
+
+
+def bench_add(index, vocabulary, rng):
+    new_documents = make_corpus(1000, vocabulary, rng)
+    times = []
+    for i in range(0, len(new_documents), 100):
+        t = time.perf_counter()
+        ids = index.add(new_documents[i:i + 100])
+        times.append(time.perf_counter() - t)
+    t = time.perf_counter()
+    hits = sum(index.search(new_documents[j], 1)[0][0] == ids.start - 900 + j for j in range(0, 1000, 50))
+    search_s = (time.perf_counter() - t) / 20
+    print(f"  add() 10 x 100 documents: p50 {statistics.median(times) * 1000:.1f} ms per call, "
+          f"max {max(times) * 1000:.1f} ms; search with a delta index {search_s * 1000:.2f} ms; "
+          f"{hits}/20 added documents found first")
+    assert hits == 20
+
+
+def main(args):
+    rng = np.random.default_rng(0)
+    vocabulary = make_vocabulary(rng)
+    index = None
+    for n in args.sizes:
+        if index is not None:
+            # Free the previous corpus before building the next one
+            del index
+        index, _ = bench_size(n, vocabulary, rng)
+    bench_add(index, vocabulary, rng)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10_000, 100_000, 1_000_000])
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,193 @@
+"""Per-call cost of utils.logger before and after the queue-based backend.
+
+The previous get_logger is reproduced here as legacy_get_logger: a new
+timestamped FileHandler per call and synchronous writes from the calling
+thread. The script compares the two on the calling thread for:
+
+- an enabled INFO call, written to a real file (console output goes to
+  os.devnull in both cases);
+- a DEBUG call at INFO level that formats a chat history with an f-string,
+  as animals_chat.app used to, against the same call with lazy arguments.
+
+It then checks that:
+
+- repeated get_logger calls open one log file, where the old one opened a
+  file per call;
+- at INFO, a turn through animals_chat.app.animals_chat does no disk I/O and
+  formats no log message on the calling thread;
+- every queued record is in the log file after stop_logging;
+- the file rotates by size and keeps backup_count old files.
+"""
+
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+LOG_DIR = tempfile.mkdtemp(prefix="logging_bench_")
+os.environ["LOG_DIR"] = LOG_DIR
+os.environ["LOG_LEVEL"] = "INFO"
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+from utils import logger  # noqa: E402
+
+CALLS = 20_000
+HISTORY = [{"role": "user" if i % 2 else "assistant", "content": f"message {i} " * 20} for i in range(20)]
+
+
+def legacy_get_logger(name, log_dir, log_level="INFO"):
+    """get_logger as it was before the queue-based backend."""
+    _logs = logging.getLogger(name)
+    if not os.path.exists(log_dir):
+        os.makedirs(log_dir)
+    f_handler = logging.FileHandler(os.path.join(log_dir, f'{ datetime.now().strftime("%Y%m%d_%H%M%S") }.log'))
+    f_format = logging.Formatter("%(asctime)s, %(name)s, %(filename)s, %(lineno)d, %(funcName)s, %(levelname)s, %(message)s")
+    f_handler.setFormatter(f_format)
+    s_handler = logging.StreamHandler()
+    s_format = logging.Formatter("%(asctime)s, %(filename)s, %(lineno)d, %(levelname)s, %(message)s")
+    s_handler.setFormatter(s_format)
+    if not len(_logs.handlers):
+        _logs.addHandler(f_handler)
+        _logs.addHandler(s_handler)
+    _logs.setLevel(log_level)
+    return _logs
+
+
+class CountOpens:
+    """Counts the log files opened by logging.FileHandler and its subclasses."""
+
+    def __enter__(self):
+        self.opened = 0
+        self.original = logging.FileHandler._open
+
+        def counted_open(handler):
+            self.opened += 1
+            return self.original(handler)
+
+        logging.FileHandler._open = counted_open
+        return self
+
+    def __exit__(self, *exc):
+        logging.FileHandler._open = self.original
+
+
+def per_call_us(log, calls=CALLS):
+    start = time.perf_counter()
+    for i in range(calls):
+        log(i)
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    devnull = open(os.devnull, "w")
+    stderr, sys.stderr = sys.stderr, devnull
+    try:
+        # The old get_logger opened a file on every call, used or not
+        legacy_dir = tempfile.mkdtemp(prefix="legacy_")
+        with CountOpens() as legacy_opens:
+            for _ in range(100):
+                legacy = legacy_get_logger("bench.legacy", legacy_dir)
+        with CountOpens() as current_opens:
+            for _ in range(100):
+                current = logger.get_logger("bench.current")
+            # The file is opened on the first write; stopping waits for it
+            current.info("first record")
+            logger.stop_logging()
+            current = logger.get_logger("bench.current")
+    finally:
+        sys.stderr = stderr
+    print(f"100 get_logger calls: {legacy_opens.opened} files opened before, {current_opens.opened} now")
+    assert current_opens.opened == 1 and legacy_opens.opened == 100
+
+    sys.stderr = devnull
+    try:
+        legacy_info = per_call_us(lambda i: legacy.info("Session %s: %s", "abc", i))
+        current_info = per_call_us(lambda i: current.info("Session %s: %s", "abc", i))
+        legacy_debug = per_call_us(lambda i: legacy.debug(f"Session abc: {i} {HISTORY}"))
+        lazy_debug = per_call_us(lambda i: current.debug("Session %s: %s %s", "abc", i, HISTORY))
+        logger.stop_logging()
+    finally:
+        sys.stderr = stderr
+    print(f"per call on the calling thread ({CALLS} calls):")
+    print(f"  INFO, written          before {legacy_info:6.2f} us   now {current_info:6.2f} us")
+    print(f"  DEBUG at INFO, history before {legacy_debug:6.2f} us   now {lazy_debug:6.2f} us")
+    assert current_info < legacy_info and lazy_debug < legacy_debug
+
+    with open(logger.get_log_file(), encoding="utf-8") as f:
+        written = sum(1 for line in f if ", bench.current, " in line)
+    assert written == CALLS + 1, written
+    print(f"  all {written} queued records written by stop_logging")
+
+    hot_path()
+    rotation()
+
+
+def hot_path():
+    from langchain_core.messages import AIMessage
+
+    from animals_chat import app
+
+    class StubAgent:
+        # The thread is checked against the history before each turn
+        checkpointer = app.checkpointer
+
+        def get_state(self, config):
+            return SimpleNamespace(values={})
+
+        def invoke(self, state, config, durability=None):
+            return {"messages": state["messages"] + [AIMessage("A fact about cats.")]}
+
+    app.llm = StubAgent()
+    app.checkpointer.delete_thread = lambda thread_id: None
+    caller = threading.get_ident()
+    caller_writes = []
+    caller_formats = []
+
+    format_message = logging.LogRecord.getMessage
+
+    def get_message(record):
+        if threading.get_ident() == caller:
+            caller_formats.append(record.msg)
+        return format_message(record)
+
+    logger.get_logger("animals_chat.app")
+    file_handler = logger._listener.handlers[0]
+    emit = file_handler.emit
+
+    def checked_emit(record):
+        if threading.get_ident() == caller:
+            caller_writes.append(record.msg)
+        emit(record)
+
+    logging.LogRecord.getMessage = get_message
+    file_handler.emit = checked_emit
+    try:
+        for i in range(100):
+            app.animals_chat(f"Tell me about cats {i}", HISTORY)
+    finally:
+        logging.LogRecord.getMessage = format_message
+        file_handler.emit = emit
+    print(f"100 animals_chat turns at INFO: {len(caller_writes)} writes and "
+          f"{len(caller_formats)} formatted messages on the calling thread")
+    assert not caller_writes and not caller_formats
+
+
+def rotation():
+    directory = tempfile.mkdtemp(prefix="rotation_")
+    handler = logger.RotatingLogFileHandler(os.path.join(directory, "app.log"), max_bytes=10_000, backup_count=3)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    for i in range(2000):
+        handler.emit(logging.makeLogRecord({"msg": f"record {i:05d} " + "x" * 40}))
+    handler.close()
+    files = sorted(os.listdir(directory))
+    sizes = [os.path.getsize(os.path.join(directory, name)) for name in files]
+    print(f"rotation at 10 kB, 3 backups: {len(files)} files, largest {max(sizes)} bytes")
+    assert len(files) == 4 and max(sizes) <= 10_000 + 100
+
+
+if __name__ == "__main__":
+    main()
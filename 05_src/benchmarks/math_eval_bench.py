@@ -0,0 +1,112 @@
+"""The math tool's local evaluation of plain expressions against numexpr.evaluate.
+
+math_tools evaluates plain numeric problems with compiled numexpr programs
+shared per expression shape. The script checks that every case below gives
+the same output as numexpr.evaluate on the original text, or fails where it
+raised. The cases cover integer overflow, division and modulo by zero, abs()
+of integers and non-finite results. It then times both on common shapes,
+filled with new numbers on every call.
+
+The batch path of batch_math, _evaluate_expressions, runs same-shaped
+expressions as one vectorized call. It is checked on the same cases, each
+repeated with other numbers so that every shape forms a group, and timed
+against evaluating the batch one expression at a time.
+"""
+
+import math
+import os
+import time
+import warnings
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import numexpr  # noqa: E402
+
+from math_tools import _evaluate_expression, _evaluate_expressions  # noqa: E402
+
+CASES = [
+    "37593 * 67", "37593**(1/5)", "7/2", "6/2", "10/4", "2**10", "2**0.5", "2**-1",
+    "-2**2", "(-2)**2", "2**3**2", "-(3)", "3*pi", "sin(pi/2) + e", "1e-320",
+    "-7.5%2", "5%2.5", "-7%3", "7%-3", "10%3", "abs(-3)", "abs(-3)*2", "abs(-3.5)",
+    "99999999999*99999999999", "2**62*4", "3**40", "3**(40)", "3037000500*3037000500",
+    "(3037000500*3037000500) % 7", "99999999999999999999+1",
+    "1/0", "0/0", "10%0", "1e308*10", "1e200*1e200", "sqrt(-1)", "log(0)",
+]
+# Resolved plans give the same shapes with new numbers on each call
+TIMED = ["{} * 67", "12.5 * {} + 3", "({} - 300) / 12", "sqrt({}) * 10", "{}*pi"]
+REPEATS = 2_000
+BATCH = 200
+
+
+def reference(expression):
+    """The output of numexpr.evaluate as math_tools formats it, or None if it raises."""
+    try:
+        output = str(numexpr.evaluate(expression, global_dict={}, local_dict={"pi": math.pi, "e": math.e}))
+    except Exception:
+        return None
+    return output.strip("[]")
+
+
+def local(expression):
+    try:
+        return _evaluate_expression(expression)
+    except ValueError:
+        return None
+
+
+def check_cases():
+    for expression in CASES:
+        expected, got = reference(expression), local(expression)
+        assert got == expected, (expression, got, expected)
+    print(f"{len(CASES)} expressions: same output as numexpr.evaluate, or an error where it raised")
+
+
+def per_call_us(evaluate):
+    start = time.perf_counter()
+    for i in range(REPEATS):
+        for expression in TIMED:
+            evaluate(expression.format(i + 1))
+    return (time.perf_counter() - start) / (REPEATS * len(TIMED)) * 1e6
+
+
+def timing():
+    evaluate = per_call_us(reference)
+    compiled = per_call_us(local)
+    print(f"per expression: numexpr.evaluate {evaluate:6.1f} us, compiled shapes {compiled:6.1f} us")
+
+
+def check_batch():
+    # Each case next to a same-shaped one with other numbers, e.g. 1/0 and 2/0
+    expressions = []
+    for expression in CASES:
+        expressions += [expression, expression.replace("1", "2")]
+    for expression, output in zip(expressions, _evaluate_expressions(expressions)):
+        expected = reference(expression)
+        got = None if isinstance(output, ValueError) else output
+        assert got == expected, (expression, got, expected)
+    print(f"batch of {len(expressions)} expressions: same outputs and errors as numexpr.evaluate")
+
+
+def batch_timing():
+    expressions = [TIMED[i % len(TIMED)].format(i + 1) for i in range(BATCH)]
+    start = time.perf_counter()
+    batched = _evaluate_expressions(expressions)
+    batch_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    single = [local(expression) for expression in expressions]
+    single_ms = (time.perf_counter() - start) * 1000
+    assert batched == single
+    print(f"{BATCH} expressions, {len(TIMED)} shapes: batched {batch_ms:.2f} ms, one by one {single_ms:.2f} ms")
+
+
+def main():
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        check_cases()
+        check_batch()
+    timing()
+    batch_timing()
+
+
+if __name__ == "__main__":
+    main()
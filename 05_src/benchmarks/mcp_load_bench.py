@@ -0,0 +1,211 @@
+"""Load test of the MCP servers over the http and in-memory transports.
+
+For each server and transport, N concurrent clients each open their own
+fastmcp Client session and make CALLS calls drawn from a weighted call mix.
+The results are printed as JSON: throughput, error rate, and p50/p95/p99
+latency per operation and overall, one record per (server, transport, N).
+
+Over http, the server runs in its own process, as it would in a deployment,
+and the clients share this process's event loop. Over the in-memory
+transport, client and server run on one loop, which measures the MCP and
+tool overhead without the network stack.
+
+Operations the server does not offer are dropped from its mix, e.g. greet
+on the weather server. Examples:
+
+    python -m benchmarks.mcp_load_bench
+    python -m benchmarks.mcp_load_bench --servers static_weather_mcp --transports http \\
+        --clients 1 10 100 --calls 50 --mix weather_service=4,list_tools=1 --output mcp_load.json
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("FASTMCP_LOG_LEVEL", "CRITICAL")
+
+from fastmcp import Client  # noqa: E402
+
+SERVERS = {
+    "static_mcp": "static_mcp.server",
+    "static_weather_mcp": "static_weather_mcp.server",
+}
+
+OPERATIONS = {
+    "greet": lambda client, i: client.call_tool("greet", {"name": f"user {i}"}),
+    "weather_service": lambda client, i: client.call_tool("weather_service", {"location": f"City {i % 50}"}),
+    "weather_service_batch": lambda client, i: client.call_tool(
+        "weather_service_batch", {"locations": [f"City {(i + k) % 50}" for k in range(10)]}),
+    "list_tools": lambda client, i: client.list_tools(),
+}
+
+DEFAULT_MIX = "greet=2,weather_service=2,weather_service_batch=1,list_tools=1"
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {name}; choose from {sorted(OPERATIONS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_http_server(module: str, port: int = None):
+    port = port or free_port()
+    code = (f"from {module} import mcp; "
+            f"mcp.run(transport='http', host='127.0.0.1', port={port}, show_banner=False, log_level='warning')")
+    process = subprocess.Popen([sys.executable, "-c", code], cwd=os.path.dirname(os.path.dirname(__file__)),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{module} exited with code {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return process, f"http://127.0.0.1:{port}/mcp"
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"{module} did not start listening on port {port}")
+
+
+def percentile(sorted_values: list, q: float):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def summarize(latencies: list, errors: int, elapsed: float = None) -> dict:
+    values = sorted(latencies)
+    calls = len(values) + errors
+    summary = {
+        "calls": calls,
+        "errors": errors,
+        "error_rate": errors / calls if calls else 0.0,
+        "p50_ms": statistics.median(values) * 1000 if values else None,
+        "p95_ms": percentile(values, 0.95) * 1000 if values else None,
+        "p99_ms": percentile(values, 0.99) * 1000 if values else None,
+    }
+    if elapsed is not None:
+        summary["throughput_per_s"] = calls / elapsed if elapsed else None
+        summary["elapsed_s"] = elapsed
+    return summary
+
+
+async def run_client(target, mix: dict, calls: int, seed: int, results: dict):
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    async with Client(target) as client:
+        for i in range(calls):
+            name = rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                await OPERATIONS[name](client, seed * calls + i)
+            except Exception as e:
+                results[name]["errors"] += 1
+                results[name]["last_error"] = f"{type(e).__name__}: {e}"
+            else:
+                results[name]["latencies"].append(time.perf_counter() - start)
+
+
+async def run_load(target, mix: dict, clients: int, calls: int) -> dict:
+    results = {name: {"latencies": [], "errors": 0} for name in mix}
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*(run_client(target, mix, calls, seed, results) for seed in range(clients)),
+                                    return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    # A client that could not connect counts all its calls as errors
+    failed_sessions = [o for o in outcomes if isinstance(o, Exception)]
+    latencies = [lat for r in results.values() for lat in r["latencies"]]
+    errors = sum(r["errors"] for r in results.values())
+    done = len(latencies) + errors
+    overall = summarize(latencies, errors + (clients * calls - done), elapsed)
+    overall["failed_sessions"] = len(failed_sessions)
+    if failed_sessions:
+        overall["session_error"] = f"{type(failed_sessions[0]).__name__}: {failed_sessions[0]}"
+    operations = {}
+    for name, r in results.items():
+        operations[name] = summarize(r["latencies"], r["errors"])
+        if "last_error" in r:
+            operations[name]["last_error"] = r["last_error"]
+    return {"overall": overall, "operations": operations}
+
+
+async def available_operations(target, mix: dict) -> dict:
+    async with Client(target) as client:
+        tools = {tool.name for tool in await client.list_tools()}
+    return {name: weight for name, weight in mix.items() if name == "list_tools" or name in tools}
+
+
+async def bench_server(name: str, transport: str, mix: dict, clients: list, calls: int) -> list:
+    module = importlib.import_module(SERVERS[name])
+    process = None
+    if transport == "http":
+        process, target = start_http_server(SERVERS[name])
+    else:
+        target = module.mcp
+    records = []
+    try:
+        server_mix = await available_operations(target, mix)
+        for n in clients:
+            result = await run_load(target, server_mix, n, calls)
+            records.append({
+                "server": name, "transport": transport, "clients": n, "calls_per_client": calls,
+                "mix": server_mix, **result,
+            })
+            overall = result["overall"]
+            print(f"{name:<19} {transport:<7} {n:>4} clients  {overall['throughput_per_s']:8.1f} calls/s  "
+                  f"p50 {overall['p50_ms'] or 0:7.1f} ms  p95 {overall['p95_ms'] or 0:7.1f} ms  "
+                  f"p99 {overall['p99_ms'] or 0:7.1f} ms  errors {overall['error_rate']:.1%}", file=sys.stderr)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    return records
+
+
+async def main(args):
+    records = []
+    for name in args.servers:
+        for transport in args.transports:
+            records += await bench_server(name, transport, args.mix, args.clients, args.calls)
+    report = {"python": sys.version.split()[0], "cpus": os.cpu_count(), "results": records}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--servers", nargs="+", choices=sorted(SERVERS), default=sorted(SERVERS))
+    parser.add_argument("--transports", nargs="+", choices=["http", "memory"], default=["memory", "http"])
+    parser.add_argument("--clients", nargs="+", type=int, default=[1, 10, 50])
+    parser.add_argument("--calls", type=int, default=20, help="calls per client")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"weighted operations, default {DEFAULT_MIX}")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
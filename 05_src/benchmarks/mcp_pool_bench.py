@@ -0,0 +1,214 @@
+"""Compare per-call MCP clients with McpClientPool against the local weather server.
+
+static_weather_mcp.server runs over http in its own process. The script
+measures three ways to call weather_service:
+
+- the static_weather_mcp/test2.py pattern: a new Client per call, with ping,
+  list_tools, list_resources and list_prompts before the call;
+- a new Client per call that only makes the call;
+- McpClientPool, with list_tools from its cache before each call.
+
+It then checks that:
+
+- concurrent callers are multiplexed over the pool's few sessions;
+- a list-changed notification drops the cached tool list (in-memory server);
+- after the server restarts, the next call reconnects transparently, and
+  while it is down calls fail fast instead of waiting for the timeout;
+- a tool call whose session is lost after it was sent is not sent again,
+  while list_tools is retried on a new session.
+"""
+
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("FASTMCP_LOG_LEVEL", "CRITICAL")
+
+from fastmcp import Client, Context, FastMCP  # noqa: E402
+
+from benchmarks.mcp_load_bench import start_http_server  # noqa: E402
+from utils.mcp_client import McpClientPool, PooledSession, SessionLost  # noqa: E402
+
+SERVER = "static_weather_mcp.server"
+CALLS = 100
+CONCURRENT_CALLERS = 20
+CALLS_PER_CALLER = 10
+
+
+async def timed(calls, call):
+    times = []
+    for i in range(calls):
+        start = time.perf_counter()
+        result = await call(i)
+        times.append(time.perf_counter() - start)
+        assert result.data.temperature == 22.5
+    return times
+
+
+def report(label, times):
+    times = sorted(times)
+    print(f"  {label:<42} p50 {statistics.median(times) * 1000:6.2f} ms  "
+          f"p95 {times[int(0.95 * len(times))] * 1000:6.2f} ms")
+    return statistics.median(times)
+
+
+async def sequential(url):
+    async def test2_pattern(i):
+        async with Client(url) as client:
+            await client.ping()
+            await client.list_tools()
+            await client.list_resources()
+            await client.list_prompts()
+            return await client.call_tool("weather_service", {"location": f"City {i}"})
+
+    async def fresh_client(i):
+        async with Client(url) as client:
+            return await client.call_tool("weather_service", {"location": f"City {i}"})
+
+    pool = McpClientPool(sessions_per_server=2)
+
+    async def pooled(i):
+        tools = await pool.list_tools(url)
+        assert any(tool.name == "weather_service" for tool in tools)
+        return await pool.call_tool(url, "weather_service", {"location": f"City {i}"})
+
+    await pooled(0)
+    print(f"{CALLS} sequential weather_service calls over http:")
+    slow = report("new Client + ping and discovery (test2.py)", await timed(CALLS, test2_pattern))
+    fresh = report("new Client per call", await timed(CALLS, fresh_client))
+    fast = report("McpClientPool", await timed(CALLS, pooled))
+    print(f"  pool speedup: {slow / fast:.1f}x over test2.py, {fresh / fast:.1f}x over a new Client")
+    stats = pool.metrics()[url]
+    print(f"  {stats}")
+    assert stats["connects"] == 1 and stats["discovery_misses"] == 1
+    assert fast < fresh
+    await pool.aclose()
+
+
+async def concurrent(url):
+    pool = McpClientPool(sessions_per_server=4)
+
+    async def caller(n):
+        for i in range(CALLS_PER_CALLER):
+            await pool.call_tool(url, "weather_service", {"location": f"City {n}-{i}"})
+
+    start = time.perf_counter()
+    await asyncio.gather(*(caller(n) for n in range(CONCURRENT_CALLERS)))
+    elapsed = time.perf_counter() - start
+    stats = pool.metrics()[url]
+    calls = CONCURRENT_CALLERS * CALLS_PER_CALLER
+    print(f"{CONCURRENT_CALLERS} concurrent callers: {calls} calls in {elapsed:.2f}s "
+          f"({calls / elapsed:.0f} calls/s) over {stats['sessions']} sessions")
+    assert stats["sessions"] <= 4 and stats["requests"] == calls and stats["failures"] == 0
+    await pool.aclose()
+
+
+async def notifications():
+    server = FastMCP("notifying")
+    state = {"tools": 1}
+
+    @server.tool
+    async def add_tool(ctx: Context) -> int:
+        state["tools"] += 1
+        server.tool(lambda: "ok", name=f"extra_{state['tools']}")
+        await ctx.send_tool_list_changed()
+        return state["tools"]
+
+    pool = McpClientPool()
+    assert len(await pool.list_tools(server)) == 1
+    assert len(await pool.list_tools(server)) == 1
+    await pool.call_tool(server, "add_tool")
+    # The notification is handled by the session's reader task
+    await asyncio.sleep(0.05)
+    tools = await pool.list_tools(server)
+    stats = pool.metrics()[server]
+    print(f"list-changed notification: {len(tools)} tools after refresh, {stats}")
+    assert len(tools) == 2 and stats["discovery_hits"] == 1 and stats["discovery_misses"] == 2
+    await pool.aclose()
+
+
+async def lost_session():
+    server = FastMCP("losing")
+    state = {"runs": 0, "losses": 0}
+
+    @server.tool
+    def run_once() -> int:
+        state["runs"] += 1
+        return state["runs"]
+
+    request = PooledSession.request
+
+    async def lose_once_after_sending(session, send):
+        result = await request(session, send)
+        if not state["losses"]:
+            state["losses"] += 1
+            raise SessionLost("connection dropped before the response")
+        return result
+
+    pool = McpClientPool(retries=1)
+    PooledSession.request = lose_once_after_sending
+    try:
+        try:
+            await pool.call_tool(server, "run_once")
+        except SessionLost:
+            pass
+        else:
+            raise AssertionError("a tool call was retried after it was sent")
+        assert state["runs"] == 1, state
+        state["losses"] = 0
+        tools = await pool.list_tools(server)
+        assert len(tools) == 1 and state["losses"] == 1 and pool.metrics()[server]["reconnects"] == 1
+    finally:
+        PooledSession.request = request
+        await pool.aclose()
+    print(f"session lost after sending: tool ran {state['runs']} time, list_tools retried on a new session")
+
+
+async def restart():
+    process, url = start_http_server(SERVER)
+    port = int(url.rsplit(":", 1)[1].split("/")[0])
+    pool = McpClientPool(timeout=30, retries=1)
+    await pool.call_tool(url, "weather_service", {"location": "Toronto"})
+
+    process.terminate()
+    process.wait()
+    start = time.perf_counter()
+    try:
+        await pool.call_tool(url, "weather_service", {"location": "Toronto"})
+    except Exception as e:
+        failed = time.perf_counter() - start
+        print(f"server down: failed in {failed * 1000:.0f} ms with {type(e).__name__} (timeout 30 s)")
+        assert failed < 5
+    else:
+        raise AssertionError("call to a stopped server succeeded")
+
+    process, _ = start_http_server(SERVER, port)
+    try:
+        start = time.perf_counter()
+        result = await pool.call_tool(url, "weather_service", {"location": "Toronto"})
+        reconnected = time.perf_counter() - start
+        assert result.data.temperature == 22.5
+        print(f"server restarted: first call reconnected in {reconnected * 1000:.0f} ms, {pool.metrics()[url]}")
+    finally:
+        await pool.aclose()
+        process.terminate()
+        process.wait()
+
+
+async def main():
+    process, url = start_http_server(SERVER)
+    try:
+        await sequential(url)
+        await concurrent(url)
+    finally:
+        process.terminate()
+        process.wait()
+    await notifications()
+    await lost_session()
+    await restart()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
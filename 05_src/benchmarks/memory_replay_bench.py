@@ -0,0 +1,98 @@
+"""Replay long conversations through ConversationMemory against a stub model.
+
+Three sessions of TURNS turns each are interleaved, the way Gradio sends a
+growing history on every turn. The stub summarizer returns a deterministic
+summary and records what it was asked to summarize. The script checks that:
+
+- no request exceeds max_tokens, however long the session gets;
+- the summarizer only sees the previous summary and newly folded messages;
+- it runs once every several turns, not on every turn;
+- sessions never pick up each other's summaries.
+"""
+
+import os
+import random
+import time
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from utils.memory import ConversationMemory, SUMMARY_PREFIX  # noqa: E402
+
+TURNS = 500
+SESSIONS = 3
+MAX_TOKENS = 3000
+RECENT_TOKENS = 1500
+SUMMARY_TOKENS = 500
+
+WORDS = "cat dog leo virgo fact horoscope tomorrow weather river cloud tea market".split()
+
+
+class StubSummarizer:
+    def __init__(self):
+        self.calls = 0
+        self.max_input_messages = 0
+
+    def __call__(self, summary, messages):
+        self.calls += 1
+        self.max_input_messages = max(self.max_input_messages, len(messages))
+        session = messages[0]["content"].split(":")[0]
+        # Keep the summary growing so truncation is exercised too
+        folded = " ".join(m["content"][:40] for m in messages)
+        return f"{session}: {summary} | {folded}".strip()
+
+
+def make_message(rng, session, role, turn):
+    words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 250)))
+    return {"role": role, "content": f"{session}: turn {turn} {words}"}
+
+
+def main():
+    rng = random.Random(0)
+    summarizer = StubSummarizer()
+    memory = ConversationMemory(summarizer, max_tokens=MAX_TOKENS,
+                                recent_tokens=RECENT_TOKENS, summary_tokens=SUMMARY_TOKENS)
+    histories = {f"session{i}": [] for i in range(SESSIONS)}
+
+    full_tokens = []
+    sent_tokens = []
+    build_times = []
+    for turn in range(TURNS):
+        for session, history in histories.items():
+            start = time.perf_counter()
+            messages = memory.build(history)
+            build_times.append(time.perf_counter() - start)
+
+            sent = memory.count(messages)
+            assert sent <= MAX_TOKENS, (session, turn, sent)
+            for message in messages:
+                # Every message, including the summary, belongs to this session
+                content = message["content"].removeprefix(SUMMARY_PREFIX)
+                assert content.startswith(f"{session}:"), (session, content[:30])
+            if history:
+                assert messages[-1] == history[-1]
+            sent_tokens.append(sent)
+            full_tokens.append(memory.count(history))
+
+            history.append(make_message(rng, session, "user", turn))
+            history.append(make_message(rng, session, "assistant", turn))
+
+    total_turns = TURNS * SESSIONS
+    build_times.sort()
+    stats = memory.stats()
+    print(f"{SESSIONS} sessions x {TURNS} turns, budget {MAX_TOKENS} tokens "
+          f"({RECENT_TOKENS} recent, {SUMMARY_TOKENS} summary)")
+    print(f"  history size at the last turn:   {max(full_tokens):>8} tokens")
+    print(f"  largest request sent:            {max(sent_tokens):>8} tokens")
+    print(f"  total tokens sent:               {sum(sent_tokens):>8} (full history: {sum(full_tokens)})")
+    print(f"  summarizer calls:                {summarizer.calls:>8} for {total_turns} turns "
+          f"(one per {total_turns / summarizer.calls:.1f} turns)")
+    print(f"  most messages in one summary:    {summarizer.max_input_messages:>8}")
+    print(f"  build p50 / p99:                 {build_times[len(build_times) // 2] * 1e3:.3f} / "
+          f"{build_times[int(0.99 * len(build_times))] * 1e3:.3f} ms")
+    print(f"  token count cache:               {stats['token_cache_hits']} hits, "
+          f"{stats['token_cache_misses']} misses")
+    assert summarizer.calls < total_turns / 2
+
+
+if __name__ == "__main__":
+    main()
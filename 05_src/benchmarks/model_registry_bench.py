@@ -0,0 +1,88 @@
+"""Per-step cost of building the animals_chat model binding versus the registry.
+
+Before the registry, llm_call ran init_chat_model and bind_tools on every
+graph step and tool_node rebuilt its tools_by_name dict. No request is sent:
+the script only times what happens before the model is called, and checks
+that the registry builds each binding once, even when many threads ask for
+it at the same time, and that bindings share one HTTP connection pool.
+"""
+
+import os
+import statistics
+import threading
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from langchain.chat_models import init_chat_model  # noqa: E402
+
+from animals_chat import main  # noqa: E402
+from utils.model_registry import ModelRegistry, get_model_registry  # noqa: E402
+
+STEPS = 200
+THREADS = 16
+
+
+def rebuilt_step():
+    model = init_chat_model("openai:gpt-4o-mini", temperature=0.7)
+    model_with_tools = model.bind_tools([main.get_cat_facts, main.get_dog_facts])
+    tools_by_name = {tool.name: tool for tool in [main.get_cat_facts, main.get_dog_facts]}
+    return model_with_tools, tools_by_name
+
+
+def registry_step():
+    return main.get_model_with_tools(), main.TOOLS_BY_NAME
+
+
+def time_steps(step):
+    times = []
+    for _ in range(STEPS):
+        start = time.perf_counter()
+        step()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main_bench():
+    rebuilt = time_steps(rebuilt_step)
+    cached = time_steps(registry_step)
+    print(f"{STEPS} graph steps, setup before each model call")
+    for name, times in (("rebuilt", rebuilt), ("registry", cached)):
+        print(f"  {name:<9} mean {statistics.mean(times) * 1e6:9.1f} us   "
+              f"p50 {statistics.median(times) * 1e6:9.1f} us   total {sum(times) * 1e3:8.1f} ms")
+    print(f"  removed per step: {(statistics.mean(rebuilt) - statistics.mean(cached)) * 1e3:.2f} ms")
+
+    # The binding and its model are the same objects on every step
+    assert main.get_model_with_tools() is main.get_model_with_tools()
+    registry = get_model_registry()
+    plain = registry.chat_model("openai:gpt-4o-mini", temperature=0.7)
+    assert main.get_model_with_tools().bound is plain
+    other = registry.chat_model("openai:gpt-4o-mini", tools=[main.get_cat_facts], temperature=0.7)
+    assert other.bound.root_client is plain.root_client
+
+    # Concurrent first use builds once
+    registry = ModelRegistry()
+    barrier = threading.Barrier(THREADS)
+    results = []
+
+    def first_use():
+        barrier.wait()
+        results.append(registry.chat_model("gpt-4o-mini", model_provider="openai", tools=main.TOOLS))
+
+    threads = [threading.Thread(target=first_use) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(result is results[0] for result in results)
+    metrics = registry.metrics()
+    assert metrics["entries"] == 2 and metrics["hits"] == 2 * THREADS - 2, metrics
+    print(f"{THREADS} threads asking at once: {metrics['entries']} entries built "
+          f"in {metrics['init_ms']:.1f} ms, {metrics['hits']} reuses")
+    for entry in get_model_registry().metrics()["per_entry"]:
+        print(f"  process registry: {entry}")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,90 @@
+"""Scaling of LLMCompilerPlanParser with plan length and number of registered tools.
+
+It also checks that the dependencies of parsed plans, the join included,
+serialize to JSON.
+"""
+
+import json
+import re
+import time
+
+from langchain_core.tools import StructuredTool
+
+from output_parser import (
+    ACTION_PATTERN,
+    ID_PATTERN,
+    LLMCompilerPlanParser,
+    _parse_llm_compiler_action_args,
+)
+
+N_TOOLS = 500
+
+
+def make_tools(n_tools: int):
+    def run(query: str) -> str:
+        return query
+
+    return [
+        StructuredTool.from_function(run, name=f"tool_{i}", description=f"Tool {i}.")
+        for i in range(n_tools)
+    ]
+
+
+def make_plan(n_tasks: int, n_tools: int) -> str:
+    lines = []
+    for idx in range(1, n_tasks + 1):
+        # Reference a couple of earlier tasks, like a typical chained plan
+        refs = f"${idx - 1} and ${max(1, idx // 2)}" if idx > 1 else "start"
+        lines.append(f'{idx}. tool_{idx % n_tools}(query="combine {refs}")')
+    lines.append(f"{n_tasks + 1}. join()")
+    return "\n".join(lines)
+
+
+def legacy_parse(tools, plan: str):
+    """Tool lookup and dependency extraction as they were before indexing."""
+    tasks = []
+    for line in plan.split("\n"):
+        match = re.match(ACTION_PATTERN, line)
+        idx, tool_name, args, _ = match.groups()
+        idx = int(idx)
+        if tool_name == "join":
+            tool = "join"
+            tasks.append(list(range(1, idx)))
+            continue
+        tool = tools[[tool.name for tool in tools].index(tool_name)]
+        tool_args = _parse_llm_compiler_action_args(args, tool)
+        tasks.append(
+            [
+                i
+                for i in range(1, idx)
+                if i in [int(m) for m in re.findall(ID_PATTERN, str(tool_args))]
+            ]
+        )
+    return tasks
+
+
+def main():
+    tools = make_tools(N_TOOLS)
+    parser = LLMCompilerPlanParser(tools=tools)
+    print(f"{N_TOOLS} registered tools")
+    for n_tasks in (1_000, 2_000, 5_000, 10_000):
+        plan = make_plan(n_tasks, N_TOOLS)
+
+        start = time.perf_counter()
+        tasks = parser.parse(plan)
+        indexed = time.perf_counter() - start
+        assert len(tasks) == n_tasks + 1
+        json.dumps([task["dependencies"] for task in tasks])
+
+        line = f"tasks={n_tasks:6d} indexed={indexed:7.3f}s ({indexed / n_tasks * 1e6:6.1f} us/task)"
+        if n_tasks <= 2_000:
+            # The quadratic path gets impractically slow beyond this size
+            start = time.perf_counter()
+            legacy_parse(tools, plan)
+            legacy = time.perf_counter() - start
+            line += f" legacy={legacy:7.3f}s ({legacy / n_tasks * 1e6:8.1f} us/task)"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
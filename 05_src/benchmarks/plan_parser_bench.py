@@ -0,0 +1,99 @@
+"""Tokenizing cost of streamed LLMCompiler plans: line splitting vs PlanLineAssembler.
+
+The legacy splitter only finds a task once its line ends; the assembler emits
+it as soon as the closing `)` arrives. The last case streams one long action
+whose string argument is full of `)`, where the cost per character must not
+grow with the length of the line.
+"""
+
+import re
+import time
+
+from output_parser import ACTION_PATTERN, THOUGHT_PATTERN, PlanLineAssembler
+
+N_TASKS = 10_000
+
+
+def make_plan(n_tasks: int) -> str:
+    lines = []
+    for idx in range(1, n_tasks + 1):
+        if idx % 5 == 1:
+            lines.append(f"Thought: look up item number {idx} and combine it")
+        if idx % 2:
+            lines.append(f'{idx}. search(query="population of city {idx} (2024)")')
+        else:
+            lines.append(f'{idx}. math(problem="${idx - 1} * 1.05", context=["${idx - 1}"])')
+    lines.append(f"{n_tasks + 1}. join()")
+    lines.append("<END_OF_PLAN>")
+    return "\n".join(lines)
+
+
+def chunked(text: str, size: int):
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def legacy_ingest_token(token, buffer):
+    """The previous LLMCompilerPlanParser.ingest_token, with uncompiled regexes."""
+    buffer.append(token)
+    if "\n" in token:
+        buffer_ = "".join(buffer).split("\n")
+        suffix = buffer_[-1]
+        for line in buffer_[:-1]:
+            if re.match(THOUGHT_PATTERN, line) or re.match(ACTION_PATTERN, line):
+                yield line
+        buffer.clear()
+        buffer.append(suffix)
+
+
+def legacy_segments(chunks):
+    buffer = []
+    found = 0
+    for token in chunks:
+        for _ in legacy_ingest_token(token, buffer):
+            found += 1
+    return found
+
+
+def assembler_segments(chunks):
+    thought_regex = re.compile(THOUGHT_PATTERN)
+    action_regex = re.compile(ACTION_PATTERN)
+    assembler = PlanLineAssembler()
+    found = 0
+    for token in chunks:
+        for segment in assembler.feed(token):
+            if thought_regex.match(segment) or action_regex.match(segment):
+                found += 1
+    last = assembler.flush()
+    return found + bool(last and action_regex.match(last))
+
+
+def long_action_ns_per_char(arg_reps: int, size: int = 4) -> float:
+    line = f'1. search(query="{"(x) " * arg_reps}")\n'
+    assembler = PlanLineAssembler()
+    start = time.perf_counter()
+    segments = [segment for token in chunked(line, size) for segment in assembler.feed(token)]
+    elapsed = time.perf_counter() - start
+    assert segments == [line.rstrip()]
+    return elapsed / len(line) * 1e9
+
+
+def main():
+    plan = make_plan(N_TASKS)
+    print(f"plan: {N_TASKS} tasks, {len(plan)} characters")
+    for size in (1, 64):
+        chunks = chunked(plan, size)
+        for name, fn in [("legacy", legacy_segments), ("assembler", assembler_segments)]:
+            start = time.perf_counter()
+            found = fn(chunks)
+            elapsed = time.perf_counter() - start
+            print(
+                f"chunk={size:3d} {name:10s} {elapsed * 1000:8.1f} ms "
+                f"({elapsed / len(plan) * 1e9:6.1f} ns/char, {found} segments)"
+            )
+    short, long = long_action_ns_per_char(10_000), long_action_ns_per_char(100_000)
+    print(f"long action, chunk=  4: {short:.1f} ns/char at 40k chars, {long:.1f} ns/char at 400k chars")
+    assert long < 2 * short
+
+
+if __name__ == "__main__":
+    main()
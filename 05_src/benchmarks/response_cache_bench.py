@@ -0,0 +1,208 @@
+"""Replay FAQ-style traffic through ResponseCache and simple_chat with a stub model.
+
+Embeddings come from a deterministic local function: a hashed bag of word
+stems, so paraphrases that share most words land close together and no
+embedding API is needed. The stub model takes MODEL_LATENCY per call and
+answers with the id of the FAQ it was asked about, so every cached answer
+can be checked against the question it was served for.
+
+The script checks that:
+
+- repeated and reworded first-turn questions are served from the exact and
+  semantic tiers, and only with the answer to the same FAQ;
+- unrelated questions and different model params never match;
+- multi-turn requests bypass the cache;
+- entries expire after the TTL and the least recently used go first;
+- a lookup only calls the embedding function when an entry with the same
+  params could match, and never matches a free slot, even at threshold -1;
+- simple_chat and simple_chat_stream answer hits without calling the model.
+"""
+
+import hashlib
+import os
+import random
+import re
+import time
+
+import numpy as np
+
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, SystemMessage  # noqa: E402
+
+from simple_chat import app as simple_app  # noqa: E402
+from utils.response_cache import ResponseCache  # noqa: E402
+
+MODEL_LATENCY = 0.05
+DIMENSIONS = 512
+THRESHOLD = 0.8
+REQUESTS = 1000
+STOPWORDS = set("a an the i my me do does can could you to of for is it how what please tell".split())
+
+FAQS = [
+    "how do i reset my password",
+    "what are your opening hours on weekends",
+    "where can i download my invoice",
+    "how long does shipping to canada take",
+    "can i change the email address on my account",
+    "what payment methods do you accept",
+    "how do i cancel my subscription",
+    "is there a student discount",
+    "how do i contact customer support by phone",
+    "can i return an item after thirty days",
+]
+PARAPHRASES = [
+    "{q}", "{Q}?", "  {q}  ", "please tell me {q}", "{q} please", "hi, {q}?",
+]
+UNRELATED = [
+    "write a haiku about autumn leaves",
+    "what is the capital of australia",
+    "explain recursion to a five year old",
+]
+
+
+def stem(word):
+    return re.sub(r"(ing|ed|es|s)$", "", word)
+
+
+def local_embedding(text):
+    """Deterministic hashed bag of word stems."""
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    for word in re.findall(r"[a-z]+", text.lower()):
+        if word in STOPWORDS:
+            continue
+        digest = hashlib.md5(stem(word).encode("utf-8")).digest()
+        vector[int.from_bytes(digest[:4], "little") % DIMENSIONS] += 1.0
+    return vector
+
+
+def cosine(a, b):
+    norm = np.linalg.norm(a) * np.linalg.norm(b)
+    return float(a @ b / norm) if norm else 0.0
+
+
+class StubModel:
+    model_name = "stub-model"
+    temperature = 0.7
+
+    def __init__(self):
+        self.calls = 0
+
+    def answer(self, messages):
+        self.calls += 1
+        time.sleep(MODEL_LATENCY)
+        question = messages[-1].content
+        for i, faq in enumerate(FAQS):
+            if cosine(local_embedding(faq), local_embedding(question)) > THRESHOLD:
+                return f"Answer to FAQ {i}."
+        return f"Answer to: {question}"
+
+    def invoke(self, messages):
+        return AIMessage(content=self.answer(messages))
+
+    def stream(self, messages):
+        for word in self.answer(messages).split(" "):
+            yield AIMessageChunk(content=word + " ")
+
+
+def faq_id(text):
+    match = re.search(r"FAQ (\d+)", text)
+    return int(match.group(1)) if match else None
+
+
+def main():
+    rng = random.Random(0)
+    model = StubModel()
+    cache = ResponseCache(embed=local_embedding, threshold=THRESHOLD, ttl=3600, max_entries=1000)
+
+    lookup_times = {"exact": [], "semantic": [], None: [], "bypass": []}
+    wrong = 0
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        roll = rng.random()
+        if roll < 0.1:
+            messages = [HumanMessage(rng.choice(UNRELATED)), AIMessage("..."), HumanMessage("and why?")]
+            expected = None
+        elif roll < 0.15:
+            messages = [HumanMessage(rng.choice(UNRELATED))]
+            expected = None
+        else:
+            # Zipf-like: a few FAQs get most of the traffic
+            i = min(int(rng.paretovariate(1.2)) - 1, len(FAQS) - 1)
+            q = FAQS[i]
+            messages = [HumanMessage(rng.choice(PARAPHRASES).format(q=q, Q=q.capitalize()))]
+            expected = i
+
+        t = time.perf_counter()
+        response, tier, embedding = cache.lookup(messages, {"model": model.model_name})
+        lookup_times[tier].append(time.perf_counter() - t)
+        if response is None:
+            t = time.perf_counter()
+            response = model.invoke(messages).content
+            cache.store(messages, {"model": model.model_name}, response, time.perf_counter() - t, embedding)
+        elif faq_id(response) != expected:
+            wrong += 1
+    elapsed = time.perf_counter() - start
+
+    stats = cache.stats()
+    print(f"{REQUESTS} requests ({len(FAQS)} FAQs x {len(PARAPHRASES)} phrasings, unrelated and multi-turn), "
+          f"model {MODEL_LATENCY * 1000:.0f} ms per call")
+    print(f"  {stats}")
+    print(f"  model calls: {model.calls} instead of {REQUESTS}, wall {elapsed:.2f}s "
+          f"(uncached ~{REQUESTS * MODEL_LATENCY:.2f}s)")
+    for tier, times in lookup_times.items():
+        if times:
+            print(f"  lookup {str(tier):<9} p50 {np.median(times) * 1e6:7.1f} us  ({len(times)} lookups)")
+    assert wrong == 0, wrong
+    assert stats["semantic_hits"] > 0 and stats["exact_hits"] > 0
+    assert stats["bypassed"] == len(lookup_times["bypass"])
+
+    # Different params never match, even for the same question
+    assert cache.lookup([HumanMessage(FAQS[0])], {"model": "other"})[0] is None
+    # Unrelated questions stay misses
+    assert cache.lookup([HumanMessage("how do i bake sourdough bread")], {"model": model.model_name})[0] is None
+    # Neither does the same question under another system prompt
+    assert cache.lookup([SystemMessage("Answer in French."), HumanMessage(FAQS[0])],
+                        {"model": model.model_name})[0] is None
+
+    # TTL and LRU
+    short = ResponseCache(embed=local_embedding, threshold=THRESHOLD, ttl=0.1, max_entries=3)
+    for q in FAQS[:4]:
+        short.store([HumanMessage(q)], {}, f"answer {q}")
+    assert short.lookup([HumanMessage(FAQS[0])], {})[0] is None, "LRU entry should be evicted"
+    assert short.lookup([HumanMessage(FAQS[3])], {})[0] is not None
+    time.sleep(0.15)
+    assert short.lookup([HumanMessage(FAQS[3])], {})[0] is None, "entry should expire"
+    assert short.lookup([HumanMessage(FAQS[3] + " please")], {})[0] is None
+    print("  TTL and LRU eviction: ok")
+
+    embedded = []
+    counted = ResponseCache(embed=lambda text: embedded.append(text) or local_embedding(text),
+                            threshold=-1.0, ttl=0.05, max_entries=3)
+    assert counted.lookup([HumanMessage(FAQS[0])], {})[0] is None and not embedded
+    counted.store([HumanMessage(FAQS[0])], {}, f"answer {FAQS[0]}")
+    assert counted.lookup([HumanMessage(FAQS[1])], {"model": "other"})[0] is None and len(embedded) == 1
+    assert counted.lookup([HumanMessage(FAQS[1])], {})[1] == "semantic" and len(embedded) == 2
+    time.sleep(0.1)
+    # The expired entry is evicted and only free slots are left
+    assert counted.lookup([HumanMessage(FAQS[1])], {})[0] is None and len(embedded) == 3
+    assert counted.lookup([HumanMessage(FAQS[1])], {})[0] is None and len(embedded) == 3
+    print("  embedding calls only with candidates, no free-slot matches: ok")
+
+    # Through the Gradio handlers
+    simple_app.llm = model
+    simple_app.response_cache = ResponseCache(embed=local_embedding, threshold=THRESHOLD)
+    calls = model.calls
+    first = simple_app.simple_chat("How do I reset my password?", [])
+    second = simple_app.simple_chat("how do i reset my password", [])
+    streamed = list(simple_app.simple_chat_stream("Please tell me how do I reset my password", []))[-1]
+    assert first == second == streamed and model.calls == calls + 1
+    history = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]
+    simple_app.simple_chat("How do I reset my password?", history)
+    assert model.calls == calls + 2
+    print(f"  simple_chat: {simple_app.response_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Compare the sleep-polling scheduler from the 07_1 lab with DAGExecutor."""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from task_executor import DAGExecutor
+
+TOOL_LATENCY = 0.05
+
+
+class SleepTool:
+    name = "sleep"
+
+    def invoke(self, args, config=None):
+        time.sleep(TOOL_LATENCY)
+        return "ok"
+
+
+def make_plan(levels: int, width: int):
+    """`levels` layers of `width` tasks, each layer depending on the previous one."""
+    tool = SleepTool()
+    tasks = []
+    previous = []
+    idx = 1
+    for _ in range(levels):
+        layer = []
+        for _ in range(width):
+            tasks.append(
+                {"idx": idx, "tool": tool, "args": {}, "dependencies": list(previous), "thought": None}
+            )
+            layer.append(idx)
+            idx += 1
+        previous = layer
+    return tasks
+
+
+def run_task(task, observations):
+    return task["tool"].invoke(task["args"])
+
+
+def polling_scheduler(tasks, retry_after=0.25):
+    """The scheduling loop from the lab, reduced to its timing behaviour."""
+    observations = {}
+
+    def schedule_pending_task(task):
+        while any(dep not in observations for dep in task["dependencies"]):
+            time.sleep(retry_after)
+        observations[task["idx"]] = run_task(task, observations)
+
+    futures = []
+    with ThreadPoolExecutor() as executor:
+        for task in tasks:
+            if any(dep not in observations for dep in task["dependencies"]):
+                futures.append(executor.submit(schedule_pending_task, task))
+            else:
+                observations[task["idx"]] = run_task(task, observations)
+        wait(futures)
+    return observations
+
+
+def main():
+    for levels, width in [(5, 1), (5, 4), (10, 8)]:
+        tasks = make_plan(levels, width)
+        ideal = levels * TOOL_LATENCY
+
+        start = time.perf_counter()
+        polling_scheduler(tasks)
+        polling = time.perf_counter() - start
+
+        start = time.perf_counter()
+        report = DAGExecutor(execute=run_task, max_workers=width).run(iter(tasks))
+        event_driven = time.perf_counter() - start
+        max_queue = max(t.queue_time for t in report.timings.values())
+
+        print(
+            f"levels={levels:3d} width={width:2d} ideal={ideal:.3f}s "
+            f"polling={polling:.3f}s event_driven={event_driven:.3f}s "
+            f"max_queue={max_queue * 1000:.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
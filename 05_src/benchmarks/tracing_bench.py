@@ -0,0 +1,275 @@
+"""Overhead of utils.tracing spans, and the trace of one horoscope_chat turn.
+
+The first part times N spans on the calling thread, as roots and as
+children with attributes, and again including the time the exporter thread
+takes to write them all as JSON lines. Both must stay under 50 us per span.
+
+The second part runs horoscope_chat against a local stub of the OpenAI
+Responses API (from horoscope_tool_rounds_bench, with token usage added) and
+a local stub of the horoscope service, reached through utils.http_client.
+It checks that the exported trace nests as
+
+    turn horoscope_chat
+      llm responses.create            (with token usage)
+      tool get_horoscope              (with the horoscope cache miss)
+        http GET 127.0.0.1:<port>
+      llm responses.create
+
+and that the stats endpoint serves the histograms.
+
+The third part steps @traced generators, sync and async, each step in a
+fresh context as Gradio runs streaming handlers. Spans opened after a yield,
+and spans still open across one, must stay in the generator's trace, and
+no span may be left current in the caller's context.
+"""
+
+import asyncio
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+TRACE_DIR = tempfile.mkdtemp(prefix="tracing_bench_")
+os.environ["TRACE_DIR"] = TRACE_DIR
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+from openai import OpenAI  # noqa: E402
+
+from benchmarks.horoscope_tool_rounds_bench import StubResponses  # noqa: E402
+from horoscope_chat import main  # noqa: E402
+from horoscope_chat.cache import HoroscopeCache  # noqa: E402
+from utils import tracing  # noqa: E402
+from utils.tracing import get_tracer, serve_stats, span, traced  # noqa: E402
+
+SPANS = 50_000
+BUDGET_US = 50
+
+
+class StubServices(StubResponses):
+    """The Responses stub with token usage, plus the horoscope service."""
+
+    def reply(self, output):
+        body = json.dumps({
+            "id": "resp_0", "object": "response", "created_at": 0, "model": "stub",
+            "status": "completed", "output": output, "parallel_tool_calls": True,
+            "tool_choice": "auto", "tools": [],
+            "usage": {
+                "input_tokens": 120, "output_tokens": 30, "total_tokens": 150,
+                "input_tokens_details": {"cached_tokens": 0},
+                "output_tokens_details": {"reasoning_tokens": 0},
+            },
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        time.sleep(0.01)
+        body = json.dumps({"data": {"horoscope_data": "A good day.", "date": "today"}}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def read_spans(path):
+    """Spans from the spans file and the files it rotated to."""
+    directory, name = os.path.split(path)
+    spans = []
+    for file_name in os.listdir(directory):
+        if file_name.startswith(name):
+            with open(os.path.join(directory, file_name), encoding="utf-8") as f:
+                spans += [json.loads(line) for line in f]
+    return spans
+
+
+def per_span_us(make_span):
+    start = time.perf_counter()
+    for i in range(SPANS):
+        make_span(i)
+    return (time.perf_counter() - start) / SPANS * 1e6
+
+
+def overhead():
+    tracer = get_tracer()
+
+    def root(i):
+        with span("bench.root"):
+            pass
+
+    def child(i):
+        with span("bench.child", kind="tool", arguments={"n": i}) as s:
+            s.set(input_tokens=10, output_tokens=i % 7)
+
+    def empty(i):
+        pass
+
+    baseline = per_span_us(empty)
+    start = time.perf_counter()
+    root_us = per_span_us(root) - baseline
+    with span("bench.parent"):
+        child_us = per_span_us(child) - baseline
+    tracer.flush()
+    exported_us = (time.perf_counter() - start) / (2 * SPANS) * 1e6
+
+    tracing.TRACING = False
+    noop_us = per_span_us(root) - baseline
+    tracing.TRACING = True
+
+    lines = read_spans(tracer.path)
+    children = [s for s in lines if s["name"] == "bench.child"]
+    parent = next(s for s in lines if s["name"] == "bench.parent")
+    assert len(children) == SPANS and all(s["parent_id"] == parent["span_id"] for s in children)
+
+    print(f"{SPANS} spans, per span on the calling thread:")
+    print(f"  root span                    {root_us:6.2f} us")
+    print(f"  child span with attributes   {child_us:6.2f} us")
+    print(f"  tracing off                  {noop_us:6.2f} us")
+    print(f"  including JSONL export       {exported_us:6.2f} us  ({len(lines)} lines)")
+    assert max(root_us, child_us, exported_us) < BUDGET_US
+    tracer.reset()
+
+
+def turn_trace():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubServices)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    main.client = OpenAI(base_url=f"{base}/v1", api_key="stub")
+    main.HOROSCOPE_API_URL = f"{base}/horoscope"
+    main.horoscope_cache = HoroscopeCache(main.fetch_horoscope)
+    tracer = get_tracer()
+    stats_server = serve_stats(port=0) or serve_stats(port=free_port())
+    try:
+        answer = main.horoscope_chat("Horoscopes for Leo and Aries please", [])
+        main.horoscope_chat("Horoscope for Leo please", [])
+        tracer.flush()
+        with urllib.request.urlopen(f"http://127.0.0.1:{stats_server.server_port}/stats") as response:
+            stats = json.load(response)
+    finally:
+        server.shutdown()
+        stats_server.shutdown()
+
+    spans = read_spans(tracer.path)
+    turn = next(s for s in spans if s["kind"] == "turn")
+    trace = [s for s in spans if s["trace_id"] == turn["trace_id"]]
+    by_id = {s["span_id"]: s for s in trace}
+
+    def depth(s):
+        return 0 if s["parent_id"] is None else 1 + depth(by_id[s["parent_id"]])
+
+    print(f"trace of one turn -> {answer!r}")
+    for s in sorted(trace, key=lambda s: s["start"]):
+        attributes = {k: v for k, v in s["attributes"].items() if k != "url"}
+        print(f"  {'  ' * depth(s)}{s['kind']:<5} {s['name']:<22} {s['duration_ms']:8.2f} ms  {attributes}")
+
+    kinds = {(s["kind"], depth(s)) for s in trace}
+    assert {("turn", 0), ("llm", 1), ("tool", 1), ("http", 2)} <= kinds, kinds
+    llm = [s for s in trace if s["kind"] == "llm"]
+    assert len(llm) == 2 and all(s["attributes"]["total_tokens"] == 150 for s in llm)
+    tools = [s for s in trace if s["kind"] == "tool"]
+    assert len(tools) == 2 and all(s["attributes"]["cache.horoscope"] == "miss" for s in tools)
+
+    turns = stats["spans"]["turn"]["horoscope_chat"]
+    print(f"stats endpoint: turn p50 {turns['p50_ms']} ms over {turns['count']} turns, "
+          f"llm tokens {stats['spans']['llm']['responses.create']['total_tokens']}, "
+          f"caches {stats['caches']}")
+    assert turns["count"] == 2 and stats["caches"]["horoscope"] == {"hits": 1, "misses": 2, "hit_rate": 1 / 3}
+
+
+@traced("bench.stream", kind="turn")
+def stream_turn(rounds):
+    for i in range(rounds):
+        with span("bench.llm", kind="llm"):
+            yield i
+            with span("bench.inner", kind="tool"):
+                pass
+        with span("bench.tool", kind="tool"):
+            pass
+
+
+@traced("bench.astream", kind="turn")
+async def astream_turn(rounds):
+    for i in range(rounds):
+        with span("bench.llm", kind="llm"):
+            yield i
+            await asyncio.sleep(0)
+            with span("bench.inner", kind="tool"):
+                pass
+        with span("bench.tool", kind="tool"):
+            pass
+
+
+def check_trace(spans, turn_name, rounds):
+    turn = next(s for s in spans if s["name"] == turn_name)
+    trace = [s for s in spans if s["trace_id"] == turn["trace_id"]]
+    llm_ids = {s["span_id"] for s in trace if s["name"] == "bench.llm"}
+    # The turn, then an llm span with one span inside and one after it per round
+    assert turn["parent_id"] is None and len(llm_ids) == rounds and len(trace) == 1 + 3 * rounds, trace
+    for s in trace:
+        if s["name"] == "bench.inner":
+            assert s["parent_id"] in llm_ids, s
+        elif s is not turn:
+            assert s["parent_id"] == turn["span_id"], s
+    return len(trace)
+
+
+def resumed_generators():
+    tracer = get_tracer()
+    rounds = 3
+    generator = stream_turn(rounds)
+    while True:
+        context = contextvars.Context()
+        try:
+            context.run(next, generator)
+        except StopIteration:
+            break
+        finally:
+            assert context.get(tracing._current) is None
+
+    async def resume_async():
+        generator = astream_turn(rounds)
+
+        async def step():
+            item = await anext(generator)
+            assert tracing._current.get() is None
+            return item
+
+        while True:
+            try:
+                await asyncio.create_task(step(), context=contextvars.Context())
+            except StopAsyncIteration:
+                break
+
+    asyncio.run(resume_async())
+    tracer.flush()
+    spans = [s for s in read_spans(tracer.path) if s["name"].startswith("bench.")]
+    sync_spans = check_trace(spans, "bench.stream", rounds)
+    async_spans = check_trace(spans, "bench.astream", rounds)
+    print(f"generators resumed in fresh contexts: {sync_spans} sync and {async_spans} async spans, "
+          f"all in the turn's trace")
+
+
+def free_port():
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main_bench():
+    overhead()
+    turn_trace()
+    resumed_generators()
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,152 @@
+"""Call the weather MCP tools in-process with the fastmcp Client.
+
+The server's backend is swapped for a SimulatedBackend that takes
+FETCH_LATENCY per location, behind a fresh CachedBackend. The script checks
+that:
+
+- weather_service_batch returns one WeatherData per location, in order,
+  and fetches duplicate and differently spelled locations once;
+- one batch call for CITIES locations beats CITIES single calls;
+- repeated locations are served from the cache until the TTL expires, and
+  concurrent calls for one location share a fetch, batched or not, and
+  cancelling the caller that started a fetch leaves it to the others;
+- a backend whose fetch_many returns the wrong number of results is an
+  error, and WeatherBackend cannot be used without a fetch;
+- oversized batches are rejected with a tool error;
+- the cache statistics are readable as the weather://cache/stats resource.
+"""
+
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("FASTMCP_LOG_LEVEL", "CRITICAL")
+
+from fastmcp import Client  # noqa: E402
+from fastmcp.exceptions import ToolError  # noqa: E402
+
+from static_weather_mcp import server  # noqa: E402
+from static_weather_mcp.backend import CachedBackend, SimulatedBackend, WeatherBackend  # noqa: E402
+
+FETCH_LATENCY = 0.05
+CITIES = [f"City {i}" for i in range(30)]
+
+
+def use_backend(ttl=600.0):
+    simulated = SimulatedBackend(latency=FETCH_LATENCY)
+    server.weather_backend = CachedBackend(simulated, ttl=ttl)
+    return simulated
+
+
+class ShortBatchBackend(SimulatedBackend):
+    async def fetch_many(self, locations):
+        return (await super().fetch_many(locations))[:-1]
+
+
+async def check_backend():
+    simulated = SimulatedBackend(latency=FETCH_LATENCY)
+    cached = CachedBackend(simulated)
+    # Overlapping batches and a single call in flight at once
+    first, second, single = await asyncio.gather(
+        cached.fetch_many(CITIES[:10]), cached.fetch_many(CITIES[5:15]), cached.fetch(CITIES[0]))
+    assert len(first) == len(second) == 10 and simulated.requests == 15, simulated.requests
+    assert cached.stats()["shared_fetches"] == 6, cached.stats()
+
+    # The first caller of a single and of a batched fetch goes away
+    simulated = SimulatedBackend(latency=FETCH_LATENCY)
+    cached = CachedBackend(simulated)
+    leaders = [asyncio.create_task(cached.fetch("Oslo")), asyncio.create_task(cached.fetch_many(["Lima", "Cusco"]))]
+    await asyncio.sleep(0)
+    followers = asyncio.gather(cached.fetch("Oslo"), cached.fetch_many(["Cusco", "Oslo", "Lima"]))
+    await asyncio.sleep(0)
+    for leader in leaders:
+        leader.cancel()
+    single, batch = await followers
+    assert len(batch) == 3 and simulated.requests == 3 and cached.stats()["entries"] == 3, simulated.requests
+    print("  cancelled first callers: the callers sharing their fetches still get the weather")
+
+    cached = CachedBackend(ShortBatchBackend())
+    try:
+        await cached.fetch_many(["Lima", "Oslo"])
+    except ValueError as e:
+        print(f"  short fetch_many result: {e}")
+    else:
+        raise AssertionError("a short fetch_many result was accepted")
+    assert not cached._inflight and cached.stats()["entries"] == 0
+
+    try:
+        WeatherBackend()
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("WeatherBackend without fetch was instantiated")
+    print("  overlapping batches share fetches: 15 fetches for 21 locations")
+
+
+async def timed(coro):
+    start = time.perf_counter()
+    result = await coro
+    return result, time.perf_counter() - start
+
+
+async def main():
+    async with Client(server.mcp) as client:
+        tools = {tool.name for tool in await client.list_tools()}
+        assert {"weather_service", "weather_service_batch"} <= tools, tools
+
+        # Cold: 30 single calls, one after another, as an agent would make them
+        use_backend()
+        start = time.perf_counter()
+        for city in CITIES:
+            await client.call_tool("weather_service", {"location": city})
+        singles = time.perf_counter() - start
+
+        simulated = use_backend()
+        result, batch = await timed(client.call_tool("weather_service_batch", {"locations": CITIES}))
+        assert len(result.data) == len(CITIES) and simulated.requests == len(CITIES)
+        print(f"{len(CITIES)} locations, backend {FETCH_LATENCY * 1000:.0f} ms per location")
+        print(f"  {len(CITIES)} single calls: {singles * 1000:7.1f} ms")
+        print(f"  1 batch call:      {batch * 1000:7.1f} ms")
+
+        # Warm: everything from the cache
+        _, warm = await timed(client.call_tool("weather_service_batch", {"locations": CITIES}))
+        assert simulated.requests == len(CITIES)
+        print(f"  cached batch call: {warm * 1000:7.1f} ms")
+
+        # Duplicates and spellings, order kept
+        simulated = use_backend()
+        locations = ["Paris", " paris ", "Oslo", "PARIS", "Lima"]
+        result = await client.call_tool("weather_service_batch", {"locations": locations})
+        assert len(result.data) == len(locations) and simulated.requests == 3, simulated.requests
+        assert result.structured_content["result"][0]["temperature"] == 22.5
+
+        # Concurrent single calls for one location share a fetch
+        simulated = use_backend()
+        await asyncio.gather(*(client.call_tool("weather_service", {"location": "Rome"}) for _ in range(10)))
+        assert simulated.requests == 1, simulated.requests
+
+        # TTL
+        simulated = use_backend(ttl=0.1)
+        await client.call_tool("weather_service", {"location": "Quito"})
+        await client.call_tool("weather_service", {"location": "Quito"})
+        await asyncio.sleep(0.15)
+        await client.call_tool("weather_service", {"location": "Quito"})
+        assert simulated.requests == 2, simulated.requests
+
+        try:
+            await client.call_tool("weather_service_batch", {"locations": ["x"] * (server.WEATHER_BATCH_MAX + 1)})
+        except ToolError as e:
+            print(f"  oversized batch: {e}")
+        else:
+            raise AssertionError("oversized batch was accepted")
+
+        stats = json.loads((await client.read_resource("weather://cache/stats"))[0].text)
+        assert stats == server.weather_backend.stats()
+        print(f"  weather://cache/stats: {stats}")
+
+
+if __name__ == "__main__":
+    asyncio.run(check_backend())
+    asyncio.run(main())
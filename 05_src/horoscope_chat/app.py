@@ -1,20 +1,35 @@
 import gradio as gr
-from horoscope_chat.main import horoscope_chat
+from horoscope_chat.main import (
+    MAX_CONCURRENT_CHATS, horoscope_chat_stream, horoscope_chat_stream_async, horoscope_cache,
+)
 from dotenv import load_dotenv
 from typing import Optional
 import os
 
 from utils.logger import get_logger
+from utils.tracing import serve_stats
 
 _logs = get_logger(__name__)
 
 load_dotenv('.secrets')
 
+# The threaded handler stays the default: under load the async one is CPU
+# bound on the client side and slower (horoscope_async_load_bench)
+HOROSCOPE_ASYNC = os.getenv('HOROSCOPE_ASYNC', 'false').lower() == 'true'
+# Gradio runs sync handlers on anyio's worker threads, 40 by default
+THREADED_CONCURRENCY = 40
+
 chat = gr.ChatInterface(
-    fn=horoscope_chat,
-    type="messages"
+    fn=horoscope_chat_stream_async if HOROSCOPE_ASYNC else horoscope_chat_stream,
+    type="messages",
+    # Past MAX_CONCURRENT_CHATS more sessions on the loop only add latency,
+    # so Gradio's queue holds the excess instead
+    concurrency_limit=MAX_CONCURRENT_CHATS if HOROSCOPE_ASYNC else THREADED_CONCURRENCY
 )
 
 if __name__ == "__main__":
     _logs.info('Starting Horoscope Chat App...')
+    if os.getenv('HOROSCOPE_PREWARM', 'true').lower() == 'true':
+        horoscope_cache.start_prewarm()
+    serve_stats()
     chat.launch()
@@ -0,0 +1,179 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, timedelta
+import asyncio
+import threading
+import time
+
+from utils.logger import get_logger
+from utils.tracing import record_cache
+
+_logs = get_logger(__name__)
+
+SIGNS = [
+    "Aries", "Taurus", "Gemini", "Cancer", "Leo", "Virgo",
+    "Libra", "Scorpio", "Sagittarius", "Capricorn", "Aquarius", "Pisces",
+]
+
+RELATIVE_DAYS = {"TODAY": 0, "TOMORROW": 1, "YESTERDAY": -1}
+
+
+def resolve_date(day: str, today: date = None) -> str:
+    """
+    Turn "TODAY", "TOMORROW" or "YESTERDAY" into a YYYY-MM-DD date.
+    Concrete dates are returned unchanged.
+    """
+    offset = RELATIVE_DAYS.get(day.strip().upper())
+    if offset is None:
+        return day.strip()
+    today = today or date.today()
+    return (today + timedelta(days=offset)).isoformat()
+
+
+class HoroscopeCache:
+    """
+    In-memory cache of horoscopes keyed by (sign, concrete date).
+
+    Relative days are resolved before the lookup, so "TODAY" moves to a new key
+    at midnight instead of serving yesterday's text. Concurrent requests for
+    the same key share a single upstream fetch, and an entry is kept until its
+    date is older than yesterday, so upstream sees one request per sign and date.
+    """
+
+    def __init__(self, fetch, max_age: float = None, afetch=None):
+        """
+        fetch(sign, date) returns the horoscope text for a sign and a YYYY-MM-DD date.
+        afetch is an optional coroutine version of fetch used by aget.
+        If max_age is given, entries are also refetched after max_age seconds.
+        """
+        self.fetch = fetch
+        self.afetch = afetch
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._inflight = {}
+        self._inflight_async = {}
+        self._lock = threading.Lock()
+
+    def get(self, sign: str, day: str = "TODAY") -> str:
+        key = (sign.strip().capitalize(), resolve_date(day))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                record_cache("horoscope", True)
+                return entry[1]
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                self.misses += 1
+                record_cache("horoscope", False)
+                future = self._inflight[key] = Future()
+            else:
+                self.hits += 1
+                record_cache("horoscope", True)
+        if not leader:
+            return future.result()
+
+        try:
+            horoscope = self.fetch(*key)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(horoscope)
+            return horoscope
+        finally:
+            with self._lock:
+                if not future.exception():
+                    self._entries[key] = (self._expiry(), future.result())
+                    self._purge_old_dates()
+                del self._inflight[key]
+
+    async def aget(self, sign: str, day: str = "TODAY") -> str:
+        """
+        Async version of get. Uses afetch, or runs fetch in a worker thread
+        if no afetch was given.
+
+        The fetch runs as a task of its own that every caller awaits through
+        asyncio.shield, so a cancelled caller, such as the chat of a user who
+        disconnected, does not cancel the fetch the others are waiting for.
+        """
+        key = (sign.strip().capitalize(), resolve_date(day))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                record_cache("horoscope", True)
+                return entry[1]
+            task = self._inflight_async.get(key)
+            if task is None:
+                self.misses += 1
+                record_cache("horoscope", False)
+                task = self._inflight_async[key] = asyncio.get_running_loop().create_task(self._afetch(key))
+                # Retrieve the error even if every caller was cancelled
+                task.add_done_callback(lambda task: task.cancelled() or task.exception())
+            else:
+                self.hits += 1
+                record_cache("horoscope", True)
+        return await asyncio.shield(task)
+
+    async def _afetch(self, key: tuple) -> str:
+        try:
+            if self.afetch is not None:
+                horoscope = await self.afetch(*key)
+            else:
+                horoscope = await asyncio.to_thread(self.fetch, *key)
+            with self._lock:
+                self._entries[key] = (self._expiry(), horoscope)
+                self._purge_old_dates()
+            return horoscope
+        finally:
+            with self._lock:
+                del self._inflight_async[key]
+
+    def _expiry(self) -> float:
+        if self.max_age is None:
+            return float("inf")
+        return time.monotonic() + self.max_age
+
+    def _purge_old_dates(self):
+        # Nothing asks for dates before yesterday through the relative days
+        oldest = date.fromisoformat(resolve_date("YESTERDAY"))
+        for key in [key for key in self._entries if not self._is_recent(key[1], oldest)]:
+            del self._entries[key]
+
+    @staticmethod
+    def _is_recent(day: str, oldest: date) -> bool:
+        try:
+            return date.fromisoformat(day) >= oldest
+        except ValueError:
+            # Not a YYYY-MM-DD date, so its age is unknown: not kept
+            return False
+
+    def prewarm(self, day: str = "TODAY") -> int:
+        """
+        Fetch every sign for a day in parallel. Returns the number of signs cached.
+        """
+        def warm(sign):
+            try:
+                self.get(sign, day)
+                return True
+            except Exception as e:
+                _logs.warning(f"Could not prewarm horoscope for {sign}: {e}")
+                return False
+
+        with ThreadPoolExecutor(max_workers=len(SIGNS)) as executor:
+            return sum(executor.map(warm, SIGNS))
+
+    def start_prewarm(self, day: str = "TODAY") -> threading.Thread:
+        """
+        Prewarm in a background thread so app start-up is not delayed.
+        """
+        thread = threading.Thread(target=self.prewarm, args=(day,), daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
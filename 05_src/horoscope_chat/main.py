@@ -1,9 +1,16 @@
-from openai import OpenAI
 from dotenv import load_dotenv
 from horoscope_chat.prompts import return_instructions_root
+from horoscope_chat.cache import HoroscopeCache
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import json
-import requests
+import httpx
 from utils.logger import get_logger
+from utils.http_client import get_http_client
+from utils.stream_metrics import StreamTimer
+from utils.tracing import in_context, span, token_usage, traced
+from utils.memory import ConversationMemory, make_summarizer
+from utils.model_registry import get_openai_client, get_async_openai_client
 import os
 
 
@@ -13,10 +20,19 @@ load_dotenv(".env")
 load_dotenv(".secrets")
 
 
-client = OpenAI()
+client = get_openai_client()
+async_client = get_async_openai_client()
 
 open_ai_model = os.getenv("OPENAI_MODEL", "gpt-4")
 
+# Tool-call rounds per user turn before the model must answer in text
+MAX_TOOL_ROUNDS = int(os.getenv("HOROSCOPE_MAX_TOOL_ROUNDS", "3"))
+
+# Chats served at once by the async handlers; the rest wait their turn
+MAX_CONCURRENT_CHATS = int(os.getenv("HOROSCOPE_MAX_CONCURRENT_CHATS", "32"))
+
+HOROSCOPE_API_URL = os.getenv("HOROSCOPE_API_URL", "https://horoscope-app-api.vercel.app/api/v1/get-horoscope/daily")
+
 tools = [
     {
         "type": "function",
@@ -52,26 +68,63 @@ def get_horoscope(sign:str, date:str = "TODAY") -> str:
     and takes two parameters sign and date.
     Accepted values for sign are: Aries, Taurus, Gemini, Cancer, Leo, Virgo, Libra, Scorpio, Sagittarius, Capricorn, Aquarius, Pisces
     Accepted values for date are: Date in format (YYYY-MM-DD) OR "TODAY" OR "TOMORROW" OR "YESTERDAY".
+    Results are served from horoscope_cache when possible.
     """
     
+    return horoscope_cache.get(sign, date)
+
+
+async def aget_horoscope(sign:str, date:str = "TODAY") -> str:
+    """
+    Async version of get_horoscope.
+    """
+    return await horoscope_cache.aget(sign, date)
+
+
+tool_functions = {
+    "get_horoscope": get_horoscope,
+}
+
+async_tool_functions = {
+    "get_horoscope": aget_horoscope,
+}
+
+
+def fetch_horoscope(sign:str, date:str) -> str:
     response = get_horoscope_from_service(sign, date)
     horoscope = get_horoscope_from_response(sign, response)
     return horoscope
 
 
+async def afetch_horoscope(sign:str, date:str) -> str:
+    response = await aget_horoscope_from_service(sign, date)
+    horoscope = get_horoscope_from_response(sign, response)
+    return horoscope
+
+
+horoscope_cache = HoroscopeCache(fetch_horoscope, afetch=afetch_horoscope)
+
 
 def get_horoscope_from_service(sign:str, day:str):
-    url = "https://horoscope-app-api.vercel.app/api/v1/get-horoscope/daily"
     params = {
         "sign": sign.capitalize(),
         "day": day.upper()
     }
-    response = requests.get(url, params=params)
+    response = get_http_client().get(HOROSCOPE_API_URL, params=params)
     return response
 
 
+async def aget_horoscope_from_service(sign:str, day:str):
+    params = {
+        "sign": sign.capitalize(),
+        "day": day.upper()
+    }
+    response = await get_http_client().aget(HOROSCOPE_API_URL, params=params)
+    return response
+
 
-def get_horoscope_from_response(sign:str, response:requests.Response) -> str:
+
+def get_horoscope_from_response(sign:str, response:httpx.Response) -> str:
     resp_dict = json.loads(response.text)
     data = resp_dict.get("data")
     horoscope_data = data.get("horoscope_data", "No horoscope found.")
@@ -80,6 +133,35 @@ def get_horoscope_from_response(sign:str, response:requests.Response) -> str:
     return horoscope
 
 
+def create_response(**kwargs):
+    """
+    client.responses.create, traced as an llm span with its token usage.
+    """
+    with span("responses.create", kind="llm", model=kwargs.get("model")) as llm_span:
+        response = client.responses.create(**kwargs)
+        llm_span.set(**token_usage(response.usage))
+    return response
+
+
+async def acreate_response(**kwargs):
+    """
+    Async version of create_response.
+    """
+    with span("responses.create", kind="llm", model=kwargs.get("model")) as llm_span:
+        response = await async_client.responses.create(**kwargs)
+        llm_span.set(**token_usage(response.usage))
+    return response
+
+
+def complete(prompt: str) -> str:
+    response = create_response(model=open_ai_model, input=prompt)
+    return response.output_text
+
+
+# Older turns are folded into a rolling summary to keep requests bounded
+memory = ConversationMemory(make_summarizer(complete))
+
+
 def sanitize_history(history: list[dict]) -> list[dict]:
     clean_history = []
     for msg in history:
@@ -90,60 +172,270 @@ def sanitize_history(history: list[dict]) -> list[dict]:
     return clean_history
 
 
-def horoscope_chat(message: str, history: list[dict] = []) -> str:
-    _logs.info(f'User message: {message}')
-    
-    instructions = return_instructions_root()
-    
-    user_msg = {
-        "role": "user",
-        "content": message
+def run_function_call(item) -> dict:
+    """
+    Execute one function_call item from the model and wrap the result
+    as a function_call_output item.
+    """
+    function = tool_functions.get(item.name)
+    with span(item.name, kind="tool") as tool_span:
+        try:
+            args = json.loads(item.arguments)
+            tool_span.set(arguments=args)
+            _logs.info('Function call %s args: %s', item.name, args)
+            if function is None:
+                output = {"error": f"Unknown function {item.name}."}
+            else:
+                output = {"horoscope": function(**args)}
+        except json.JSONDecodeError as e:
+            # Malformed arguments go back to the model instead of ending the turn
+            _logs.error('Function call %s has invalid arguments %r: %s', item.name, item.arguments, e)
+            output = {"error": f"Invalid JSON arguments: {e}"}
+        except Exception as e:
+            _logs.error('Function call %s failed: %s', item.name, e)
+            output = {"error": str(e)}
+        if "error" in output:
+            tool_span.fail(output["error"])
+    return function_call_output(item, output)
+
+
+async def arun_function_call(item) -> dict:
+    """
+    Async version of run_function_call.
+    """
+    function = async_tool_functions.get(item.name)
+    with span(item.name, kind="tool") as tool_span:
+        try:
+            args = json.loads(item.arguments)
+            tool_span.set(arguments=args)
+            _logs.info('Function call %s args: %s', item.name, args)
+            if function is None:
+                output = {"error": f"Unknown function {item.name}."}
+            else:
+                output = {"horoscope": await function(**args)}
+        except json.JSONDecodeError as e:
+            # Malformed arguments go back to the model instead of ending the turn
+            _logs.error('Function call %s has invalid arguments %r: %s', item.name, item.arguments, e)
+            output = {"error": f"Invalid JSON arguments: {e}"}
+        except Exception as e:
+            _logs.error('Function call %s failed: %s', item.name, e)
+            output = {"error": str(e)}
+        if "error" in output:
+            tool_span.fail(output["error"])
+    return function_call_output(item, output)
+
+
+def function_call_output(item, output: dict) -> dict:
+    func_call_output = {
+        "type": "function_call_output",
+        "call_id": item.call_id,
+        "output": json.dumps(output)
     }
-    
-    conversation_input = sanitize_history(history) + [user_msg]
-    
-    response = client.responses.create(
-        model=open_ai_model,  
-        instructions=instructions,
-        input=conversation_input,
-        tools=tools,
-        
-    )
-    
-    conversation_input += response.output
-
-    # Handle function calls if any
-    for item in response.output:
-        if item.type == "function_call":
-            if item.name == "get_horoscope":
-                args = json.loads(item.arguments)
-                _logs.info(f'Function call args: {args}')
-                
-                # Call the horoscope function
-                horoscope_result = get_horoscope(**args)
-                
-                # Add function call result to conversation
-                
-                func_call_output = {
-                    "type": "function_call_output",
-                    "call_id": item.call_id,
-                    "output": json.dumps({
-                        "horoscope": horoscope_result
-                    })
-                }
-                
-                _logs.debug(f"Function call output: {func_call_output}")
-
-                conversation_input = conversation_input + [func_call_output]
-                
-                # Make second API call with function result
-                response = client.responses.create(
-                    model=open_ai_model,
-                    instructions=instructions,
-                    tools=tools,
-                    input=conversation_input
-                )
+    _logs.debug("Function call output: %s", func_call_output)
+    return func_call_output
+
+
+def run_function_calls(calls: list) -> list[dict]:
+    """
+    Execute all function calls of a model response concurrently.
+    Outputs are returned in the same order as the calls.
+    """
+    if len(calls) == 1:
+        return [run_function_call(calls[0])]
+    with ThreadPoolExecutor(max_workers=len(calls)) as executor:
+        # Each call runs in a copy of this context, so its spans belong to the turn
+        futures = [executor.submit(in_context(run_function_call), item) for item in calls]
+        return [future.result() for future in futures]
+
+
+async def arun_function_calls(calls: list) -> list[dict]:
+    """
+    Async version of run_function_calls.
+    """
+    return list(await asyncio.gather(*(arun_function_call(item) for item in calls)))
+
+
+class ChatTurn:
+    """
+    One user turn, shared by the sync, async and streaming handlers: the
+    model input, the request of each tool round and, when streaming, the
+    answer shown so far.
+
+    Each round runs every function call of the last response, then makes
+    exactly one follow-up call with all of the outputs. On the last allowed
+    round the model has to answer in text.
+    """
+
+    def __init__(self, message: str, max_tool_rounds: int = None):
+        _logs.info('User message: %s', message)
+        # Started first so that time to first token includes the history
+        self.timer = StreamTimer("horoscope_chat")
+        self.message = message
+        self.instructions = return_instructions_root()
+        self.max_tool_rounds = max_tool_rounds if max_tool_rounds is not None else MAX_TOOL_ROUNDS
+        self.input = None
+        self.answer = ""
+        self.response = None
+        self._prefix = ""
+        self._text = ""
+
+    def set_history(self, history_input: list[dict]):
+        """
+        Start the model input with the history, as built by memory.
+        """
+        self.input = history_input + [{"role": "user", "content": self.message}]
+
+    def rounds(self) -> range:
+        return range(self.max_tool_rounds + 1)
+
+    def request(self, tool_round: int, **kwargs) -> dict:
+        return dict(
+            model=open_ai_model,
+            instructions=self.instructions,
+            tools=tools,
+            tool_choice="none" if tool_round == self.max_tool_rounds else "auto",
+            input=self.input,
+            **kwargs
+        )
+
+    def function_calls(self, response) -> list:
+        self.response = response
+        if response is None:
+            return []
+        return [item for item in response.output if item.type == "function_call"]
+
+    def add_outputs(self, outputs: list[dict]):
+        self.input += self.response.output
+        self.input += outputs
+
+    def start_stream(self):
+        # Text of an earlier response, e.g. before a tool call, stays above
+        self._prefix = self.answer + "\n\n" if self.answer else ""
+        self._text = ""
+        self.response = None
+
+    def stream_event(self, event):
+        """
+        Handle one stream event. Returns the answer so far after a text delta.
+        """
+        if event.type == "response.output_text.delta":
+            self.timer.token()
+            self._text += event.delta
+            return self._prefix + self._text
+        if event.type == "response.completed":
+            self.response = event.response
+        return None
+
+    def end_stream(self, llm_span) -> list:
+        """
+        Close the streamed response and return its function calls.
+        """
+        response = self.response
+        llm_span.set(**token_usage(response.usage if response is not None else None))
+        if self._text:
+            self.answer = self._prefix + self._text
+        calls = self.function_calls(response)
+        self.timer.end_stream(streamed_tokens(response, calls))
+        return calls
+
+
+def streamed_tokens(response, calls: list):
+    """
+    Output tokens of a streamed response for StreamTimer, or None to count
+    its text deltas instead: the usage also counts function call arguments.
+    """
+    if response is None or response.usage is None or calls:
+        return None
+    return response.usage.output_tokens
+
+
+@traced("horoscope_chat", kind="turn")
+def horoscope_chat(message: str, history: list[dict] = [], max_tool_rounds: int = None) -> str:
+    turn = ChatTurn(message, max_tool_rounds)
+    turn.set_history(memory.build(sanitize_history(history)))
+    for tool_round in turn.rounds():
+        calls = turn.function_calls(create_response(**turn.request(tool_round)))
+        if not calls:
+            break
+        turn.add_outputs(run_function_calls(calls))
+    return turn.response.output_text
+
+
+@traced("horoscope_chat_stream", kind="turn")
+def horoscope_chat_stream(message: str, history: list[dict] = [], max_tool_rounds: int = None):
+    """
+    Streaming version of horoscope_chat for gr.ChatInterface.
+    Yields the answer so far as text deltas arrive. Function calls are run
+    between streamed responses, the same way as in horoscope_chat.
+    """
+    turn = ChatTurn(message, max_tool_rounds)
+    turn.set_history(memory.build(sanitize_history(history)))
+    for tool_round in turn.rounds():
+        with span("responses.create", kind="llm", model=open_ai_model, stream=True) as llm_span:
+            stream = client.responses.create(**turn.request(tool_round, stream=True))
+            turn.start_stream()
+            for event in stream:
+                answer = turn.stream_event(event)
+                if answer is not None:
+                    yield answer
+            calls = turn.end_stream(llm_span)
+        if not calls:
+            break
+        turn.add_outputs(run_function_calls(calls))
+    turn.timer.finish()
+
+
+_chat_semaphore = None
+_chat_semaphore_loop = None
+
+
+def chat_semaphore() -> asyncio.Semaphore:
+    """
+    Semaphore bounding the chats served at once on the running event loop.
+    """
+    global _chat_semaphore, _chat_semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _chat_semaphore_loop is not loop:
+        _chat_semaphore = asyncio.Semaphore(MAX_CONCURRENT_CHATS)
+        _chat_semaphore_loop = loop
+    return _chat_semaphore
+
+
+@traced("horoscope_chat_async", kind="turn")
+async def horoscope_chat_async(message: str, history: list[dict] = [], max_tool_rounds: int = None) -> str:
+    """
+    Async version of horoscope_chat on AsyncOpenAI. Many chats share one
+    event loop instead of each holding a worker thread.
+    """
+    async with chat_semaphore():
+        turn = ChatTurn(message, max_tool_rounds)
+        turn.set_history(await asyncio.to_thread(memory.build, sanitize_history(history)))
+        for tool_round in turn.rounds():
+            calls = turn.function_calls(await acreate_response(**turn.request(tool_round)))
+            if not calls:
                 break
-    
-    
-    return response.output_text
+            turn.add_outputs(await arun_function_calls(calls))
+        return turn.response.output_text
+
+
+@traced("horoscope_chat_stream_async", kind="turn")
+async def horoscope_chat_stream_async(message: str, history: list[dict] = [], max_tool_rounds: int = None):
+    """
+    Async version of horoscope_chat_stream for gr.ChatInterface.
+    """
+    async with chat_semaphore():
+        turn = ChatTurn(message, max_tool_rounds)
+        turn.set_history(await asyncio.to_thread(memory.build, sanitize_history(history)))
+        for tool_round in turn.rounds():
+            with span("responses.create", kind="llm", model=open_ai_model, stream=True) as llm_span:
+                stream = await async_client.responses.create(**turn.request(tool_round, stream=True))
+                turn.start_stream()
+                async for event in stream:
+                    answer = turn.stream_event(event)
+                    if answer is not None:
+                        yield answer
+                calls = turn.end_stream(llm_span)
+            if not calls:
+                break
+            turn.add_outputs(await arun_function_calls(calls))
+        turn.timer.finish()
@@ -1,8 +1,10 @@
 import math
 import re
-from typing import List, Optional
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Union
 
 import numexpr
+import numpy as np
 from langchain.chains.openai_functions import create_structured_output_runnable
 from langchain_core.messages import SystemMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
@@ -11,6 +13,14 @@ from langchain_core.tools import StructuredTool
 from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
 
+from utils.disk_cache import PersistentCache, hash_key
+from utils.tracing import record_cache, span, traced
+
+# Problem -> ExecuteCode translations, shared by every worker process. The
+# SQLite file is opened on first use, and its most recently used entries are
+# loaded into memory then, so a restarted worker starts warm.
+EXTRACTION_CACHE = PersistentCache("math_extraction")
+
 _MATH_DESCRIPTION = (
     "math(problem: str, context: Optional[list[str]]) -> float:\n"
     " - Solves the provided math problem.\n"
@@ -34,6 +44,14 @@ _MATH_DESCRIPTION = (
     'For instance, "what is xx in height?" or "what is xx in millions?" instead of "what is xx?"\n'
 )
 
+_BATCH_MATH_DESCRIPTION = (
+    "batch_math(problems: list[str], context: Optional[list[str]]) -> list[str]:\n"
+    " - Solves several independent math problems in one call and returns one answer per problem, in the same order.\n"
+    " - Use it instead of several `math` actions when none of the problems needs the answer of another one.\n"
+    " - Each problem follows the same rules as `math`. If a problem cannot be solved, its error is returned in place of its answer.\n"
+    " - `context` is shared by all the problems and follows the same rules as the `context` of `math`.\n"
+)
+
 
 _SYSTEM_PROMPT = """Translate a math problem into a expression that can be executed using Python's numexpr library. Use the output of running this code to answer the question.
 
@@ -66,6 +84,9 @@ ExecuteCode({{code: "37593**(1/5)"}})
 Answer: 8.222831614237718
 """
 
+_BATCH_INSTRUCTIONS = """
+You will be given several numbered questions. Return one ExecuteCode for each question, in the same order as the questions."""
+
 _ADDITIONAL_CONTEXT_PROMPT = """The following additional context is provided from other functions.\
     Use it to substitute into any ${{#}} variables or other words in the problem.\
     \n\n${context}\n\nNote that context variables are not defined in code yet.\
@@ -86,16 +107,161 @@ class ExecuteCode(BaseModel):
     )
 
 
+class ExecuteCodeBatch(BaseModel):
+    """The inputs to the numexpr.evaluate() function, one per question."""
+
+    expressions: List[ExecuteCode] = Field(
+        ...,
+        description="One code expression for each question, in the same order as the questions.",
+    )
+
+
+_CONSTANTS = {"pi": math.pi, "e": math.e}
+_FUNCTIONS = {
+    "sin", "cos", "tan", "arcsin", "arccos", "arctan", "arctan2",
+    "sinh", "cosh", "tanh", "arcsinh", "arccosh", "arctanh",
+    "log", "log10", "log1p", "exp", "expm1", "sqrt", "abs",
+}
+_TOKEN_REGEX = re.compile(
+    r"\s*(?:(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)"
+    r"|(?P<name>[A-Za-z_]\w*)"
+    r"|(?P<op>\*\*|[-+*/%(),]))"
+)
+
+
+def _expression_shape(expression: str) -> Optional[Tuple[str, Tuple]]:
+    """Split a plain numeric expression into a shape and its literal values.
+
+    "37593 * 67" becomes ("n0 * n1", (37593, 67)), so every expression with
+    the same shape shares one compiled numexpr program. Returns None when the
+    text is not made only of numbers, operators, constants and math functions.
+    """
+    shape = []
+    literals = []
+    pos = 0
+    expression = expression.strip()
+    while pos < len(expression):
+        match = _TOKEN_REGEX.match(expression, pos)
+        if not match:
+            return None
+        pos = match.end()
+        number, name, op = match.group("number", "name", "op")
+        if number is not None:
+            # Exponents stay inline so numexpr can still specialise x**2 etc.
+            if shape and (shape[-1] == "**" or shape[-2:] == ["**", "-"]):
+                shape.append(number)
+            else:
+                shape.append(f"n{len(literals)}")
+                literals.append(number)
+        elif name is not None:
+            if name not in _CONSTANTS and name not in _FUNCTIONS:
+                return None
+            shape.append(name)
+        else:
+            shape.append(op)
+    if not literals and not any(token in _CONSTANTS for token in shape):
+        return None
+    return " ".join(shape), tuple(literals)
+
+
+def _literal_value(literal: str):
+    if literal.isdigit():
+        return np.int64(literal)
+    return np.float64(literal)
+
+
+def _lift_literals(shape: str, literals: Tuple[str, ...]) -> Optional[list]:
+    """The literal values for the compiled program of `shape`, or None when it
+    could not reproduce numexpr.evaluate, which folds constants with Python's
+    arbitrary-precision integers.
+
+    Compiled int64 arithmetic wraps around on overflow, returns 0 for an
+    integer modulo by zero, and turns abs() of an integer into a float. So
+    integer literals are only lifted when no intermediate value can exceed
+    int64, bounded by the product of their magnitudes raised to every inline
+    exponent, and the shape has no abs() or %.
+    """
+    integers = [int(literal) for literal in literals if literal.isdigit()]
+    if not integers:
+        return [_literal_value(literal) for literal in literals]
+    tokens = shape.split()
+    if "abs" in tokens or "%" in tokens:
+        return None
+    log_bound = sum(math.log2(max(value, 2)) for value in integers)
+    for i, token in enumerate(tokens):
+        if token != "**":
+            continue
+        exponent = tokens[i + 1] if i + 1 < len(tokens) else ""
+        if exponent == "-":
+            # Negative exponents make the result a float
+            continue
+        if not exponent.isdigit() or tokens[i + 2 : i + 3] == ["**"]:
+            # A computed exponent, e.g. 3**(40) or 2**3**2: not bounded here
+            return None
+        log_bound *= max(int(exponent), 1)
+    if log_bound >= 62:
+        return None
+    return [_literal_value(literal) for literal in literals]
+
+
+def _format_output(value) -> Optional[str]:
+    """str(value), or None for inf and nan, which numexpr.evaluate either
+    returns too or raises for (e.g. 1/0), so it decides."""
+    if not math.isfinite(value):
+        return None
+    return str(value)
+
+
+@lru_cache(maxsize=512)
+def _compile_expression(shape: str, signature: Tuple[Tuple[str, type], ...]):
+    return numexpr.NumExpr(shape, signature=list(signature))
+
+
+def _shape_program(shape: str, literal_types: Tuple[type, ...]):
+    tokens = shape.split()
+    names = tuple(name for name in _CONSTANTS if name in tokens)
+    signature = tuple(
+        [(f"n{i}", literal_type) for i, literal_type in enumerate(literal_types)]
+        + [(name, np.float64) for name in names]
+    )
+    return _compile_expression(shape, signature), names
+
+
+def _evaluate_shape(shape: str, literals: Tuple[str, ...]) -> Optional[str]:
+    """The output of the compiled program, or None to use numexpr.evaluate."""
+    values = _lift_literals(shape, literals)
+    if values is None:
+        return None
+    program, names = _shape_program(shape, tuple(value.dtype.type for value in values))
+    arguments = values + [_CONSTANTS[name] for name in names]
+    return _format_output(program(*(np.asarray(value) for value in arguments)))
+
+
+def is_plain_expression(expression: str) -> bool:
+    """True if the text can be evaluated by numexpr without an LLM translation."""
+    return _expression_shape(expression) is not None
+
+
 def _evaluate_expression(expression: str) -> str:
     try:
-        local_dict = {"pi": math.pi, "e": math.e}
-        output = str(
-            numexpr.evaluate(
-                expression.strip(),
-                global_dict={},  # restrict access to globals
-                local_dict=local_dict,  # add common mathematical functions
+        output = None
+        parsed = _expression_shape(expression)
+        if parsed is not None:
+            try:
+                output = _evaluate_shape(*parsed)
+            except Exception:
+                # e.g. an integer raised to a negative power: numexpr folds
+                # constants differently, so let it evaluate the original text.
+                output = None
+        if output is None:
+            local_dict = {"pi": math.pi, "e": math.e}
+            output = str(
+                numexpr.evaluate(
+                    expression.strip(),
+                    global_dict={},  # restrict access to globals
+                    local_dict=local_dict,  # add common mathematical functions
+                )
             )
-        )
     except Exception as e:
         raise ValueError(
             f'Failed to evaluate "{expression}". Raised error: {repr(e)}.'
@@ -106,7 +272,78 @@ def _evaluate_expression(expression: str) -> str:
     return re.sub(r"^\[|\]$", "", output)
 
 
-def get_math_tool(llm: ChatOpenAI):
+def _evaluate_expressions(expressions: List[str]) -> List[Union[str, Exception]]:
+    """Evaluate many expressions, running same-shaped ones as a single numexpr call.
+
+    Returns the output or the raised ValueError for each expression, in order.
+    """
+    results: List[Union[str, Exception, None]] = [None] * len(expressions)
+    groups: Dict[Tuple[str, Tuple[type, ...]], List[Tuple[int, list]]] = {}
+    for i, expression in enumerate(expressions):
+        parsed = _expression_shape(expression)
+        if parsed is None:
+            continue
+        shape, literals = parsed
+        values = _lift_literals(shape, literals)
+        if values is None:
+            continue
+        key = (shape, tuple(value.dtype.type for value in values))
+        groups.setdefault(key, []).append((i, values))
+
+    for (shape, literal_types), members in groups.items():
+        if len(members) < 2:
+            continue
+        try:
+            program, names = _shape_program(shape, literal_types)
+            columns = [
+                np.array([values[j] for _, values in members], dtype=literal_type)
+                for j, literal_type in enumerate(literal_types)
+            ]
+            constants = [np.asarray(_CONSTANTS[name]) for name in names]
+            output = np.broadcast_to(program(*columns, *constants), (len(members),))
+        except Exception:
+            # Evaluated one by one below, which also reports per-item errors
+            continue
+        for (i, _), value in zip(members, output):
+            # Left as None, non-finite values are evaluated one by one below
+            results[i] = _format_output(value)
+
+    for i, expression in enumerate(expressions):
+        if results[i] is None:
+            try:
+                results[i] = _evaluate_expression(expression)
+            except ValueError as e:
+                results[i] = e
+    return results
+
+
+def _context_messages(context: Optional[List[str]]) -> List[SystemMessage]:
+    if context:
+        context_str = "\n".join(context)
+        if context_str.strip():
+            context_str = _ADDITIONAL_CONTEXT_PROMPT.format(context=context_str.strip())
+            return [SystemMessage(content=context_str)]
+    return []
+
+
+def _normalize_problem(problem: str) -> str:
+    return " ".join(problem.split()).casefold()
+
+
+def _extraction_key(llm: ChatOpenAI, problem: str, context: Optional[List[str]]) -> str:
+    model_name = getattr(llm, "model_name", None) or getattr(llm, "model", "")
+    context_hash = hash_key(context or [])
+    return hash_key(model_name, _normalize_problem(problem), context_hash)
+
+
+def get_math_tool(
+    llm: ChatOpenAI, extraction_cache: Optional[PersistentCache] = EXTRACTION_CACHE
+):
+    """Math tool whose output artifact reports how the expression was obtained.
+
+    `extraction_cache` stores the LLM's problem -> ExecuteCode translations on
+    disk; pass None to disable it.
+    """
     prompt = ChatPromptTemplate.from_messages(
         [
             ("system", _SYSTEM_PROMPT),
@@ -116,28 +353,98 @@ def get_math_tool(llm: ChatOpenAI):
     )
     extractor = prompt | llm.with_structured_output(ExecuteCode)
 
+    @traced("math", kind="tool")
     def calculate_expression(
         problem: str,
         context: Optional[List[str]] = None,
         config: Optional[RunnableConfig] = None,
     ):
-        chain_input = {"problem": problem}
-        if context:
-            context_str = "\n".join(context)
-            if context_str.strip():
-                context_str = _ADDITIONAL_CONTEXT_PROMPT.format(
-                    context=context_str.strip()
-                )
-                chain_input["context"] = [SystemMessage(content=context_str)]
-        code_model = extractor.invoke(chain_input, config)
+        if is_plain_expression(problem):
+            # Already a numeric expression: skip the LLM translation step.
+            try:
+                return _evaluate_expression(problem), {"extraction": "skipped"}
+            except ValueError:
+                pass
+        code_model = None
+        if extraction_cache is not None:
+            key = _extraction_key(llm, problem, context)
+            if cached := extraction_cache.get(key):
+                code_model = ExecuteCode.model_validate_json(cached)
+            record_cache("math_extraction", code_model is not None)
+        metadata = {"extraction": "llm" if code_model is None else "cache_hit"}
+        if code_model is None:
+            chain_input = {"problem": problem}
+            if context_messages := _context_messages(context):
+                chain_input["context"] = context_messages
+            with span("math_extraction", kind="llm"):
+                code_model = extractor.invoke(chain_input, config)
         try:
-            return _evaluate_expression(code_model.code)
+            output = _evaluate_expression(code_model.code)
         except Exception as e:
-            return repr(e)
+            return repr(e), metadata
+        # Only translations that evaluate are worth keeping
+        if extraction_cache is not None and metadata["extraction"] == "llm":
+            extraction_cache.set(key, code_model.model_dump_json())
+        return output, metadata
 
+    # The metadata is returned as the ToolMessage artifact; invoking the tool
+    # with plain arguments still returns only the result string.
     return StructuredTool.from_function(
         name="math",
         func=calculate_expression,
         description=_MATH_DESCRIPTION,
+        response_format="content_and_artifact",
+    )
+
+
+def get_batch_math_tool(llm: ChatOpenAI):
+    """Math tool that solves many independent problems with one LLM call."""
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", _SYSTEM_PROMPT + _BATCH_INSTRUCTIONS),
+            ("user", "{problems}"),
+            MessagesPlaceholder(variable_name="context", optional=True),
+        ]
     )
+    extractor = prompt | llm.with_structured_output(ExecuteCodeBatch)
 
+    @traced("batch_math", kind="tool")
+    def calculate_expressions(
+        problems: List[str],
+        context: Optional[List[str]] = None,
+        config: Optional[RunnableConfig] = None,
+    ) -> List[str]:
+        results: List[Union[str, Exception, None]] = [None] * len(problems)
+        # Plain numeric problems are evaluated locally; the rest, and any plain
+        # problem that failed, are translated together in one LLM call.
+        plain = [i for i, problem in enumerate(problems) if is_plain_expression(problem)]
+        for i, output in zip(plain, _evaluate_expressions([problems[i] for i in plain])):
+            if not isinstance(output, Exception):
+                results[i] = output
+        pending = [i for i, result in enumerate(results) if result is None]
+        if pending:
+            chain_input = {
+                "problems": "\n".join(
+                    f"{n + 1}. {problems[i]}" for n, i in enumerate(pending)
+                )
+            }
+            if context_messages := _context_messages(context):
+                chain_input["context"] = context_messages
+            with span("batch_math_extraction", kind="llm", problems=len(pending)):
+                batch = extractor.invoke(chain_input, config)
+            codes = [code_model.code for code_model in batch.expressions]
+            outputs = _evaluate_expressions(codes[: len(pending)])
+            for i, output in zip(pending, outputs):
+                results[i] = output
+            for i in pending[len(codes) :]:
+                results[i] = ValueError("No expression was returned for this problem.")
+        return [
+            repr(result) if isinstance(result, Exception) else result
+            for result in results
+        ]
+
+    return StructuredTool.from_function(
+        name="batch_math",
+        func=calculate_expressions,
+        description=_BATCH_MATH_DESCRIPTION,
+    )
@@ -0,0 +1,183 @@
+## Observation Cache
+
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Optional,
+    Tuple,
+)
+
+from langchain_core.runnables import RunnableConfig
+
+from output_parser import Task
+from task_executor import execute_task, resolve_args, task_tool_name
+
+_MISSING = object()
+
+
+def cache_key(tool_name: str, resolved_args: Any) -> Tuple[str, str]:
+    """Key a tool call on its name and fully resolved arguments."""
+    return tool_name, json.dumps(resolved_args, sort_keys=True, default=str)
+
+
+def is_error_observation(observation: Any) -> bool:
+    return isinstance(observation, str) and observation.startswith("ERROR(")
+
+
+class ObservationCache:
+    """Memoize tool observations across tasks, replans and user turns.
+
+    Entries are keyed on (tool name, resolved args), bounded by an LRU policy
+    and optionally expire after a TTL. Tools listed in `uncached_tools` (e.g.
+    non-deterministic ones) always run. Concurrent calls for the same key
+    share a single execution. Errors are never cached.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: Optional[float] = None,
+        tool_ttls: Optional[Dict[str, float]] = None,
+        uncached_tools: Iterable[str] = (),
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.tool_ttls = tool_ttls or {}
+        self.uncached_tools = set(uncached_tools)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, threading.Event] = {}
+        self._inflight_async: Dict[Hashable, asyncio.Future] = {}
+
+    def enabled_for(self, tool_name: str) -> bool:
+        return tool_name not in self.uncached_tools
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+            }
+
+    def _lookup(self, key: Hashable) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at and expires_at < time.monotonic():
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, tool_name: str, key: Hashable, value: Any):
+        ttl = self.tool_ttls.get(tool_name, self.ttl)
+        expires_at = time.monotonic() + ttl if ttl else 0.0
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def call(self, tool_name: str, resolved_args: Any, fn: Callable[[], Any]) -> Any:
+        """Return the cached observation or compute it with `fn()` (thread-safe)."""
+        if not self.enabled_for(tool_name):
+            return fn()
+        key = cache_key(tool_name, resolved_args)
+        while True:
+            with self._lock:
+                value = self._lookup(key)
+                if value is not _MISSING:
+                    self.hits += 1
+                    return value
+                pending = self._inflight.get(key)
+                if pending is None:
+                    self.misses += 1
+                    self._inflight[key] = threading.Event()
+                    break
+            # Another thread is computing the same call; wait and look again.
+            pending.wait()
+        try:
+            value = fn()
+            if not is_error_observation(value):
+                with self._lock:
+                    self._store(tool_name, key, value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key).set()
+
+    async def acall(
+        self, tool_name: str, resolved_args: Any, fn: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Async version of `call` for tools awaited on the event loop."""
+        if not self.enabled_for(tool_name):
+            return await fn()
+        key = cache_key(tool_name, resolved_args)
+        while True:
+            with self._lock:
+                value = self._lookup(key)
+                if value is not _MISSING:
+                    self.hits += 1
+                    return value
+                pending = self._inflight_async.get(key)
+                if pending is None:
+                    self.misses += 1
+                    future = asyncio.get_running_loop().create_future()
+                    self._inflight_async[key] = future
+                    break
+            await asyncio.shield(pending)
+        try:
+            value = await fn()
+            if not is_error_observation(value):
+                with self._lock:
+                    self._store(tool_name, key, value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight_async.pop(key)
+            future.set_result(None)
+
+    def wrap(
+        self, execute: Callable[..., Any] = execute_task
+    ) -> Callable[[Task, Dict[int, Any]], Any]:
+        """Memoize an `execute(task, observations)` function, e.g. for DAGExecutor."""
+
+        def cached_execute(
+            task: Task,
+            observations: Dict[int, Any],
+            config: Optional[RunnableConfig] = None,
+        ):
+            if isinstance(task["tool"], str):
+                return execute(task, observations, config)
+            try:
+                resolved_args = resolve_args(task["args"], observations)
+            except Exception:
+                return execute(task, observations, config)
+            return self.call(
+                task_tool_name(task),
+                resolved_args,
+                lambda: execute(task, observations, config),
+            )
+
+        return cached_execute
@@ -7,6 +7,7 @@ from typing import (
     Dict,
     Iterator,
     List,
+    Mapping,
     Optional,
     Sequence,
     Tuple,
@@ -18,6 +19,7 @@ from langchain_core.messages import BaseMessage
 from langchain_core.output_parsers.transform import BaseTransformOutputParser
 from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import BaseTool
+from pydantic import PrivateAttr
 from typing_extensions import TypedDict
 
 THOUGHT_PATTERN = r"Thought: ([^\n]*)"
@@ -26,6 +28,20 @@ ACTION_PATTERN = r"\n*(\d+)\. (\w+)\((.*)\)(\s*#\w+\n)?"
 ID_PATTERN = r"\$\{?(\d+)\}?"
 END_OF_PLAN = "<END_OF_PLAN>"
 
+_THOUGHT_REGEX = re.compile(THOUGHT_PATTERN)
+_ACTION_REGEX = re.compile(ACTION_PATTERN)
+_ID_REGEX = re.compile(ID_PATTERN)
+_ACTION_PREFIX_REGEX = re.compile(r"\d+\. \w+\(")
+# Inside an action's arguments: a complete string literal, a paren, or an
+# opening quote whose string continues past the scanned text
+_ARGS_TOKEN_REGEX = re.compile(r"\"(?:[^\"\\]|\\.)*\"|'(?:[^'\\]|\\.)*'|[()\"']")
+_ARGS_STRING = r"\"(?:[^\"\\]|\\.)*\"|'(?:[^'\\]|\\.)*'"
+# A whole action whose arguments nest parens at most one level deep, matched
+# in one go; anything else is scanned token by token
+_ACTION_CALL_REGEX = re.compile(
+    rf"\d+\. \w+\((?:{_ARGS_STRING}|[^()\"']|\((?:{_ARGS_STRING}|[^()\"'])*\))*\)"
+)
+
 
 ### Helper functions
 
@@ -65,42 +81,62 @@ def _parse_llm_compiler_action_args(args: str, tool: Union[str, BaseTool]) -> li
 
 
 def default_dependency_rule(idx, args: str):
-    matches = re.findall(ID_PATTERN, args)
-    numbers = [int(match) for match in matches]
-    return idx in numbers
+    return idx in referenced_ids(args)
+
+
+def referenced_ids(args: str) -> set[int]:
+    """Return every task id referenced as $N or ${N} in a single pass."""
+    return {int(match) for match in _ID_REGEX.findall(args)}
 
 
 def _get_dependencies_from_graph(
     idx: int, tool_name: str, args: Dict[str, Any]
-) -> dict[str, list[str]]:
+) -> Sequence[int]:
     """Get dependencies from a graph."""
     if tool_name == "join":
+        # join depends on every earlier task. A list, not a range, so that
+        # plans stay JSON-serializable.
         return list(range(1, idx))
-    return [i for i in range(1, idx) if default_dependency_rule(i, str(args))]
+    return sorted(i for i in referenced_ids(str(args)) if 1 <= i < idx)
+
+
+def index_tools(tools: Sequence[BaseTool]) -> Dict[str, BaseTool]:
+    """Build the name -> tool map used to resolve planned actions."""
+    return {tool.name: tool for tool in tools}
 
 
 class Task(TypedDict):
     idx: int
     tool: BaseTool
     args: list
-    dependencies: Dict[str, list]
+    dependencies: Sequence[int]
     thought: Optional[str]
 
 
 def instantiate_task(
-    tools: Sequence[BaseTool],
+    tools: Union[Sequence[BaseTool], Mapping[str, BaseTool]],
     idx: int,
     tool_name: str,
     args: Union[str, Any],
     thought: Optional[str] = None,
 ) -> Task:
+    """Build a Task for one planned action.
+
+    Callers resolving many actions should pass the map from index_tools(),
+    built once, as LLMCompilerPlanParser does. A plain sequence of tools is
+    scanned for the name instead, without building a map per call.
+    """
     if tool_name == "join":
         tool = "join"
-    else:
+    elif isinstance(tools, Mapping):
         try:
-            tool = tools[[tool.name for tool in tools].index(tool_name)]
-        except ValueError as e:
+            tool = tools[tool_name]
+        except KeyError as e:
             raise OutputParserException(f"Tool {tool_name} not found.") from e
+    else:
+        tool = next((tool for tool in tools if tool.name == tool_name), None)
+        if tool is None:
+            raise OutputParserException(f"Tool {tool_name} not found.")
     tool_args = _parse_llm_compiler_action_args(args, tool)
     dependencies = _get_dependencies_from_graph(idx, tool_name, tool_args)
 
@@ -113,23 +149,176 @@ def instantiate_task(
     )
 
 
+class PlanLineAssembler:
+    """Incrementally split a streamed plan into parseable segments.
+
+    A segment is either a complete line or, for action lines, the text up to
+    the `)` that closes the argument list, so a task can be emitted before its
+    trailing newline arrives. The pending line is kept as a list of tokens and
+    only joined when its first `)` arrives, to check the prefix, and to emit
+    it. After that each token is scanned once, on its own, for the closing
+    `)`; lines that arrive whole are matched with a single regex.
+    """
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self.parts: List[str] = []
+        # None until the line prefix has been checked against `N. tool(`
+        self.is_action: Optional[bool] = None
+        self.done = False
+        self.depth = 0
+        self.quote: Optional[str] = None
+        self.skip_next = False
+
+    def feed(self, token: str) -> Sequence[str]:
+        if "\n" not in token:
+            # The bulk of small streamed chunks
+            if self.done:
+                return ()
+            self.parts.append(token)
+            if self.is_action or (self.is_action is None and ")" in token):
+                action = self._close_action(token)
+                if action is not None:
+                    return (action,)
+            return ()
+        lines = token.split("\n")
+        segments = []
+        # The first piece ends the pending line
+        action = self._append(lines[0])
+        if action is not None:
+            segments.append(action)
+        elif self.parts and not self.done:
+            segments.append("".join(self.parts))
+        for line in lines[1:-1]:
+            if line:
+                segments.append(self._complete_line(line))
+        self._reset()
+        action = self._append(lines[-1])
+        if action is not None:
+            segments.append(action)
+        return segments
+
+    def flush(self) -> Optional[str]:
+        """Return the unterminated last line, if any."""
+        line = None
+        if self.parts and not self.done:
+            line = "".join(self.parts)
+        self._reset()
+        return line
+
+    def _append(self, piece: str) -> Optional[str]:
+        """Add piece to the pending line; return the action if it closed."""
+        if self.done or not piece:
+            return None
+        self.parts.append(piece)
+        if self.is_action or (self.is_action is None and ")" in piece):
+            return self._close_action(piece)
+        return None
+
+    def _complete_line(self, line: str) -> str:
+        """Segment a line that arrived whole, without touching the pending one."""
+        if ")" in line:
+            match = _ACTION_CALL_REGEX.match(line)
+            if match:
+                return match.group()
+            if _ACTION_PREFIX_REGEX.match(line):
+                self._reset()
+                return self._append(line) or line
+        return line
+
+    def _close_action(self, piece: str) -> Optional[str]:
+        """Scan `piece`, just appended to the line; return the action once its `)` arrives."""
+        if self.is_action is None:
+            line = "".join(self.parts)
+            self.parts = [line]
+            match = _ACTION_CALL_REGEX.match(line)
+            if match:
+                self.done = True
+                return match.group()
+            match = _ACTION_PREFIX_REGEX.match(line)
+            if not match:
+                self.is_action = False
+                return None
+            self.is_action = True
+            self.depth = 1
+            piece, start = line, match.end()
+        else:
+            start = 0
+        end = self._scan(piece, start)
+        if end == -1:
+            return None
+        self.done = True
+        self.parts[-1] = piece[: end + 1]
+        return "".join(self.parts)
+
+    def _scan(self, text: str, pos: int) -> int:
+        """Advance the argument state over text[pos:]; return the index of the closing `)`, or -1."""
+        while True:
+            if self.quote:
+                pos = self._skip_quoted(text, pos)
+                if pos == -1:
+                    return -1
+            match = _ARGS_TOKEN_REGEX.search(text, pos)
+            if match is None:
+                return -1
+            token = match.group()
+            pos = match.end()
+            if token == "(":
+                self.depth += 1
+            elif token == ")":
+                self.depth -= 1
+                if self.depth == 0:
+                    return match.start()
+            elif len(token) == 1:
+                self.quote = token
+            # Else a complete string literal, skipped whole
+
+    def _skip_quoted(self, text: str, pos: int) -> int:
+        """Return the index after the quote closing the open string, or -1 if it is not in text."""
+        if self.skip_next:
+            # The previous piece ended with an escape
+            pos += 1
+            self.skip_next = False
+        while True:
+            close = text.find(self.quote, pos)
+            escape = text.find("\\", pos, len(text) if close == -1 else close)
+            if escape == -1:
+                break
+            pos = escape + 2
+            if pos > len(text):
+                self.skip_next = True
+                return -1
+        if close == -1:
+            return -1
+        self.quote = None
+        return close + 1
+
+
 class LLMCompilerPlanParser(BaseTransformOutputParser[dict], extra="allow"):
     """Planning output parser."""
 
     tools: List[BaseTool]
+    _tools_by_name: Dict[str, BaseTool] = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, __context: Any) -> None:
+        super().model_post_init(__context)
+        self._tools_by_name = index_tools(self.tools)
 
     def _transform(self, input: Iterator[Union[str, BaseMessage]]) -> Iterator[Task]:
-        texts = []
-        # TODO: Cleanup tuple state tracking here.
+        assembler = PlanLineAssembler()
         thought = None
         for chunk in input:
             # Assume input is str. TODO: support vision/other formats
             text = chunk if isinstance(chunk, str) else str(chunk.content)
-            for task, thought in self.ingest_token(text, texts, thought):
-                yield task
+            for task, thought in self.ingest_token(text, assembler, thought):
+                if task:
+                    yield task
         # Final possible task
-        if texts:
-            task, _ = self._parse_task("".join(texts), thought)
+        line = assembler.flush()
+        if line:
+            task, _ = self._parse_task(line, thought)
             if task:
                 yield task
 
@@ -145,30 +334,25 @@ class LLMCompilerPlanParser(BaseTransformOutputParser[dict], extra="allow"):
         yield from self.transform([input], config, **kwargs)
 
     def ingest_token(
-        self, token: str, buffer: List[str], thought: Optional[str]
+        self, token: str, assembler: PlanLineAssembler, thought: Optional[str]
     ) -> Iterator[Tuple[Optional[Task], str]]:
-        buffer.append(token)
-        if "\n" in token:
-            buffer_ = "".join(buffer).split("\n")
-            suffix = buffer_[-1]
-            for line in buffer_[:-1]:
-                task, thought = self._parse_task(line, thought)
-                if task:
-                    yield task, thought
-            buffer.clear()
-            buffer.append(suffix)
+        for segment in assembler.feed(token):
+            task, thought = self._parse_task(segment, thought)
+            # Thought-only segments are yielded too so the caller can carry
+            # the thought over to an action that arrives in a later token.
+            yield task, thought
 
     def _parse_task(self, line: str, thought: Optional[str] = None):
         task = None
-        if match := re.match(THOUGHT_PATTERN, line):
+        if match := _THOUGHT_REGEX.match(line):
             # Optionally, action can be preceded by a thought
             thought = match.group(1)
-        elif match := re.match(ACTION_PATTERN, line):
+        elif match := _ACTION_REGEX.match(line):
             # if action is parsed, return the task, and clear the buffer
             idx, tool_name, args, _ = match.groups()
             idx = int(idx)
             task = instantiate_task(
-                tools=self.tools,
+                tools=self._tools_by_name,
                 idx=idx,
                 tool_name=tool_name,
                 args=args,
@@ -1,34 +1,83 @@
 import gradio as gr
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from dotenv import load_dotenv
 from typing import Optional
 import os
 
-from langchain.chat_models import init_chat_model
+from langchain_openai import OpenAIEmbeddings
+from utils.model_registry import get_chat_model
+
+from utils.stream_metrics import StreamTimer
+from utils.response_cache import ResponseCache, model_params
+from utils.memory import ConversationMemory, make_summarizer
 
 load_dotenv('.secrets')
 
 if not os.environ.get("OPENAI_API_KEY"):
     raise ValueError("Missing OPENAI_API_KEY environment variable")
 
-llm = init_chat_model("gpt-4o-mini", model_provider="openai")
+llm = get_chat_model("gpt-4o-mini", model_provider="openai", stream_usage=True)
 
 
-def simple_chat(message: str, history: list[dict]) -> str:
+# Older turns are folded into a rolling summary to keep requests bounded
+memory = ConversationMemory(make_summarizer(lambda prompt: llm.invoke(prompt).content))
+
+
+# First-turn questions are answered from a cache of earlier answers: exact
+# matches always, similar questions when SIMPLE_CHAT_SEMANTIC_CACHE is on
+if os.getenv("SIMPLE_CHAT_SEMANTIC_CACHE", "true").lower() in ("1", "true", "yes"):
+    embeddings = OpenAIEmbeddings(model=os.getenv("SIMPLE_CHAT_EMBEDDING_MODEL", "text-embedding-3-small"))
+    response_cache = ResponseCache(embed=embeddings.embed_query)
+else:
+    response_cache = ResponseCache()
+
+
+def to_langchain_messages(message: str, history: list[dict]) -> list:
     langchain_messages = []
-    for msg in history:
-        if msg['role'] == 'user':
+    for msg in memory.build(history):
+        if msg['role'] == 'system':
+            langchain_messages.append(SystemMessage(content=msg['content']))
+        elif msg['role'] == 'user':
             langchain_messages.append(HumanMessage(content=msg['content']))
         elif msg['role'] == 'assistant':
             langchain_messages.append(AIMessage(content=msg['content']))
     langchain_messages.append(HumanMessage(content=message))
+    return langchain_messages
+
+
+def simple_chat(message: str, history: list[dict]) -> str:
+    return response_cache.invoke(llm, to_langchain_messages(message, history))
+
+
+def simple_chat_stream(message: str, history: list[dict]):
+    """
+    Streaming version of simple_chat: yields the answer so far as chunks arrive.
+    """
+    timer = StreamTimer("simple_chat")
+    messages = to_langchain_messages(message, history)
+    params = model_params(llm)
+    cached, tier, embedding = response_cache.lookup(messages, params)
+    if cached is not None:
+        timer.token()
+        yield cached
+        timer.finish()
+        return
 
-    response = llm.invoke(langchain_messages)
+    answer = ""
+    output_tokens = None
+    for chunk in llm.stream(messages):
+        if chunk.content:
+            timer.token()
+            answer += chunk.content
+            yield answer
+        if chunk.usage_metadata:
+            output_tokens = chunk.usage_metadata["output_tokens"]
+    turn = timer.finish(output_tokens)
+    response_cache.store(messages, params, answer, turn["total_s"], embedding)
 
-    return response.content
 
-    
-gr.ChatInterface(
-    fn=simple_chat,
-    type="messages"
-).launch()
+if __name__ == "__main__":
+    gr.ChatInterface(
+        fn=simple_chat_stream,
+        type="messages"
+    ).launch()
@@ -0,0 +1,189 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+import asyncio
+import time
+
+from pydantic import BaseModel, Field
+
+from utils.logger import get_logger
+
+_logs = get_logger(__name__)
+
+
+class WeatherData(BaseModel):
+    """Structured weather data response."""
+    temperature: float = Field(..., description="The current temperature in Celsius.")
+    humidity: float = Field(..., description="The current humidity level as a percentage.")
+    wind_speed: float = Field(..., description="The current wind speed in meters per second.")
+
+
+class WeatherBackend(ABC):
+    """
+    Source of weather data behind the MCP tools. A real provider subclasses
+    this and implements fetch; fetch_many can be overridden when the provider
+    has a bulk endpoint, and must return one result per location, in order.
+    """
+
+    @abstractmethod
+    async def fetch(self, location: str) -> WeatherData:
+        ...
+
+    async def fetch_many(self, locations: list[str]) -> list[WeatherData]:
+        return list(await asyncio.gather(*(self.fetch(location) for location in locations)))
+
+
+class SimulatedBackend(WeatherBackend):
+    """
+    Simulated weather data for demonstration purposes, with an optional
+    delay standing in for a provider's latency.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.requests = 0
+
+    async def fetch(self, location: str) -> WeatherData:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return WeatherData(temperature=22.5, humidity=60.0, wind_speed=5.5)
+
+
+def location_key(location: str) -> str:
+    return " ".join(location.split()).casefold()
+
+
+class CachedBackend(WeatherBackend):
+    """
+    Per-location TTL cache in front of another backend.
+
+    Locations are normalized for the lookup, so "Toronto" and " toronto "
+    share an entry. Concurrent requests for the same location share one
+    fetch, and the least recently used entry is dropped beyond max_entries.
+    """
+
+    def __init__(self, backend: WeatherBackend, ttl: float = 600.0, max_entries: int = 10_000):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._batches = set()
+
+    def _cached(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return data
+
+    def _store(self, key: str, data: WeatherData):
+        self._entries[key] = (time.monotonic() + self.ttl, data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def fetch(self, location: str) -> WeatherData:
+        # Runs on one event loop, so no lock is needed between the checks
+        key = location_key(location)
+        data = self._cached(key)
+        if data is not None:
+            self.hits += 1
+            return data
+        task = self._inflight.get(key)
+        if task is not None:
+            self.shared += 1
+        else:
+            self.misses += 1
+            task = self._inflight[key] = asyncio.get_running_loop().create_task(self._fetch(key, location))
+            # Retrieve the error even if every caller was cancelled
+            task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        # Every caller, the first included, waits through a shield, so a
+        # cancelled caller does not cancel the fetch the others share
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: str, location: str) -> WeatherData:
+        try:
+            data = await self.backend.fetch(location)
+            self._store(key, data)
+            return data
+        finally:
+            del self._inflight[key]
+
+    async def fetch_many(self, locations: list[str]) -> list[WeatherData]:
+        """
+        Serve cached locations directly, share the fetches already in flight
+        and fetch each remaining one once, through the wrapped backend's
+        fetch_many. As in fetch, the batch runs as a task of its own, so
+        cancelling this call does not cancel fetches other callers share.
+        """
+        results = {}
+        pending = {}
+        missing = {}
+        for location in locations:
+            key = location_key(location)
+            if key in results or key in pending or key in missing:
+                continue
+            data = self._cached(key)
+            if data is not None:
+                self.hits += 1
+                results[key] = data
+            elif key in self._inflight:
+                self.shared += 1
+                pending[key] = self._inflight[key]
+            else:
+                # Fetched under the first spelling the caller used
+                missing[key] = location
+        if missing:
+            self.misses += len(missing)
+            loop = asyncio.get_running_loop()
+            futures = {key: loop.create_future() for key in missing}
+            for future in futures.values():
+                future.add_done_callback(lambda future: future.cancelled() or future.exception())
+            self._inflight.update(futures)
+            pending.update(futures)
+            batch = loop.create_task(self._fetch_batch(missing, futures))
+            # The loop only keeps weak references to tasks
+            self._batches.add(batch)
+            batch.add_done_callback(self._batches.discard)
+        for key, awaitable in pending.items():
+            results[key] = await asyncio.shield(awaitable)
+        return [results[location_key(location)] for location in locations]
+
+    async def _fetch_batch(self, missing: dict, futures: dict):
+        try:
+            fetched = await self.backend.fetch_many(list(missing.values()))
+            if len(fetched) != len(missing):
+                raise ValueError(f"{type(self.backend).__name__}.fetch_many returned "
+                                 f"{len(fetched)} results for {len(missing)} locations")
+        except Exception as e:
+            for future in futures.values():
+                future.set_exception(e)
+        else:
+            for key, data in zip(missing, fetched):
+                self._store(key, data)
+                futures[key].set_result(data)
+        finally:
+            for key, future in futures.items():
+                del self._inflight[key]
+                if not future.done():
+                    # Only if the batch itself was cancelled, e.g. at shutdown
+                    future.cancel()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.shared
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared_fetches": self.shared,
+            "hit_rate": (self.hits + self.shared) / lookups if lookups else 0.0,
+            "ttl_s": self.ttl,
+        }
@@ -1,6 +1,7 @@
 
 from fastmcp import FastMCP
-from pydantic import BaseModel, Field
+from fastmcp.exceptions import ToolError
+from static_weather_mcp.backend import CachedBackend, SimulatedBackend, WeatherData
 from utils.logger import get_logger
 from dotenv import load_dotenv
 import os
@@ -8,27 +9,41 @@ import os
 load_dotenv()
 _logs = get_logger(__name__)
 
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "600"))
+WEATHER_BATCH_MAX = int(os.getenv("WEATHER_BATCH_MAX", "100"))
+
 
 mcp = FastMCP(
     name="weather_service",
     instructions="""
     This server provides weather forecast for the requested location.
     Respond with structured data including temperature, humidity, and wind speed.
+    Use weather_service_batch to get the weather for several locations in one call.
     """
 )
 
-class WeatherData(BaseModel):
-    """Structured weather data response."""
-    temperature: float = Field(..., description="The current temperature in Celsius.")
-    humidity: float = Field(..., description="The current humidity level as a percentage.")
-    wind_speed: float = Field(..., description="The current wind speed in meters per second.")
+# Replace the SimulatedBackend with a real provider's WeatherBackend; the tools stay the same
+weather_backend = CachedBackend(SimulatedBackend(), ttl=WEATHER_CACHE_TTL)
 
 
 @mcp.tool
-def weather_service(location: str) -> WeatherData:
+async def weather_service(location: str) -> WeatherData:
     """Fetches weather data for a given location."""
-    # Simulated weather data for demonstration purposes
-    return WeatherData(temperature=22.5, humidity=60.0, wind_speed=5.5)
+    return await weather_backend.fetch(location)
+
+
+@mcp.tool
+async def weather_service_batch(locations: list[str]) -> list[WeatherData]:
+    """Fetches weather data for several locations at once, in the order given."""
+    if len(locations) > WEATHER_BATCH_MAX:
+        raise ToolError(f"At most {WEATHER_BATCH_MAX} locations per call, got {len(locations)}.")
+    return await weather_backend.fetch_many(locations)
+
+
+@mcp.resource("weather://cache/stats", mime_type="application/json")
+def weather_cache_stats() -> dict:
+    """Hit rate and size of the weather cache."""
+    return weather_backend.stats()
 
 if __name__ == "__main__":
     mcp.run(
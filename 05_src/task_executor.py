@@ -0,0 +1,311 @@
+## Task Executor
+
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Union,
+)
+
+from langchain_core.runnables import RunnableConfig
+
+from output_parser import ID_PATTERN, Task
+
+_ID_REGEX = re.compile(ID_PATTERN)
+
+
+class TaskGraphError(ValueError):
+    """Raised when a plan contains cycles or unresolvable dependencies."""
+
+
+@dataclass
+class TaskTiming:
+    """Wall-clock timestamps for one task, as returned by `time.perf_counter`."""
+
+    idx: int
+    tool: str
+    received_at: float
+    ready_at: Optional[float] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def wait_time(self) -> float:
+        """Time spent waiting for dependencies."""
+        if self.ready_at is None:
+            return 0.0
+        return self.ready_at - self.received_at
+
+    @property
+    def queue_time(self) -> float:
+        """Time spent in the worker queue once all dependencies were met."""
+        if self.ready_at is None or self.started_at is None:
+            return 0.0
+        return self.started_at - self.ready_at
+
+    @property
+    def run_time(self) -> float:
+        """Time spent inside the tool."""
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+        return self.finished_at - self.started_at
+
+
+@dataclass
+class ExecutionReport:
+    """Result of running a plan: observations plus per-task timings and errors."""
+
+    observations: Dict[int, Any]
+    timings: Dict[int, TaskTiming] = field(default_factory=dict)
+    graph_errors: Dict[int, str] = field(default_factory=dict)
+    # Tasks that raised, timed out or were never executed
+    failed: Set[int] = field(default_factory=set)
+
+
+### Helper functions
+
+
+def task_tool_name(task: Task) -> str:
+    tool = task["tool"]
+    return tool if isinstance(tool, str) else tool.name
+
+
+def resolve_arg(arg: Union[str, Any], observations: Dict[int, Any]):
+    """Substitute $1 / ${1} references with the matching observation."""
+
+    def replace_match(match):
+        idx = int(match.group(1))
+        return str(observations.get(idx, match.group(0)))
+
+    if isinstance(arg, str):
+        return _ID_REGEX.sub(replace_match, arg)
+    elif isinstance(arg, list):
+        return [resolve_arg(a, observations) for a in arg]
+    else:
+        return str(arg)
+
+
+def resolve_args(args: Any, observations: Dict[int, Any]) -> Any:
+    """Resolve references in every value of a task's args."""
+    if isinstance(args, str):
+        return resolve_arg(args, observations)
+    elif isinstance(args, dict):
+        return {key: resolve_arg(val, observations) for key, val in args.items()}
+    # This will likely fail
+    return args
+
+
+def execute_task(
+    task: Task, observations: Dict[int, Any], config: Optional[RunnableConfig] = None
+):
+    """Resolve a task's arguments and invoke its tool, returning errors as text."""
+    tool_to_use = task["tool"]
+    if isinstance(tool_to_use, str):
+        return tool_to_use
+    args = task["args"]
+    try:
+        resolved_args = resolve_args(args, observations)
+    except Exception as e:
+        return (
+            f"ERROR(Failed to call {tool_to_use.name} with args {args}.)"
+            f" Args could not be resolved. Error: {repr(e)}"
+        )
+    try:
+        return tool_to_use.invoke(resolved_args, config)
+    except Exception as e:
+        return (
+            f"ERROR(Failed to call {tool_to_use.name} with args {args}."
+            + f" Args resolved to {resolved_args}. Error: {repr(e)})"
+        )
+
+
+def find_cycles(dependencies: Dict[int, Iterable[int]]) -> Set[int]:
+    """Return every node that sits on a dependency cycle."""
+    # Iterative Tarjan: any strongly connected component with more than one
+    # node, or a node depending on itself, is a cycle.
+    index: Dict[int, int] = {}
+    lowlink: Dict[int, int] = {}
+    on_stack: Set[int] = set()
+    stack: List[int] = []
+    cyclic: Set[int] = set()
+    counter = 0
+    for root in dependencies:
+        if root in index:
+            continue
+        work = [(root, iter(dependencies.get(root, ())))]
+        index[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, children = work[-1]
+            advanced = False
+            for child in children:
+                if child not in dependencies:
+                    continue
+                if child not in index:
+                    index[child] = lowlink[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(dependencies.get(child, ()))))
+                    advanced = True
+                    break
+                if child in on_stack:
+                    lowlink[node] = min(lowlink[node], index[child])
+            if advanced:
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+            if lowlink[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                if len(component) > 1 or node in dependencies.get(node, ()):
+                    cyclic.update(component)
+    return cyclic
+
+
+class DAGExecutor:
+    """Event-driven executor for a stream of LLMCompiler `Task`s.
+
+    Tasks are submitted to a thread pool as soon as their dependencies are
+    available. Completed tasks wake their dependents through a reverse
+    dependency index, so no thread is ever parked waiting on another task.
+    """
+
+    def __init__(
+        self,
+        execute: Callable[[Task, Dict[int, Any]], Any] = execute_task,
+        max_workers: Optional[int] = None,
+        allow_forward_refs: bool = False,
+        strict: bool = False,
+    ):
+        """
+        `execute` is called as `execute(task, observations)` from a worker thread.
+        Forward references (a task depending on a later idx) are rejected unless
+        `allow_forward_refs` is set. With `strict`, graph errors raise
+        `TaskGraphError` instead of being recorded as ERROR observations.
+        """
+        self.execute = execute
+        self.max_workers = max_workers
+        self.allow_forward_refs = allow_forward_refs
+        self.strict = strict
+
+    def run(
+        self, tasks: Iterable[Task], observations: Optional[Dict[int, Any]] = None
+    ) -> ExecutionReport:
+        """Execute `tasks` (possibly a lazy stream) and return the observations.
+
+        `observations` holds results from earlier rounds; it is updated in place.
+        """
+        if observations is None:
+            observations = {}
+        report = ExecutionReport(observations=observations)
+        lock = threading.Condition()
+        waiting: Dict[int, Set[int]] = {}
+        dependents: Dict[int, List[int]] = {}
+        registered: Dict[int, Task] = {}
+        in_flight = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+
+            def submit(idx: int, now: float):
+                report.timings[idx].ready_at = now
+                pool.submit(worker, registered[idx])
+
+            def worker(task: Task):
+                nonlocal in_flight
+                idx = task["idx"]
+                timing = report.timings[idx]
+                timing.started_at = time.perf_counter()
+                try:
+                    observation = self.execute(task, observations)
+                except Exception as e:
+                    observation = f"ERROR(Failed to execute task {idx}. Error: {repr(e)})"
+                    report.failed.add(idx)
+                timing.finished_at = time.perf_counter()
+                with lock:
+                    observations[idx] = observation
+                    for child in dependents.pop(idx, ()):
+                        unmet = waiting[child]
+                        unmet.discard(idx)
+                        if not unmet:
+                            del waiting[child]
+                            in_flight += 1
+                            submit(child, timing.finished_at)
+                    in_flight -= 1
+                    lock.notify_all()
+
+            for task in tasks:
+                idx = task["idx"]
+                now = time.perf_counter()
+                with lock:
+                    if idx in registered or idx in observations:
+                        self._graph_error(report, task, now, "duplicate task index")
+                        continue
+                    registered[idx] = task
+                    report.timings[idx] = TaskTiming(
+                        idx, task_tool_name(task), now
+                    )
+                    deps = task["dependencies"] or ()
+                    forward = [
+                        dep for dep in deps if dep >= idx and dep not in observations
+                    ]
+                    if forward and not self.allow_forward_refs:
+                        self._graph_error(
+                            report, task, now, f"forward reference to {forward}"
+                        )
+                        continue
+                    unmet = {dep for dep in deps if dep not in observations}
+                    if unmet:
+                        waiting[idx] = unmet
+                        for dep in unmet:
+                            dependents.setdefault(dep, []).append(idx)
+                    else:
+                        in_flight += 1
+                        submit(idx, now)
+
+            # The stream is exhausted: wait for the running tasks to drain.
+            with lock:
+                while in_flight:
+                    lock.wait()
+
+        if waiting:
+            # Nothing is running and nothing new can arrive, so whatever is
+            # still waiting is either on a cycle or behind a missing task.
+            now = time.perf_counter()
+            cyclic = find_cycles(waiting)
+            for idx in sorted(waiting):
+                if idx in cyclic:
+                    reason = "cyclic dependency"
+                else:
+                    reason = f"unresolved dependencies {sorted(waiting[idx])}"
+                self._graph_error(report, registered[idx], now, reason)
+        return report
+
+    def _graph_error(self, report: ExecutionReport, task: Task, now: float, reason: str):
+        idx = task["idx"]
+        if self.strict:
+            raise TaskGraphError(f"Task {idx} ({task_tool_name(task)}): {reason}.")
+        report.graph_errors[idx] = reason
+        report.failed.add(idx)
+        report.observations.setdefault(
+            idx, f"ERROR(Task {idx} was not executed: {reason}.)"
+        )
+        report.timings.setdefault(idx, TaskTiming(idx, task_tool_name(task), now))
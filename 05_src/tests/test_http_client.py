@@ -0,0 +1,139 @@
+"""Retries and circuit breaking in utils.http_client, against a local stub server."""
+
+import socket
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import httpx
+import pytest
+
+from utils.http_client import CircuitOpenError, HostState, HttpClient
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    hits = Counter()
+
+    def do_GET(self):
+        StubHandler.hits[self.command, self.path] += 1
+        self.send_response(500 if self.path == "/error" else 200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def base():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def delays(monkeypatch):
+    """Record the backoff delays."""
+    StubHandler.hits.clear()
+    slept = []
+    delay = HttpClient._delay
+
+    def record(client, attempt):
+        slept.append(delay(client, attempt))
+        return slept[-1]
+
+    monkeypatch.setattr(HttpClient, "_delay", record)
+    return slept
+
+
+def requests_to(client, base):
+    return client.metrics()[urlsplit(base).netloc]["requests"]
+
+
+def test_get_is_retried_with_bounded_backoff(base, delays):
+    client = HttpClient(retries=2, backoff=0.01, max_backoff=0.015, failure_threshold=100)
+    assert client.get(f"{base}/error").status_code == 500
+    assert StubHandler.hits["GET", "/error"] == 3
+    assert client.metrics()[urlsplit(base).netloc]["retries"] == 2
+    # Full jitter: uniform up to backoff * 2 ** attempt, capped at max_backoff
+    assert len(delays) == 2 and 0 <= delays[0] <= 0.01 and 0 <= delays[1] <= 0.015
+    client.close()
+
+
+def test_post_is_not_retried(base, delays):
+    client = HttpClient(retries=2, failure_threshold=100)
+    assert client.request("POST", f"{base}/error", json={"sign": "Leo"}).status_code == 500
+    assert StubHandler.hits["POST", "/error"] == 1 and not delays
+    client.close()
+
+
+def test_transport_errors_are_retried_only_for_idempotent_requests(delays):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        url = f"http://127.0.0.1:{sock.getsockname()[1]}/ok"
+    client = HttpClient(retries=2, backoff=0.01, failure_threshold=100)
+    with pytest.raises(httpx.ConnectError):
+        client.get(url)
+    assert requests_to(client, url) == 3
+    with pytest.raises(httpx.ConnectError):
+        client.request("POST", url)
+    assert requests_to(client, url) == 4
+    client.close()
+
+
+def test_successful_get_is_not_retried(base, delays):
+    client = HttpClient(retries=2)
+    assert client.get(f"{base}/ok").status_code == 200
+    assert StubHandler.hits["GET", "/ok"] == 1 and not delays
+    client.close()
+
+
+def test_breaker_opens_after_consecutive_failures(base):
+    client = HttpClient(retries=0, failure_threshold=3, reset_timeout=60)
+    for _ in range(3):
+        client.get(f"{base}/error")
+    assert client.metrics()[urlsplit(base).netloc]["circuit"] == "open"
+    with pytest.raises(CircuitOpenError):
+        client.get(f"{base}/ok")
+    # Rejected without contacting the host
+    assert StubHandler.hits["GET", "/ok"] == 0 and requests_to(client, base) == 3
+    client.close()
+
+
+def test_breaker_lets_one_trial_through_when_half_open():
+    host = HostState(failure_threshold=1, reset_timeout=0.05)
+    host.record(0.01, ok=False)
+    assert host.state == "open" and not host.allow()
+    time.sleep(0.06)
+    assert host.state == "half-open"
+    assert host.allow() and not host.allow()
+
+
+def test_breaker_closes_after_a_successful_trial(base):
+    client = HttpClient(retries=0, failure_threshold=1, reset_timeout=0.05)
+    client.get(f"{base}/error")
+    assert client.metrics()[urlsplit(base).netloc]["circuit"] == "open"
+    time.sleep(0.06)
+    assert client.get(f"{base}/ok").status_code == 200
+    assert client.metrics()[urlsplit(base).netloc]["circuit"] == "closed"
+    client.close()
+
+
+def test_failed_trial_reopens_the_breaker(base):
+    client = HttpClient(retries=0, failure_threshold=1, reset_timeout=0.05)
+    client.get(f"{base}/error")
+    time.sleep(0.06)
+    client.get(f"{base}/error")
+    assert client.metrics()[urlsplit(base).netloc]["circuit"] == "open"
+    with pytest.raises(CircuitOpenError):
+        client.get(f"{base}/ok")
+    client.close()
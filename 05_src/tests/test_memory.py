@@ -0,0 +1,107 @@
+"""Token budget and summary folding in utils.memory.ConversationMemory."""
+
+import pytest
+
+from utils import memory
+from utils.memory import SUMMARY_PREFIX, ConversationMemory, TokenCounter
+
+MAX_TOKENS = 300
+RECENT_TOKENS = 150
+SUMMARY_TOKENS = 100
+
+
+class StubSummarizer:
+    def __init__(self, reply=None):
+        self.reply = reply
+        self.calls = []
+
+    def __call__(self, summary, messages):
+        self.calls.append((summary, messages))
+        return self.reply or f"{summary} {len(messages)} messages".strip()
+
+
+@pytest.fixture(autouse=True)
+def no_tokenizer(monkeypatch):
+    # Estimated counts: one token per 4 characters, whatever tiktoken can download
+    monkeypatch.setattr(memory, "get_encoding", lambda model: None)
+
+
+def make_memory(summarizer):
+    return ConversationMemory(summarizer, max_tokens=MAX_TOKENS, recent_tokens=RECENT_TOKENS,
+                              summary_tokens=SUMMARY_TOKENS, counter=TokenCounter())
+
+
+def conversation(turns, session="a"):
+    history = []
+    for turn in range(turns):
+        history.append({"role": "user", "content": f"{session}: question {turn} " + "x" * 40})
+        history.append({"role": "assistant", "content": f"{session}: answer {turn} " + "y" * 80})
+    return history
+
+
+def test_short_history_is_sent_verbatim():
+    summarizer = StubSummarizer()
+    history = conversation(2)
+    assert make_memory(summarizer).build(history) == history
+    assert not summarizer.calls
+
+
+def test_requests_stay_within_the_budget():
+    summarizer = StubSummarizer()
+    mem = make_memory(summarizer)
+    history = []
+    for turn in range(60):
+        messages = mem.build(history)
+        assert mem.count(messages) <= MAX_TOKENS
+        if history:
+            assert messages[-1] == history[-1]
+        history = conversation(turn + 1)
+    messages = mem.build(history)
+    assert messages[0]["role"] == "system" and messages[0]["content"].startswith(SUMMARY_PREFIX)
+    # The verbatim part starts on a whole turn
+    assert messages[1]["role"] == "user"
+    assert mem.count(messages) <= MAX_TOKENS < mem.count(history)
+
+
+def test_summarizer_only_sees_the_previous_summary_and_new_messages():
+    summarizer = StubSummarizer()
+    mem = make_memory(summarizer)
+    for turn in range(1, 60):
+        mem.build(conversation(turn))
+    assert len(summarizer.calls) >= 2
+    folded = [message["content"] for _, messages in summarizer.calls for message in messages]
+    # Every message is summarized once, in order
+    assert folded == [message["content"] for message in conversation(60)[:len(folded)]]
+    summaries = [summary for summary, _ in summarizer.calls]
+    assert summaries[0] == "" and all(summaries[1:])
+
+
+def test_a_fold_is_reused_on_later_turns():
+    summarizer = StubSummarizer()
+    mem = make_memory(summarizer)
+    history = conversation(8)
+    summary, start = mem.fold(history)
+    assert summary and start and mem.summaries == 1
+    # The next turn adds little: the stored summary covers the same prefix
+    assert mem.fold(conversation(9)[:-1]) == (summary, start)
+    assert mem.summaries == 1 and len(summarizer.calls) == 1
+
+
+def test_sessions_do_not_share_summaries():
+    summarizer = StubSummarizer()
+    mem = make_memory(summarizer)
+    mem.build(conversation(8, "a"))
+    messages = mem.build(conversation(2, "b"))
+    assert all(message["content"].startswith("b:") for message in messages)
+
+
+def test_long_summaries_are_truncated_to_their_budget():
+    mem = make_memory(StubSummarizer(reply="z" * 10_000))
+    messages = mem.build(conversation(20))
+    assert mem.counter.count_message(messages[0]) <= SUMMARY_TOKENS
+    assert mem.count(messages) <= MAX_TOKENS
+
+
+def test_budget_must_hold_the_summary_and_recent_messages():
+    with pytest.raises(ValueError):
+        ConversationMemory(StubSummarizer(), max_tokens=100, recent_tokens=80, summary_tokens=30)
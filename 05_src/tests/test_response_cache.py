@@ -0,0 +1,89 @@
+"""Semantic tier of utils.response_cache.ResponseCache: free slots and skipped embeddings."""
+
+import time
+
+import pytest
+
+from utils.response_cache import ResponseCache
+
+VECTORS = {
+    "how do i reset my password": [1.0, 0.0],
+    "i forgot my password": [0.9, 0.1],
+    "what are your opening hours": [-1.0, 0.0],
+    "when are you open": [0.0, 1.0],
+}
+
+
+class StubEmbedding:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, text):
+        self.calls.append(text)
+        return VECTORS[text]
+
+
+@pytest.fixture
+def embed():
+    return StubEmbedding()
+
+
+def ask(text, system=None):
+    messages = [{"role": "system", "content": system}] if system else []
+    return messages + [{"role": "user", "content": text}]
+
+
+def test_free_slots_never_match(embed):
+    # Free slots are zero vectors, which beat a negative score at any threshold
+    cache = ResponseCache(embed=embed, threshold=-1.0, max_entries=4)
+    cache.store(ask("how do i reset my password"), {}, "Use the reset link.")
+    response, tier, _ = cache.lookup(ask("what are your opening hours"), {})
+    assert (response, tier) == ("Use the reset link.", "semantic")
+
+
+def test_only_free_slots_left_is_a_miss(embed):
+    cache = ResponseCache(embed=embed, threshold=-1.0, ttl=0.05, max_entries=4)
+    cache.store(ask("how do i reset my password"), {}, "Use the reset link.")
+    time.sleep(0.1)
+    assert cache.lookup(ask("when are you open"), {})[0] is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_embedding_is_skipped_when_nothing_can_match(embed):
+    cache = ResponseCache(embed=embed, threshold=0.8, max_entries=2)
+    assert cache.lookup(ask("i forgot my password"), {})[0] is None
+    assert embed.calls == []
+
+    cache.store(ask("how do i reset my password"), {"model": "a"}, "Use the reset link.")
+    embed.calls.clear()
+    # Other params, or another system prompt, have no entries to compare with
+    assert cache.lookup(ask("i forgot my password"), {"model": "b"})[0] is None
+    assert cache.lookup(ask("i forgot my password", "Answer in French."), {"model": "a"})[0] is None
+    # Nor do exact hits and multi-turn requests need an embedding
+    assert cache.lookup(ask("How do I  reset my password"), {"model": "a"})[1] == "exact"
+    multi_turn = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}] + ask("when are you open")
+    assert cache.lookup(multi_turn, {"model": "a"})[1] == "bypass"
+    assert embed.calls == []
+
+    assert cache.lookup(ask("i forgot my password"), {"model": "a"})[1] == "semantic"
+    assert embed.calls == ["i forgot my password"]
+
+
+def test_embedding_is_skipped_once_the_last_candidate_is_evicted(embed):
+    cache = ResponseCache(embed=embed, threshold=0.8, max_entries=1)
+    cache.store(ask("how do i reset my password"), {"model": "a"}, "Use the reset link.")
+    # Evicts the only entry with params "a"
+    cache.store(ask("when are you open"), {"model": "b"}, "From nine to five.")
+    embed.calls.clear()
+    assert cache.lookup(ask("i forgot my password"), {"model": "a"})[0] is None
+    assert embed.calls == []
+
+
+def test_a_lookup_embedding_is_reused_by_store(embed):
+    cache = ResponseCache(embed=embed, threshold=0.99)
+    cache.store(ask("how do i reset my password"), {}, "Use the reset link.")
+    embed.calls.clear()
+    response, _, embedding = cache.lookup(ask("what are your opening hours"), {})
+    assert response is None and embedding is not None
+    cache.store(ask("what are your opening hours"), {}, "From nine to five.", embedding=embedding)
+    assert embed.calls == ["what are your opening hours"]
@@ -0,0 +1,112 @@
+"""Fetch sharing and batch checks in static_weather_mcp.backend.CachedBackend."""
+
+import asyncio
+
+import pytest
+
+from static_weather_mcp.backend import CachedBackend, SimulatedBackend, WeatherBackend
+
+LATENCY = 0.02
+
+
+class ShortBatchBackend(SimulatedBackend):
+    async def fetch_many(self, locations):
+        return (await super().fetch_many(locations))[:-1]
+
+
+class LongBatchBackend(SimulatedBackend):
+    async def fetch_many(self, locations):
+        return (await super().fetch_many(locations)) * 2
+
+
+class FailingBackend(SimulatedBackend):
+    async def fetch(self, location):
+        await super().fetch(location)
+        raise ConnectionError("provider down")
+
+
+def test_concurrent_fetches_share_one_request():
+    async def run():
+        simulated = SimulatedBackend(latency=LATENCY)
+        cached = CachedBackend(simulated)
+        results = await asyncio.gather(*(cached.fetch(spelling) for spelling in ["Rome", " rome", "ROME "] * 4))
+        return simulated, cached, results
+
+    simulated, cached, results = asyncio.run(run())
+    assert simulated.requests == 1 and len(results) == 12
+    assert cached.stats()["misses"] == 1 and cached.stats()["shared_fetches"] == 11
+
+
+def test_overlapping_batches_and_singles_share_fetches():
+    async def run():
+        simulated = SimulatedBackend(latency=LATENCY)
+        cached = CachedBackend(simulated)
+        cities = [f"City {i}" for i in range(15)]
+        first, second, single = await asyncio.gather(
+            cached.fetch_many(cities[:10]), cached.fetch_many(cities[5:15]), cached.fetch(cities[0]))
+        return simulated, cached, first, second
+
+    simulated, cached, first, second = asyncio.run(run())
+    assert len(first) == len(second) == 10
+    assert simulated.requests == 15 and cached.stats()["shared_fetches"] == 6
+
+
+def test_fetch_many_keeps_order_and_fetches_each_location_once():
+    async def run():
+        simulated = SimulatedBackend()
+        cached = CachedBackend(simulated)
+        await cached.fetch("Oslo")
+        return simulated, await cached.fetch_many(["Paris", " paris ", "Oslo", "PARIS", "Lima"])
+
+    simulated, results = asyncio.run(run())
+    assert len(results) == 5 and results[0] is results[1] is results[3]
+    assert simulated.requests == 3
+
+
+@pytest.mark.parametrize("backend", [ShortBatchBackend, LongBatchBackend])
+def test_batch_result_count_is_checked(backend):
+    async def run():
+        cached = CachedBackend(backend())
+        with pytest.raises(ValueError, match="2 locations"):
+            await cached.fetch_many(["Lima", "Oslo"])
+        return cached
+
+    cached = asyncio.run(run())
+    assert not cached._inflight and cached.stats()["entries"] == 0
+
+
+def test_cancelled_first_caller_leaves_the_fetch_to_the_others():
+    async def run():
+        simulated = SimulatedBackend(latency=LATENCY)
+        cached = CachedBackend(simulated)
+        leaders = [asyncio.create_task(cached.fetch("Oslo")),
+                   asyncio.create_task(cached.fetch_many(["Lima", "Cusco"]))]
+        await asyncio.sleep(0)
+        followers = asyncio.gather(cached.fetch("Oslo"), cached.fetch_many(["Cusco", "Oslo", "Lima"]))
+        await asyncio.sleep(0)
+        for leader in leaders:
+            leader.cancel()
+        _, batch = await followers
+        return simulated, cached, batch
+
+    simulated, cached, batch = asyncio.run(run())
+    assert len(batch) == 3 and simulated.requests == 3 and cached.stats()["entries"] == 3
+
+
+def test_errors_reach_every_caller_and_are_not_cached():
+    async def run():
+        failing = FailingBackend(latency=LATENCY)
+        cached = CachedBackend(failing)
+        results = await asyncio.gather(cached.fetch("Oslo"), cached.fetch(" oslo"), return_exceptions=True)
+        assert all(isinstance(result, ConnectionError) for result in results)
+        with pytest.raises(ConnectionError):
+            await cached.fetch("Oslo")
+        return failing, cached
+
+    failing, cached = asyncio.run(run())
+    assert failing.requests == 2 and cached.stats()["entries"] == 0 and not cached._inflight
+
+
+def test_weather_backend_needs_a_fetch():
+    with pytest.raises(TypeError):
+        WeatherBackend()
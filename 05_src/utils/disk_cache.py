@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CACHE_DIR = os.getenv('CACHE_DIR', './cache/')
+# Seconds between writes of the last_used times of in-memory hits
+CACHE_TOUCH_INTERVAL = float(os.getenv('CACHE_TOUCH_INTERVAL', '5'))
+
+
+def hash_key(*parts: Any) -> str:
+    '''
+    Build a stable cache key from JSON-serializable parts.
+    '''
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class PersistentCache:
+    '''
+    Size-bounded key/value cache stored in SQLite.
+
+    Several worker processes can share one cache file: SQLite's WAL mode
+    serializes writers and lets readers proceed concurrently. The database
+    is opened on first use, not when the cache is created, and the most
+    recently used entries are then loaded into memory; lookups check that
+    in-memory copy before the database.
+
+    Hits refresh last_used, which eviction orders by, in batches written at
+    most every touch_interval seconds and before each eviction, so that the
+    entries other processes keep using are not evicted first.
+    '''
+
+    def __init__(self, name: str, cache_dir: str = CACHE_DIR,
+                 max_entries: int = 10_000, warm_entries: int = 1_000,
+                 touch_interval: float = CACHE_TOUCH_INTERVAL):
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, f'{name}.sqlite')
+        self.max_entries = max_entries
+        self.warm_entries = warm_entries
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.misses = 0
+        self._memory: 'OrderedDict[str, str]' = OrderedDict()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open_lock = threading.Lock()
+        self._opened = False
+        self._writes = 0
+        self._touched = {}
+        self._touched_at = time.monotonic()
+
+    def _open(self):
+        '''
+        Create the database and load the warm entries on first use.
+        '''
+        if self._opened:
+            return
+        with self._open_lock:
+            if self._opened:
+                return
+            if not os.path.exists(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS entries ('
+                    'key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL)'
+                )
+                conn.execute('CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)')
+            self._warm_start()
+            self._opened = True
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections cannot be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _warm_start(self):
+        rows = self._connection().execute(
+            'SELECT key, value FROM entries ORDER BY last_used DESC LIMIT ?',
+            (self.warm_entries,),
+        ).fetchall()
+        with self._lock:
+            for key, value in reversed(rows):
+                self._memory[key] = value
+
+    def _remember(self, key: str, value: str):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.warm_entries:
+                self._memory.popitem(last=False)
+
+    def _touch(self, key: str) -> bool:
+        '''
+        Note a hit on key; True when the noted hits are due to be written.
+        Call with self._lock held.
+        '''
+        self._touched[key] = time.time()
+        return time.monotonic() - self._touched_at >= self.touch_interval
+
+    def flush(self):
+        '''
+        Write the last_used times of the hits noted since the last flush.
+        '''
+        with self._lock:
+            touched, self._touched = self._touched, {}
+            self._touched_at = time.monotonic()
+        if not touched:
+            return
+        conn = self._connection()
+        with conn:
+            # Another process may have used the entry more recently
+            conn.executemany(
+                'UPDATE entries SET last_used = ? WHERE key = ? AND last_used < ?',
+                [(used, key, used) for key, used in touched.items()],
+            )
+
+    def get(self, key: str) -> Optional[str]:
+        self._open()
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                due = self._touch(key)
+        if value is not None:
+            if due:
+                self.flush()
+            return value
+        conn = self._connection()
+        row = conn.execute('SELECT value FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        self._remember(key, row[0])
+        with self._lock:
+            self.hits += 1
+            due = self._touch(key)
+        if due:
+            self.flush()
+        return row[0]
+
+    def set(self, key: str, value: str):
+        self._open()
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO entries (key, value, last_used) VALUES (?, ?, ?)',
+                (key, value, time.time()),
+            )
+        self._remember(key, value)
+        # Counting rows is a table scan, so only trim every 100 writes
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % 100 == 1
+        if evict:
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        '''
+        Drop the least recently used rows beyond max_entries.
+        '''
+        self.flush()
+        (count,) = conn.execute('SELECT COUNT(*) FROM entries').fetchone()
+        if count <= self.max_entries:
+            return
+        with conn:
+            conn.execute(
+                'DELETE FROM entries WHERE key IN '
+                '(SELECT key FROM entries ORDER BY last_used ASC LIMIT ?)',
+                (count - self.max_entries,),
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'in_memory': len(self._memory)}
@@ -0,0 +1,286 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import httpx
+
+from utils.logger import get_logger
+from utils.tracing import span
+
+_logs = get_logger(__name__)
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Only these are retried: repeating them has the same effect as sending once
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE', 'TRACE')
+
+
+class CircuitOpenError(RuntimeError):
+    '''
+    Raised without contacting the host while its circuit breaker is open.
+    '''
+
+
+class HostState:
+    '''
+    Circuit breaker and latency metrics for one host.
+    '''
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, samples: int = 1000):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.latencies = deque(maxlen=samples)
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self) -> bool:
+        with self.lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self.trial_in_flight:
+                # Let a single trial request through
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def end_trial(self):
+        '''
+        End a request that neither succeeded nor failed against the host,
+        such as a cancelled one, so that a half-open circuit can try again.
+        '''
+        with self.lock:
+            self.trial_in_flight = False
+
+    def record_retry(self):
+        with self.lock:
+            self.retries += 1
+
+    def record(self, latency: float, ok: bool):
+        with self.lock:
+            self.requests += 1
+            self.latencies.append(latency)
+            self.trial_in_flight = False
+            if ok:
+                self.consecutive_failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.opened_at is not None or self.consecutive_failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            latencies = sorted(self.latencies)
+            snapshot = {
+                'requests': self.requests,
+                'failures': self.failures,
+                'retries': self.retries,
+                'circuit': self.state,
+            }
+        for name, p in (('p50_ms', 0.50), ('p95_ms', 0.95), ('max_ms', 1.0)):
+            if latencies:
+                latency = latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+                snapshot[name] = round(latency * 1000, 3)
+            else:
+                snapshot[name] = None
+        return snapshot
+
+
+class HttpClient:
+    '''
+    Pooled HTTP client shared by the API-backed tools.
+
+    Connections are kept alive and pooled per host, every request has connect
+    and read timeouts, idempotent requests are retried with jittered
+    exponential backoff, and a per-host circuit breaker fails fast when a
+    host keeps failing. Both a sync (`get`) and an async (`aget`) interface
+    are provided.
+    '''
+
+    def __init__(self, connect_timeout: float = 3.0, read_timeout: float = 10.0,
+                 retries: int = 2, backoff: float = 0.2, max_backoff: float = 2.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 max_connections: int = 100, max_keepalive: int = 20):
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._client = httpx.Client(timeout=self.timeout, limits=self.limits)
+        self._async_clients = {}
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _host(self, url: str) -> HostState:
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = HostState(self.failure_threshold, self.reset_timeout)
+            return self._hosts[host]
+
+    def _delay(self, attempt: int) -> float:
+        # "Full jitter" backoff
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _should_retry(self, method: str, response, error, attempt: int) -> bool:
+        if attempt >= self.retries or method.upper() not in IDEMPOTENT_METHODS:
+            return False
+        return error is not None or response.status_code in RETRY_STATUSES
+
+    def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        with span(f'{method} {urlsplit(url).netloc}', kind='http', url=url) as request_span:
+            response = self._send(method, url, request_span, **kwargs)
+            request_span.set(status_code=response.status_code)
+            return response
+
+    def _send(self, method: str, url: str, request_span, **kwargs) -> httpx.Response:
+        host = self._host(url)
+        attempt = 0
+        while True:
+            if not host.allow():
+                raise CircuitOpenError(f'Circuit open for {urlsplit(url).netloc}')
+            start = time.perf_counter()
+            response, error = None, None
+            try:
+                response = self._client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                error = e
+            except BaseException:
+                # Not the host's failure, e.g. an invalid URL or a cancelled
+                # task, but a half-open trial must not stay in flight forever
+                host.end_trial()
+                raise
+            ok = error is None and response.status_code < 500
+            host.record(time.perf_counter() - start, ok)
+            if not self._should_retry(method, response, error, attempt):
+                if error is not None:
+                    raise error
+                return response
+            host.record_retry()
+            request_span.set(retries=attempt + 1)
+            time.sleep(self._delay(attempt))
+            attempt += 1
+
+    def get(self, url: str, **kwargs) -> httpx.Response:
+        return self.request('GET', url, **kwargs)
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        # An AsyncClient is bound to the loop it was first used on, so each
+        # loop gets its own
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                self._close_stale_clients()
+                client = self._async_clients[loop] = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+            return client
+
+    def _close_stale_clients(self):
+        '''
+        Close the clients of event loops that have been closed, e.g. by
+        successive asyncio.run calls. Their transports cannot be closed
+        through the dead loop, so the pooled sockets are closed directly.
+        '''
+        for loop in [loop for loop in self._async_clients if loop.is_closed()]:
+            client = self._async_clients.pop(loop)
+            pool = getattr(client._transport, '_pool', None)
+            for connection in getattr(pool, 'connections', ()):
+                stream = getattr(getattr(connection, '_connection', None), '_network_stream', None)
+                sock = stream.get_extra_info('socket') if stream is not None else None
+                if sock is not None:
+                    # asyncio wraps the socket in a TransportSocket without close()
+                    getattr(sock, '_sock', sock).close()
+
+    async def arequest(self, method: str, url: str, **kwargs) -> httpx.Response:
+        with span(f'{method} {urlsplit(url).netloc}', kind='http', url=url) as request_span:
+            response = await self._asend(method, url, request_span, **kwargs)
+            request_span.set(status_code=response.status_code)
+            return response
+
+    async def _asend(self, method: str, url: str, request_span, **kwargs) -> httpx.Response:
+        client = self._get_async_client()
+        host = self._host(url)
+        attempt = 0
+        while True:
+            if not host.allow():
+                raise CircuitOpenError(f'Circuit open for {urlsplit(url).netloc}')
+            start = time.perf_counter()
+            response, error = None, None
+            try:
+                response = await client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                error = e
+            except BaseException:
+                # Not the host's failure, e.g. an invalid URL or a cancelled
+                # task, but a half-open trial must not stay in flight forever
+                host.end_trial()
+                raise
+            ok = error is None and response.status_code < 500
+            host.record(time.perf_counter() - start, ok)
+            if not self._should_retry(method, response, error, attempt):
+                if error is not None:
+                    raise error
+                return response
+            host.record_retry()
+            request_span.set(retries=attempt + 1)
+            await asyncio.sleep(self._delay(attempt))
+            attempt += 1
+
+    async def aget(self, url: str, **kwargs) -> httpx.Response:
+        return await self.arequest('GET', url, **kwargs)
+
+    def metrics(self) -> dict:
+        '''
+        Per-host request counts, latency percentiles and circuit state.
+        '''
+        with self._lock:
+            hosts = dict(self._hosts)
+        return {host: state.snapshot() for host, state in hosts.items()}
+
+    def close(self):
+        self._client.close()
+
+    async def aclose(self):
+        '''
+        Close the async client of the running loop, and those of closed loops.
+        '''
+        with self._lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+            self._close_stale_clients()
+        if client is not None:
+            await client.aclose()
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    '''
+    Return the process-wide HTTP client, creating it on first use.
+    '''
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = HttpClient()
+        return _default_client
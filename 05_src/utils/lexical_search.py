@@ -0,0 +1,148 @@
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from utils.logger import get_logger
+
+_logs = get_logger(__name__)
+
+
+def top_k(scores: np.ndarray, ids: np.ndarray, k: int) -> list:
+    '''
+    The k highest (id, score) pairs, best first, selected with argpartition
+    so that only the k winners are sorted.
+    '''
+    if len(scores) > k:
+        winners = np.argpartition(-scores, k - 1)[:k]
+        scores, ids = scores[winners], ids[winners]
+    order = np.argsort(-scores, kind='stable')
+    return [(int(ids[i]), float(scores[i])) for i in order]
+
+
+class LexicalIndex:
+    '''
+    TF-IDF search over a document collection without the all-pairs matrix.
+
+    fit() learns the vocabulary and IDF once and keeps the L2-normalized
+    TF-IDF rows as a CSR matrix, plus its transpose, also CSR, as a term ->
+    documents inverted index. A query is one sparse product of its TF-IDF
+    vector with that index, so it only touches the documents that share a
+    term with it, and the k best are picked with argpartition. Cosine
+    similarity is the dot product, as all vectors have unit length.
+
+    add() indexes new documents with the fitted vocabulary and IDF: terms
+    first seen in them are ignored until refit(). They go to a small second
+    index, merged into the main one once it holds more than merge_ratio of
+    the documents, so adding is not O(corpus) each time.
+    '''
+
+    def __init__(self, merge_ratio: float = 0.1, **vectorizer_params):
+        '''
+        vectorizer_params go to TfidfVectorizer, e.g. stop_words='english'.
+        '''
+        vectorizer_params.setdefault('dtype', np.float32)
+        self.vectorizer = TfidfVectorizer(**vectorizer_params)
+        self.merge_ratio = merge_ratio
+        self.documents = []
+        self._main = None
+        self._main_postings = None
+        self._delta_blocks = []
+        self._delta_postings = None
+
+    def __len__(self):
+        return len(self.documents)
+
+    def fit(self, documents: list) -> 'LexicalIndex':
+        '''
+        Fit the vectorizer on documents and index them, replacing any earlier index.
+        '''
+        self.documents = list(documents)
+        self._main = self.vectorizer.fit_transform(self.documents).tocsr()
+        self._main_postings = self._main.T.tocsr()
+        self._delta_blocks = []
+        self._delta_postings = None
+        _logs.debug('Indexed %d documents, %d terms', len(self.documents), len(self.vectorizer.vocabulary_))
+        return self
+
+    def refit(self) -> 'LexicalIndex':
+        '''
+        Fit again on every document, to pick up the vocabulary and IDF of added ones.
+        '''
+        return self.fit(self.documents)
+
+    def add(self, documents: list) -> range:
+        '''
+        Index more documents and return their ids.
+        '''
+        if self._main is None:
+            start = len(self.documents)
+            self.fit(documents)
+            return range(start, len(self.documents))
+        start = len(self.documents)
+        documents = list(documents)
+        self.documents.extend(documents)
+        self._delta_blocks.append(self.vectorizer.transform(documents).tocsr())
+        self._delta_postings = None
+        if self._delta_size() > self.merge_ratio * self._main.shape[0]:
+            self._merge()
+        return range(start, len(self.documents))
+
+    def _delta_size(self) -> int:
+        return sum(block.shape[0] for block in self._delta_blocks)
+
+    def _merge(self):
+        self._main = sp.vstack([self._main] + self._delta_blocks, format='csr')
+        self._main_postings = self._main.T.tocsr()
+        self._delta_blocks = []
+        self._delta_postings = None
+
+    @property
+    def matrix(self) -> sp.csr_matrix:
+        '''
+        The L2-normalized TF-IDF rows of every document, as one CSR matrix.
+        '''
+        if self._delta_blocks:
+            self._merge()
+        return self._main
+
+    def _segments(self):
+        '''
+        (first document id, inverted index) of the main and the delta index.
+        '''
+        segments = [(0, self._main_postings)]
+        if self._delta_blocks:
+            if self._delta_postings is None:
+                self._delta_postings = sp.vstack(self._delta_blocks, format='csr').T.tocsr()
+            segments.append((self._main.shape[0], self._delta_postings))
+        return segments
+
+    def search_batch(self, queries: list, k: int = 10) -> list:
+        '''
+        The k most similar documents for each query, as (id, score) pairs,
+        best first. Documents that share no term with a query are left out.
+        '''
+        if self._main is None:
+            raise ValueError('The index is empty, call fit() first')
+        query_matrix = self.vectorizer.transform(queries)
+        products = [(offset, (query_matrix @ postings).tocsr()) for offset, postings in self._segments()]
+        results = []
+        for row in range(len(queries)):
+            scores, ids = [], []
+            for offset, product in products:
+                start, end = product.indptr[row], product.indptr[row + 1]
+                scores.append(product.data[start:end])
+                ids.append(product.indices[start:end] + offset)
+            results.append(top_k(np.concatenate(scores), np.concatenate(ids), k))
+        return results
+
+    def search(self, query: str, k: int = 10) -> list:
+        '''
+        The k most similar documents to query, as (id, score) pairs, best first.
+        '''
+        return self.search_batch([query], k)[0]
+
+    def similar(self, doc_id: int, k: int = 10) -> list:
+        '''
+        The k documents most similar to an indexed one, excluding itself.
+        '''
+        return [(i, score) for i, score in self.search(self.documents[doc_id], k + 1) if i != doc_id][:k]
@@ -1,5 +1,10 @@
+import atexit
 import logging
+import queue
+import threading
+import time
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
 
 from dotenv import load_dotenv
 import os
@@ -8,27 +13,117 @@ load_dotenv()
 
 LOG_DIR = os.getenv('LOG_DIR', './logs/')
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN', 'midnight')
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))
 
-def get_logger(name, log_dir = LOG_DIR, log_level = LOG_LEVEL):
 
+class RotatingLogFileHandler(TimedRotatingFileHandler):
     '''
-    Set up a logger with the given name and log level.
+    Rotates the log file at the interval given by `when` and whenever it
+    grows past max_bytes, whichever comes first.
     '''
-    _logs = logging.getLogger(name)
+
+    def __init__(self, filename, max_bytes = LOG_MAX_BYTES, when = LOG_ROTATE_WHEN,
+                 backup_count = LOG_BACKUP_COUNT):
+        super().__init__(filename, when=when, backupCount=backup_count, encoding='utf-8', delay=True)
+        self.max_bytes = max_bytes
+
+    def shouldRollover(self, record):
+        if self.max_bytes > 0:
+            if self.stream is None:
+                self.stream = self._open()
+            if self.stream.tell() >= self.max_bytes:
+                return True
+        return super().shouldRollover(record)
+
+    def rotation_filename(self, default_name):
+        # Two size rollovers within the same second would otherwise overwrite each other
+        name = super().rotation_filename(default_name)
+        if os.path.exists(name):
+            name = f'{name}.{time.time_ns()}'
+        return name
+
+
+class LazyQueueHandler(QueueHandler):
+    '''
+    Puts records on the queue as they are. QueueHandler formats the message
+    in the calling thread; here the writer thread does it, so a log call only
+    costs the caller a queue put. Objects passed as arguments are formatted
+    when the record is written, so they should not be changed after the call.
+    '''
+
+    def prepare(self, record):
+        return record
+
+
+_queue = queue.SimpleQueue()
+_queue_handler = LazyQueueHandler(_queue)
+_listener = None
+_log_file = None
+_lock = threading.Lock()
+
+
+def _start_listener(log_dir):
+    '''
+    Start the background writer: one log file per process, plus the console.
+    '''
+    global _listener, _log_file
     if not os.path.exists(log_dir):
         os.makedirs(log_dir)
-    
-    f_handler = logging.FileHandler(os.path.join(log_dir, f'{ datetime.now().strftime("%Y%m%d_%H%M%S") }.log'))
+    _log_file = os.path.join(log_dir, f'{ datetime.now().strftime("%Y%m%d_%H%M%S") }.log')
+
+    f_handler = RotatingLogFileHandler(_log_file)
     f_format = logging.Formatter('%(asctime)s, %(name)s, %(filename)s, %(lineno)d, %(funcName)s, %(levelname)s, %(message)s')
     f_handler.setFormatter(f_format)
-    
+
     s_handler = logging.StreamHandler()
     s_format = logging.Formatter('%(asctime)s, %(filename)s, %(lineno)d, %(levelname)s, %(message)s')
     s_handler.setFormatter(s_format)
-    
-    if not len(_logs.handlers):
-        _logs.addHandler(f_handler)
-        _logs.addHandler(s_handler)
-    
+
+    _listener = QueueListener(_queue, f_handler, s_handler)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    '''
+    Write out the queued records and stop the background writer. A later
+    get_logger call starts a new one.
+    '''
+    global _listener
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def get_log_file():
+    '''
+    Path of this process's log file, or None before the first get_logger call.
+    '''
+    return _log_file
+
+
+def get_logger(name, log_dir = LOG_DIR, log_level = LOG_LEVEL):
+
+    '''
+    Set up a logger with the given name and log level.
+
+    Every logger hands its records to a queue, and a single background thread
+    writes them to the process's log file and the console. The log file is
+    created in log_dir by the first call.
+    '''
+    with _lock:
+        if _listener is None:
+            _start_listener(log_dir)
+
+    _logs = logging.getLogger(name)
+    if _queue_handler not in _logs.handlers:
+        _logs.addHandler(_queue_handler)
+
     _logs.setLevel(log_level)
     return _logs
@@ -0,0 +1,342 @@
+import asyncio
+import contextlib
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+from fastmcp import Client
+from fastmcp.client.messages import MessageHandler
+from mcp.shared.exceptions import McpError
+
+from utils.logger import get_logger
+
+_logs = get_logger(__name__)
+
+load_dotenv()
+
+MCP_POOL_SESSIONS = int(os.getenv('MCP_POOL_SESSIONS', '2'))
+MCP_POOL_TIMEOUT = float(os.getenv('MCP_POOL_TIMEOUT', '30'))
+MCP_POOL_RETRIES = int(os.getenv('MCP_POOL_RETRIES', '1'))
+
+# Error code the streamable http transport reports when the server no longer knows the session
+SESSION_TERMINATED = 32600
+
+
+class SessionLost(ConnectionError):
+    '''
+    Raised when the connection of a pooled session ends while a request is in
+    flight. sent is False if it ended before the request was written, so the
+    server cannot have acted on it.
+    '''
+
+    def __init__(self, message: str, sent: bool = True):
+        super().__init__(message)
+        self.sent = sent
+
+
+def session_broken(error: Exception) -> bool:
+    '''
+    True if error means the session is unusable.
+    '''
+    if isinstance(error, SessionLost):
+        return True
+    return isinstance(error, McpError) and error.error.code == SESSION_TERMINATED
+
+
+def can_retry(error: Exception, idempotent: bool) -> bool:
+    '''
+    True if the request can go to a new session: the session is broken and
+    either the request is idempotent or the server cannot have run it. A
+    server that reports the session terminated has rejected the request.
+    '''
+    if not session_broken(error):
+        return False
+    return idempotent or not isinstance(error, SessionLost) or not error.sent
+
+
+class ListChangedHandler(MessageHandler):
+    '''
+    Drops a server's cached tool and prompt lists when it announces a change.
+    '''
+
+    def __init__(self, server: 'ServerPool'):
+        self.server = server
+
+    async def on_tool_list_changed(self, message):
+        self.server.invalidate_tools()
+
+    async def on_prompt_list_changed(self, message):
+        self.server.invalidate_prompts()
+
+
+class PooledSession:
+    '''
+    One warm MCP session. Concurrent requests share it, each with its own
+    JSON-RPC id.
+    '''
+
+    def __init__(self, client: Client):
+        self.client = client
+        self.in_flight = 0
+        self.requests = 0
+        self.connected = False
+        self._connect_lock = asyncio.Lock()
+
+    @property
+    def _task(self):
+        # fastmcp runs the transport in a background task that ends when the connection does
+        return self.client._session_state.session_task
+
+    def dead(self) -> bool:
+        return self.connected and (self._task is None or self._task.done())
+
+    async def connect(self):
+        async with self._connect_lock:
+            if not self.connected:
+                await self.client.__aenter__()
+                self.connected = True
+
+    async def request(self, send):
+        '''
+        Await send(client), failing fast with SessionLost if the connection
+        ends first; otherwise the request would wait for its full timeout.
+        '''
+        task = self._task
+        if task is None or task.done():
+            raise SessionLost('MCP session ended before the request was sent', sent=False)
+        request = asyncio.ensure_future(send(self.client))
+        try:
+            await asyncio.wait((request, task), return_when=asyncio.FIRST_COMPLETED)
+            if request.done():
+                return request.result()
+            raise SessionLost(f'MCP session ended: {task.exception() if not task.cancelled() else "cancelled"}')
+        finally:
+            if not request.done():
+                request.cancel()
+                with contextlib.suppress(BaseException):
+                    await request
+
+    async def close(self):
+        # Closing a session whose connection failed re-raises that failure
+        with contextlib.suppress(Exception):
+            await self.client.close()
+
+
+class ServerPool:
+    '''
+    Warm sessions and cached discovery results for one server URL.
+    '''
+
+    def __init__(self, url: str, size: int, timeout: float):
+        self.url = url
+        self.size = size
+        self.timeout = timeout
+        self.sessions = []
+        self.tools = None
+        self.prompts = None
+        self.tools_version = 0
+        self.prompts_version = 0
+        self.connects = 0
+        self.reconnects = 0
+        self.requests = 0
+        self.failures = 0
+        self.discovery_hits = 0
+        self.discovery_misses = 0
+        self._lock = asyncio.Lock()
+
+    def invalidate_tools(self):
+        self.tools = None
+        self.tools_version += 1
+
+    def invalidate_prompts(self):
+        self.prompts = None
+        self.prompts_version += 1
+
+    def _new_session(self) -> PooledSession:
+        client = Client(self.url, timeout=self.timeout, message_handler=ListChangedHandler(self))
+        return PooledSession(client)
+
+    async def acquire(self) -> PooledSession:
+        '''
+        The least busy live session, opening a new one while all are busy and
+        the pool is below size. The caller must release() it.
+        '''
+        async with self._lock:
+            for session in [s for s in self.sessions if s.dead()]:
+                await self.discard(session)
+            session = min(self.sessions, key=lambda s: s.in_flight, default=None)
+            if session is None or (session.in_flight and len(self.sessions) < self.size):
+                session = self._new_session()
+                self.sessions.append(session)
+                self.connects += 1
+            session.in_flight += 1
+        try:
+            await session.connect()
+        except Exception:
+            self.release(session)
+            await self.discard(session)
+            raise
+        return session
+
+    def release(self, session: PooledSession):
+        session.in_flight -= 1
+        session.requests += 1
+
+    async def discard(self, session: PooledSession):
+        if session in self.sessions:
+            self.sessions.remove(session)
+            # A new session may reach a restarted server with other tools
+            self.invalidate_tools()
+            self.invalidate_prompts()
+            await session.close()
+
+    def snapshot(self) -> dict:
+        return {
+            'sessions': len(self.sessions),
+            'in_flight': sum(s.in_flight for s in self.sessions),
+            'requests': self.requests,
+            'failures': self.failures,
+            'connects': self.connects,
+            'reconnects': self.reconnects,
+            'discovery_hits': self.discovery_hits,
+            'discovery_misses': self.discovery_misses,
+        }
+
+
+class McpClientPool:
+    '''
+    Shared MCP client that keeps warm sessions per server URL.
+
+    Instead of opening a Client, handshaking and listing tools for every
+    call, requests go to one of up to sessions_per_server open sessions,
+    concurrent requests are multiplexed over them, and list_tools and
+    list_prompts are answered from a cache that is dropped when the server
+    sends a list-changed notification. A request whose session was lost is
+    retried on a new session, up to retries times, if it is idempotent or
+    was never sent: a tool call may already have run on the server.
+
+    Servers are addressed by URL, or by anything else fastmcp.Client accepts,
+    e.g. a FastMCP instance for the in-memory transport. Sessions belong to
+    the event loop they were opened on; on another loop the pool starts over.
+    '''
+
+    def __init__(self, sessions_per_server: int = MCP_POOL_SESSIONS, timeout: float = MCP_POOL_TIMEOUT,
+                 retries: int = MCP_POOL_RETRIES):
+        self.sessions_per_server = sessions_per_server
+        self.timeout = timeout
+        self.retries = retries
+        self._servers = {}
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def _server(self, url: str) -> ServerPool:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._loop is not loop:
+                if self._servers:
+                    _logs.debug('MCP client pool used on a new event loop, dropping its sessions')
+                self._servers = {}
+                self._loop = loop
+            if url not in self._servers:
+                self._servers[url] = ServerPool(url, self.sessions_per_server, self.timeout)
+            return self._servers[url]
+
+    async def _request(self, url: str, send, idempotent: bool):
+        server = self._server(url)
+        attempt = 0
+        while True:
+            session = await server.acquire()
+            start = time.perf_counter()
+            try:
+                result = await session.request(send)
+            except Exception as e:
+                server.failures += 1
+                if session_broken(e):
+                    await server.discard(session)
+                if not can_retry(e, idempotent) or attempt >= self.retries:
+                    raise
+                _logs.info(f'MCP session to {url} lost after {time.perf_counter() - start:.2f}s, reconnecting: {e}')
+                server.reconnects += 1
+                attempt += 1
+                continue
+            finally:
+                server.release(session)
+                server.requests += 1
+            return result
+
+    async def call_tool(self, url: str, name: str, arguments: dict = None, timeout: float = None):
+        '''
+        Call a tool over a pooled session; returns what Client.call_tool does.
+        Tools need not be idempotent, so a call is only retried on a new
+        session if the server cannot have run it; otherwise SessionLost is raised.
+        '''
+        return await self._request(url, lambda client: client.call_tool(name, arguments or {}, timeout=timeout),
+                                   idempotent=False)
+
+    async def list_tools(self, url: str, refresh: bool = False) -> list:
+        server = self._server(url)
+        if server.tools is not None and not refresh:
+            server.discovery_hits += 1
+            return server.tools
+        server.discovery_misses += 1
+        version = server.tools_version
+        tools = await self._request(url, lambda client: client.list_tools(), idempotent=True)
+        # Not cached if a change notification arrived while listing
+        if server.tools_version == version:
+            server.tools = tools
+        return tools
+
+    async def list_prompts(self, url: str, refresh: bool = False) -> list:
+        server = self._server(url)
+        if server.prompts is not None and not refresh:
+            server.discovery_hits += 1
+            return server.prompts
+        server.discovery_misses += 1
+        version = server.prompts_version
+        prompts = await self._request(url, lambda client: client.list_prompts(), idempotent=True)
+        if server.prompts_version == version:
+            server.prompts = prompts
+        return prompts
+
+    async def request(self, url: str, send, idempotent: bool = False):
+        '''
+        Run send(client) on a pooled session, for the Client methods that
+        have no wrapper here, e.g.
+
+            pool.request(url, lambda c: c.read_resource(uri), idempotent=True)
+
+        Only idempotent requests are retried after the request was sent.
+        '''
+        return await self._request(url, send, idempotent)
+
+    def metrics(self) -> dict:
+        '''
+        Per-server session counts, requests, reconnects and discovery cache hits.
+        '''
+        with self._lock:
+            servers = dict(self._servers)
+        return {url: server.snapshot() for url, server in servers.items()}
+
+    async def aclose(self):
+        with self._lock:
+            servers = list(self._servers.values())
+            self._servers = {}
+        for server in servers:
+            for session in list(server.sessions):
+                await server.discard(session)
+
+
+_default_pool = None
+_default_lock = threading.Lock()
+
+
+def get_mcp_pool() -> McpClientPool:
+    '''
+    Return the process-wide MCP client pool, creating it on first use.
+    '''
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = McpClientPool()
+        return _default_pool
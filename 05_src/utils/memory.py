@@ -0,0 +1,229 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import tiktoken
+from dotenv import load_dotenv
+
+from utils.logger import get_logger
+
+_logs = get_logger(__name__)
+
+load_dotenv()
+
+MEMORY_MAX_TOKENS = int(os.getenv('MEMORY_MAX_TOKENS', '3000'))
+MEMORY_RECENT_TOKENS = int(os.getenv('MEMORY_RECENT_TOKENS', '1500'))
+MEMORY_SUMMARY_TOKENS = int(os.getenv('MEMORY_SUMMARY_TOKENS', '500'))
+
+# Tokens the chat format adds around every message
+MESSAGE_OVERHEAD = 4
+
+SUMMARY_PREFIX = 'Summary of the earlier conversation:\n'
+
+SUMMARY_PROMPT = '''Update the running summary of a conversation with the new messages below.
+Keep names, facts, preferences and open questions; drop small talk.
+Answer with the updated summary only, in at most {max_words} words.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}'''
+
+
+# Rough size of a token in characters when no tokenizer is available
+CHARS_PER_TOKEN = 4
+
+
+def get_encoding(model: str):
+    '''
+    Return the tiktoken encoding for a model, or None if it cannot be loaded
+    (tiktoken downloads its vocabularies on first use).
+    '''
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding('cl100k_base')
+    except Exception as e:
+        _logs.warning(f'Could not load a tokenizer for {model}, estimating token counts: {e}')
+        return None
+
+
+class TokenCounter:
+    '''
+    Count tokens with the model's tokenizer, caching the count per message text.
+    '''
+
+    def __init__(self, model: str = 'gpt-4o-mini', maxsize: int = 10_000):
+        self.encoding = get_encoding(model)
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count(self, text: str) -> int:
+        with self._lock:
+            n = self._counts.get(text)
+            if n is not None:
+                self._counts.move_to_end(text)
+                self.hits += 1
+                return n
+            self.misses += 1
+        if self.encoding is None:
+            n = -(-len(text) // CHARS_PER_TOKEN)
+        else:
+            n = len(self.encoding.encode(text))
+        with self._lock:
+            self._counts[text] = n
+            if len(self._counts) > self.maxsize:
+                self._counts.popitem(last=False)
+        return n
+
+    def count_message(self, message: dict) -> int:
+        return self.count(message.get('content') or '') + MESSAGE_OVERHEAD
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if self.encoding is None:
+            return text[:max_tokens * CHARS_PER_TOKEN]
+        tokens = self.encoding.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        return self.encoding.decode(tokens[:max_tokens])
+
+
+def message_hash(previous: str, message: dict) -> str:
+    '''
+    Rolling hash of a history prefix: the hash of the previous prefix plus one message.
+    '''
+    digest = hashlib.sha1(previous.encode('utf-8'))
+    digest.update(f"\x00{message.get('role')}\x00{message.get('content')}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def make_summarizer(complete, max_tokens: int = MEMORY_SUMMARY_TOKENS):
+    '''
+    Build a summarize(summary, messages) function from complete(prompt) -> str,
+    a call to whichever model the app uses.
+    '''
+    def summarize(summary: str, messages: list[dict]) -> str:
+        lines = '\n'.join(f"{m.get('role')}: {m.get('content')}" for m in messages)
+        prompt = SUMMARY_PROMPT.format(
+            max_words=int(max_tokens * 0.75),
+            summary=summary or '(empty)',
+            messages=lines,
+        )
+        return complete(prompt)
+
+    return summarize
+
+
+class ConversationMemory:
+    '''
+    Keep chat requests within a token budget.
+
+    The most recent messages are sent verbatim. When they outgrow the budget,
+    the oldest ones are folded into a rolling summary: the summarizer only sees
+    the previous summary and the newly folded messages, never the full history.
+    Folding stops at recent_tokens, below max_tokens, so the summarizer runs
+    once every few turns rather than on every turn.
+
+    Summaries are stored under a hash of the history prefix they cover, so the
+    same memory serves every session without a session id: a session finds its
+    own summary by hashing the Gradio history it sends on each turn.
+    '''
+
+    def __init__(self, summarize, max_tokens: int = MEMORY_MAX_TOKENS,
+                 recent_tokens: int = MEMORY_RECENT_TOKENS,
+                 summary_tokens: int = MEMORY_SUMMARY_TOKENS,
+                 counter: TokenCounter = None, max_folds: int = 1000):
+        if recent_tokens + summary_tokens > max_tokens:
+            raise ValueError('recent_tokens + summary_tokens must not exceed max_tokens')
+        self.summarize = summarize
+        self.max_tokens = max_tokens
+        self.recent_tokens = recent_tokens
+        self.summary_tokens = summary_tokens
+        self.counter = counter or TokenCounter()
+        self.max_folds = max_folds
+        self.summaries = 0
+        self._folds = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _find_fold(self, history: list[dict]):
+        '''
+        Return (prefix hashes, folded message count, summary) for the longest
+        folded prefix of history.
+        '''
+        hashes = []
+        h = ''
+        for message in history:
+            h = message_hash(h, message)
+            hashes.append(h)
+        with self._lock:
+            for i in range(len(hashes) - 1, -1, -1):
+                fold = self._folds.get(hashes[i])
+                if fold is not None:
+                    self._folds.move_to_end(hashes[i])
+                    return hashes, i + 1, fold
+        return hashes, 0, ''
+
+    def _store_fold(self, key: str, summary: str):
+        with self._lock:
+            self._folds[key] = summary
+            self._folds.move_to_end(key)
+            while len(self._folds) > self.max_folds:
+                self._folds.popitem(last=False)
+
+    def fold(self, history: list[dict]) -> tuple[str, int]:
+        '''
+        Return (summary, start): history[:start] is covered by the summary and
+        history[start:] is sent verbatim. Folds more messages first if the
+        verbatim part is over budget. Unless it is 0 or len(history), start is
+        the index of a user message.
+        '''
+        hashes, start, summary = self._find_fold(history)
+        recent = history[start:]
+        counts = [self.counter.count_message(m) for m in recent]
+        budget = self.max_tokens - self.summary_tokens
+
+        if sum(counts) > budget:
+            # Fold the oldest messages until the window is back under
+            # recent_tokens and starts with a user message
+            total = sum(counts)
+            cut = 0
+            while cut < len(recent) and (total > self.recent_tokens or recent[cut].get('role') != 'user'):
+                total -= counts[cut]
+                cut += 1
+            summary = self.summarize(summary, recent[:cut])
+            summary = self.counter.truncate(summary, self.summary_tokens - MESSAGE_OVERHEAD - 10)
+            self.summaries += 1
+            start += cut
+            self._store_fold(hashes[start - 1], summary)
+            _logs.debug('Folded %d messages into the summary, %d kept verbatim', cut, len(history) - start)
+        return summary, start
+
+    def build(self, history: list[dict]) -> list[dict]:
+        '''
+        Turn the full history into the messages to send: an optional summary
+        message followed by the recent messages verbatim.
+        '''
+        summary, start = self.fold(history)
+        messages = []
+        if summary:
+            messages.append({'role': 'system', 'content': SUMMARY_PREFIX + summary})
+        return messages + [{'role': m.get('role'), 'content': m.get('content')} for m in history[start:]]
+
+    def count(self, messages: list[dict]) -> int:
+        return sum(self.counter.count_message(m) for m in messages)
+
+    def stats(self) -> dict:
+        with self._lock:
+            folds = len(self._folds)
+        return {
+            'summaries': self.summaries,
+            'stored_folds': folds,
+            'token_cache_hits': self.counter.hits,
+            'token_cache_misses': self.counter.misses,
+        }
@@ -0,0 +1,146 @@
+import threading
+import time
+
+from langchain.chat_models import init_chat_model
+from openai import AsyncOpenAI, OpenAI
+
+from utils.logger import get_logger
+
+_logs = get_logger(__name__)
+
+
+def _freeze(value):
+    '''
+    Turn keyword arguments into a hashable cache key.
+    '''
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return repr(value)
+
+
+class RegistryEntry:
+    '''
+    One cached client or model binding and how often it was reused.
+    '''
+
+    def __init__(self, value, init_s: float, keep=()):
+        self.value = value
+        self.init_s = init_s
+        self.hits = 0
+        # Objects whose id() is part of the key must outlive the entry
+        self.keep = keep
+
+
+class ModelRegistry:
+    '''
+    Build chat models, their tool bindings and OpenAI SDK clients once per
+    process and hand out the same instance on every later call.
+
+    A chat model is keyed by (provider, model, params). Its tool bindings are
+    keyed by the model key plus the tools, so every toolset bound to the same
+    model shares that model's client and HTTP connection pool.
+    '''
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key, build, keep=()):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.hits += 1
+                return entry.value
+            # Built under the lock so concurrent first calls build only once;
+            # that only happens once per key
+            start = time.perf_counter()
+            value = build()
+            entry = RegistryEntry(value, time.perf_counter() - start, keep)
+            self._entries[key] = entry
+        _logs.debug(f'Built {key[0]} {key[1:3]} in {entry.init_s * 1000:.1f} ms')
+        return value
+
+    def chat_model(self, model: str, model_provider: str = None, tools: list = None, **params):
+        '''
+        Return the chat model for (model_provider, model, params), bound to
+        tools when they are given. Extra keyword arguments go to init_chat_model.
+        '''
+        key = ('chat_model', model_provider, model, _freeze(params))
+        base = self._get(key, lambda: init_chat_model(model, model_provider=model_provider, **params))
+        if not tools:
+            return base
+        tools = tuple(tools)
+        return self._get(key + (tuple(id(t) for t in tools),), lambda: base.bind_tools(list(tools)), keep=tools)
+
+    def openai_client(self, **params) -> OpenAI:
+        '''
+        Return the OpenAI SDK client built with params.
+        '''
+        return self._get(('openai_client', None, None, _freeze(params)), lambda: OpenAI(**params))
+
+    def async_openai_client(self, **params) -> AsyncOpenAI:
+        '''
+        Return the AsyncOpenAI SDK client built with params.
+        '''
+        return self._get(('async_openai_client', None, None, _freeze(params)), lambda: AsyncOpenAI(**params))
+
+    def metrics(self) -> dict:
+        '''
+        Build time and reuse count of every cached entry.
+        '''
+        with self._lock:
+            entries = list(self._entries.items())
+        per_entry = [
+            {
+                'kind': key[0],
+                'provider': key[1],
+                'model': key[2],
+                'tools': len(key[4]) if len(key) > 4 else 0,
+                'init_ms': entry.init_s * 1000,
+                'hits': entry.hits,
+            }
+            for key, entry in entries
+        ]
+        return {
+            'entries': len(entries),
+            'init_ms': sum(e['init_ms'] for e in per_entry),
+            'hits': sum(e['hits'] for e in per_entry),
+            'per_entry': per_entry,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_default_registry = None
+_default_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    '''
+    Return the process-wide model registry, creating it on first use.
+    '''
+    global _default_registry
+    with _default_lock:
+        if _default_registry is None:
+            _default_registry = ModelRegistry()
+        return _default_registry
+
+
+def get_chat_model(model: str, model_provider: str = None, tools: list = None, **params):
+    return get_model_registry().chat_model(model, model_provider=model_provider, tools=tools, **params)
+
+
+def get_openai_client(**params) -> OpenAI:
+    return get_model_registry().openai_client(**params)
+
+
+def get_async_openai_client(**params) -> AsyncOpenAI:
+    return get_model_registry().async_openai_client(**params)
@@ -0,0 +1,265 @@
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+
+import numpy as np
+from dotenv import load_dotenv
+
+from utils.disk_cache import hash_key
+from utils.logger import get_logger
+from utils.tracing import record_cache
+
+_logs = get_logger(__name__)
+
+load_dotenv()
+
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', '3600'))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '1000'))
+RESPONSE_CACHE_THRESHOLD = float(os.getenv('RESPONSE_CACHE_THRESHOLD', '0.95'))
+
+
+def normalize_text(text: str) -> str:
+    return ' '.join(text.split()).casefold()
+
+
+def normalize_messages(messages: list) -> tuple:
+    '''
+    (role, normalized text) pairs for LangChain messages or role/content dicts.
+    '''
+    normalized = []
+    for m in messages:
+        if isinstance(m, dict):
+            role, content = m.get('role'), m.get('content') or ''
+        else:
+            role, content = m.type, m.text()
+        normalized.append((role, normalize_text(content)))
+    return tuple(normalized)
+
+
+class CacheEntry:
+    def __init__(self, response: str, params_key: str, slot: int, expires_at: float, latency_s: float):
+        self.response = response
+        self.params_key = params_key
+        self.slot = slot
+        self.expires_at = expires_at
+        self.latency_s = latency_s
+
+
+class ResponseCache:
+    '''
+    Two-tier cache of chat model responses.
+
+    The exact tier is keyed on the normalized messages and the model params.
+    The semantic tier embeds the user's question and returns the answer to
+    an earlier question with the same params and system prompt whose cosine similarity is at
+    least threshold. The embeddings are rows of one in-memory matrix, so a
+    lookup is a single matrix-vector product.
+
+    Only single-question requests are cached: an answer that depends on
+    earlier turns is not reused for another conversation. Entries expire
+    after ttl seconds, and the least recently used entry is evicted beyond
+    max_entries.
+    '''
+
+    def __init__(self, embed=None, threshold: float = RESPONSE_CACHE_THRESHOLD,
+                 ttl: float = RESPONSE_CACHE_TTL, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        '''
+        embed(text) returns an embedding vector; without it only the exact tier is used.
+        '''
+        self.embed = embed
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.saved_s = 0.0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Semantic index: one row per slot, with the entry key and params of each slot
+        self._vectors = None
+        self._slot_keys = [None] * max_entries
+        self._slot_params = np.full(max_entries, '', dtype=object)
+        self._free = list(range(max_entries - 1, -1, -1))
+        # Embedded entries per params key: with none, a lookup skips the embedding call
+        self._semantic_counts = Counter()
+
+    @staticmethod
+    def cacheable(messages: list) -> bool:
+        '''
+        True for a single user question, optionally after system messages.
+        '''
+        turns = [role for role, _ in normalize_messages(messages) if role != 'system']
+        return turns in (['user'], ['human'])
+
+    def _embedding(self, text: str):
+        '''
+        Unit-length embedding of text, or None if the embedding call fails;
+        the semantic tier is then skipped and the request goes to the model.
+        '''
+        try:
+            vector = np.asarray(self.embed(text), dtype=np.float32)
+        except Exception as e:
+            _logs.warning(f'Embedding failed, skipping the semantic cache: {e}')
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _question(self, messages: list) -> str:
+        return normalize_messages(messages)[-1][1]
+
+    @staticmethod
+    def _params_key(messages: list, params: dict) -> str:
+        # System prompts count as params: questions only match under the same one
+        system = [text for role, text in normalize_messages(messages) if role == 'system']
+        return hash_key(params or {}, system)
+
+    def lookup(self, messages: list, params: dict = None):
+        '''
+        Return (response, tier, embedding). On a miss response is None, and
+        the question's embedding is returned so that store() can reuse it.
+        '''
+        if not self.cacheable(messages):
+            with self._lock:
+                self.bypassed += 1
+            return None, 'bypass', None
+        params_key = self._params_key(messages, params)
+        key = hash_key(normalize_messages(messages), params_key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= now:
+                self._evict(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                self.saved_s += entry.latency_s
+                record_cache('response', True)
+                return entry.response, 'exact', None
+
+            searchable = self.embed is not None and self._semantic_counts[params_key] > 0
+            if not searchable:
+                # store() embeds the question after the model has answered
+                self.misses += 1
+                record_cache('response', False)
+                return None, None, None
+
+        query = self._embedding(self._question(messages))
+        with self._lock:
+            if query is None:
+                self.misses += 1
+                record_cache('response', False)
+                return None, None, None
+            match = self._nearest(query, params_key, now)
+            if match is not None:
+                self._entries.move_to_end(match)
+                entry = self._entries[match]
+                self.semantic_hits += 1
+                self.saved_s += entry.latency_s
+                record_cache('response', True)
+                return entry.response, 'semantic', query
+            self.misses += 1
+        record_cache('response', False)
+        return None, None, query
+
+    def _nearest(self, query, params_key: str, now: float):
+        '''
+        Key of the most similar live entry with the same params, if it is
+        above the threshold. Call with the lock held.
+        '''
+        if self._vectors is None:
+            return None
+        scores = self._vectors @ query
+        # Free slots have no params, so they are never candidates either,
+        # whatever the threshold
+        scores[self._slot_params != params_key] = -np.inf
+        while True:
+            slot = int(np.argmax(scores))
+            key = self._slot_keys[slot]
+            if key is None or scores[slot] < self.threshold:
+                return None
+            if self._entries[key].expires_at > now:
+                return key
+            self._evict(key)
+            scores[slot] = -np.inf
+
+    def store(self, messages: list, params: dict, response: str, latency_s: float = 0.0, embedding=None):
+        '''
+        Cache a response and how long the model took to produce it.
+        '''
+        if not self.cacheable(messages) or not response:
+            return
+        params_key = self._params_key(messages, params)
+        key = hash_key(normalize_messages(messages), params_key)
+        if self.embed is not None and embedding is None:
+            embedding = self._embedding(self._question(messages))
+        with self._lock:
+            if key in self._entries:
+                self._evict(key)
+            while len(self._entries) >= self.max_entries:
+                self._evict(next(iter(self._entries)))
+            slot = self._free.pop()
+            if embedding is not None:
+                if self._vectors is None:
+                    self._vectors = np.zeros((self.max_entries, len(embedding)), dtype=np.float32)
+                self._vectors[slot] = embedding
+                self._slot_params[slot] = params_key
+                self._semantic_counts[params_key] += 1
+            self._slot_keys[slot] = key
+            self._entries[key] = CacheEntry(response, params_key, slot, time.monotonic() + self.ttl, latency_s)
+
+    def _evict(self, key: str):
+        '''
+        Drop an entry and free its slot. Call with the lock held.
+        '''
+        entry = self._entries.pop(key)
+        if self._slot_params[entry.slot]:
+            self._semantic_counts[entry.params_key] -= 1
+            if not self._semantic_counts[entry.params_key]:
+                del self._semantic_counts[entry.params_key]
+        self._slot_keys[entry.slot] = None
+        self._slot_params[entry.slot] = ''
+        if self._vectors is not None:
+            self._vectors[entry.slot] = 0.0
+        self._free.append(entry.slot)
+
+    def invoke(self, llm, messages: list, params: dict = None) -> str:
+        '''
+        Answer with llm.invoke(messages), going through the cache.
+        '''
+        params = params if params is not None else model_params(llm)
+        response, tier, embedding = self.lookup(messages, params)
+        if response is not None:
+            _logs.debug('Response cache %s hit', tier)
+            return response
+        start = time.perf_counter()
+        response = llm.invoke(messages).content
+        self.store(messages, params, response, time.perf_counter() - start, embedding)
+        return response
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            lookups = hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'exact_hits': self.exact_hits,
+                'semantic_hits': self.semantic_hits,
+                'misses': self.misses,
+                'bypassed': self.bypassed,
+                'hit_rate': hits / lookups if lookups else 0.0,
+                'saved_s': self.saved_s,
+            }
+
+
+def model_params(llm) -> dict:
+    '''
+    The params of a LangChain chat model that change its answers.
+    '''
+    return {
+        'model': getattr(llm, 'model_name', None) or getattr(llm, 'model', None),
+        'temperature': getattr(llm, 'temperature', None),
+    }
@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import deque
+
+from utils.logger import get_logger
+
+_logs = get_logger(__name__)
+
+_recent_turns = deque(maxlen=1000)
+_recent_lock = threading.Lock()
+
+
+class StreamTimer:
+    '''
+    Time one streamed chat turn: time to first token and tokens per second.
+
+    A turn can stream several responses, with tool calls run in between.
+    Call end_stream() after each one: tokens per second then only counts
+    the time spent streaming, not the gaps between responses.
+    '''
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = time.perf_counter()
+        self.first_token_at = None
+        self.tokens = 0
+        self.streaming_s = 0.0
+        self._stream_started_at = None
+        self._stream_tokens = 0
+
+    def token(self, n: int = 1):
+        '''
+        Record n streamed tokens (one text delta is counted as one token).
+        '''
+        now = time.perf_counter()
+        if self.first_token_at is None:
+            self.first_token_at = now
+        if self._stream_started_at is None:
+            self._stream_started_at = now
+        self._stream_tokens += n
+
+    def end_stream(self, tokens: int = None):
+        '''
+        End the current streamed response. Pass the output tokens reported
+        by the model for it as tokens when available; otherwise its deltas
+        are counted. A response that streamed no text is not counted.
+        '''
+        if self._stream_started_at is None:
+            return
+        self.streaming_s += time.perf_counter() - self._stream_started_at
+        self.tokens += tokens if tokens is not None else self._stream_tokens
+        self._stream_started_at = None
+        self._stream_tokens = 0
+
+    def finish(self, tokens: int = None) -> dict:
+        '''
+        Close the turn and log its metrics. tokens is passed to end_stream()
+        for a response still streaming.
+        '''
+        self.end_stream(tokens)
+        finished_at = time.perf_counter()
+        ttft = None if self.first_token_at is None else self.first_token_at - self.started_at
+        turn = {
+            'name': self.name,
+            'ttft_s': ttft,
+            'total_s': finished_at - self.started_at,
+            'tokens': self.tokens,
+            'tokens_per_s': self.tokens / self.streaming_s if self.streaming_s > 0 else None,
+        }
+        with _recent_lock:
+            _recent_turns.append(turn)
+        _logs.info('Stream metrics: %s', turn)
+        return turn
+
+
+def recent_turns(name: str = None) -> list:
+    '''
+    Metrics of the most recent streamed turns, optionally for one handler.
+    '''
+    with _recent_lock:
+        return [turn for turn in _recent_turns if name is None or turn['name'] == name]
@@ -0,0 +1,476 @@
+import atexit
+import bisect
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging.handlers import QueueListener
+
+from dotenv import load_dotenv
+
+from utils.logger import LOG_DIR, RotatingLogFileHandler, get_logger
+
+_logs = get_logger(__name__)
+
+load_dotenv()
+
+TRACING = os.getenv('TRACING', 'true').lower() in ('1', 'true', 'yes')
+TRACE_DIR = os.getenv('TRACE_DIR', LOG_DIR)
+TRACE_EXPORT = os.getenv('TRACE_EXPORT', 'true').lower() in ('1', 'true', 'yes')
+TRACE_STATS_HOST = os.getenv('TRACE_STATS_HOST', '127.0.0.1')
+TRACE_STATS_PORT = int(os.getenv('TRACE_STATS_PORT', '0'))
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS_MS = (0.1, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, float('inf'))
+# Numeric span attributes that are also summed per span name, e.g. token usage
+SUMMED_ATTRIBUTES = ('input_tokens', 'output_tokens', 'total_tokens')
+
+_current = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    '''
+    One timed operation in a trace. Spans opened while another is current
+    become its children; set() adds attributes, such as token usage, before
+    the span ends.
+    '''
+
+    __slots__ = ('name', 'kind', 'trace_id', 'span_id', 'parent_id', 'attributes',
+                 'start', 'duration_ms', 'status', 'error', '_started', '_token')
+
+    def __init__(self, name: str, kind: str, attributes: dict):
+        parent = _current.get()
+        self.name = name
+        self.kind = kind
+        self.span_id = f'{random.getrandbits(64):016x}'
+        if parent is None:
+            self.trace_id = f'{random.getrandbits(128):032x}'
+            self.parent_id = None
+        else:
+            self.trace_id = parent.trace_id
+            self.parent_id = parent.span_id
+        self.attributes = attributes
+        self.status = 'ok'
+        self.error = None
+        self.duration_ms = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def fail(self, error: str):
+        '''
+        Mark the span as failed for an error that was handled, not raised.
+        '''
+        self.status = 'error'
+        self.error = error
+
+    def __enter__(self):
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+        if exc is not None:
+            self.status = 'error'
+            self.error = f'{exc_type.__name__}: {exc}'
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # Exited in another context than it was entered in, as a span
+            # open across a yield in a generator Gradio resumes in a fresh
+            # context: make the span's parent current again
+            previous = self._token.old_value
+            _current.set(None if previous is contextvars.Token.MISSING else previous)
+        _tracer.finish(self)
+        return False
+
+    def to_dict(self) -> dict:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'kind': self.kind,
+            'start': self.start,
+            'duration_ms': self.duration_ms,
+            'status': self.status,
+            'error': self.error,
+            'attributes': self.attributes,
+        }
+
+
+class NoopSpan:
+    '''
+    Stands in for Span when tracing is off.
+    '''
+
+    def set(self, **attributes):
+        pass
+
+    def fail(self, error: str):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_noop_span = NoopSpan()
+
+
+class Histogram:
+    '''
+    Latency histogram with fixed buckets, plus error counts and attribute sums.
+    '''
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.sums = {}
+
+    def observe(self, span: Span):
+        self.counts[bisect.bisect_left(BUCKETS_MS, span.duration_ms)] += 1
+        self.count += 1
+        self.total_ms += span.duration_ms
+        self.max_ms = max(self.max_ms, span.duration_ms)
+        if span.status == 'error':
+            self.errors += 1
+        for name in SUMMED_ATTRIBUTES:
+            value = span.attributes.get(name)
+            if value is not None:
+                self.sums[name] = self.sums.get(name, 0) + value
+
+    def quantile(self, q: float) -> float:
+        '''
+        Estimate of the q quantile, interpolated within its bucket.
+        '''
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                low = BUCKETS_MS[i - 1] if i else 0.0
+                high = min(BUCKETS_MS[i], self.max_ms)
+                return low + (high - low) * (rank - seen) / count
+            seen += count
+        return self.max_ms
+
+    def snapshot(self) -> dict:
+        snapshot = {
+            'count': self.count,
+            'errors': self.errors,
+            'mean_ms': round(self.total_ms / self.count, 3) if self.count else None,
+            'p50_ms': round(self.quantile(0.50), 3) if self.count else None,
+            'p95_ms': round(self.quantile(0.95), 3) if self.count else None,
+            'p99_ms': round(self.quantile(0.99), 3) if self.count else None,
+            'max_ms': round(self.max_ms, 3),
+            'buckets': {str(bound): count for bound, count in zip(BUCKETS_MS, self.counts) if count},
+        }
+        snapshot.update(self.sums)
+        return snapshot
+
+
+class JsonLinesFormatter(logging.Formatter):
+    '''
+    Formats the finished spans put on the export queue as JSON lines.
+    '''
+
+    def format(self, span):
+        return json.dumps(span.to_dict(), default=str)
+
+
+class Tracer:
+    '''
+    Collects finished spans into per-(kind, name) histograms and exports
+    them as JSON lines.
+
+    Export goes through the same machinery as utils.logger: the span is put
+    on a queue, and a QueueListener thread serializes it and writes it to a
+    rotating spans file, so finishing a span does no I/O on the calling thread.
+    Spans go on the queue as they are, without building a LogRecord.
+    '''
+
+    def __init__(self, trace_dir: str = TRACE_DIR, export: bool = TRACE_EXPORT):
+        self.trace_dir = trace_dir
+        self.export = export
+        self.path = None
+        self._histograms = {}
+        self._caches = {}
+        self._lock = threading.Lock()
+        self._queue = None
+        self._listener = None
+
+    def _start_export(self):
+        '''
+        Start the exporter thread and open the spans file on first use.
+        '''
+        if not os.path.exists(self.trace_dir):
+            os.makedirs(self.trace_dir)
+        self.path = os.path.join(self.trace_dir, f'spans_{ datetime.now().strftime("%Y%m%d_%H%M%S") }.jsonl')
+        handler = RotatingLogFileHandler(self.path)
+        handler.setFormatter(JsonLinesFormatter())
+        self._queue = queue.SimpleQueue()
+        self._listener = QueueListener(self._queue, handler)
+        self._listener.start()
+        atexit.register(self._listener.stop)
+
+    def finish(self, span: Span):
+        key = (span.kind, span.name)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(span)
+            if self.export and self._queue is None:
+                self._start_export()
+        if self.export:
+            self._queue.put(span)
+
+    def record_cache(self, name: str, hit: bool):
+        with self._lock:
+            counts = self._caches.get(name)
+            if counts is None:
+                counts = self._caches[name] = [0, 0]
+            counts[0 if hit else 1] += 1
+
+    def stats(self) -> dict:
+        '''
+        Latency histograms per span kind and name, and cache hit rates.
+        '''
+        with self._lock:
+            spans = {}
+            for (kind, name), histogram in sorted(self._histograms.items()):
+                spans.setdefault(kind, {})[name] = histogram.snapshot()
+            caches = {
+                name: {'hits': hits, 'misses': misses, 'hit_rate': hits / (hits + misses)}
+                for name, (hits, misses) in sorted(self._caches.items())
+            }
+        return {'spans': spans, 'caches': caches}
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+            self._caches = {}
+
+    def flush(self):
+        '''
+        Write out the queued spans. Tracing goes on afterwards.
+        '''
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener.start()
+
+
+_tracer = Tracer()
+
+
+def span(name: str, kind: str = 'internal', **attributes):
+    '''
+    Context manager timing one operation as a child of the current span:
+
+        with span('responses.create', kind='llm', model=model) as s:
+            response = client.responses.create(...)
+            s.set(output_tokens=response.usage.output_tokens)
+
+    Kinds used here: turn, llm, tool, http, cache and internal.
+    '''
+    if not TRACING:
+        return _noop_span
+    return Span(name, kind, attributes)
+
+
+def _step(current, method, *args):
+    '''
+    Call method(*args) with current as the current span, and return its
+    result and the innermost span open when it returned.
+    '''
+    token = _current.set(current)
+    try:
+        return method(*args), _current.get()
+    finally:
+        _current.reset(token)
+
+
+async def _astep(current, method, *args):
+    token = _current.set(current)
+    try:
+        return await method(*args), _current.get()
+    finally:
+        _current.reset(token)
+
+
+def traced(name: str = None, kind: str = 'internal'):
+    '''
+    Decorator running a function in a span. Coroutine functions and
+    generators, sync or async, are timed until they finish.
+
+    A generator's span is only current while the generator runs. Each time
+    it is resumed, the span that was innermost at its last yield is made
+    current again, so spans opened after a yield keep their parent even
+    when the caller resumes it in another context, as Gradio does with
+    streaming handlers.
+    '''
+    def decorator(function):
+        span_name = name or function.__name__
+        if inspect.isasyncgenfunction(function):
+            @functools.wraps(function)
+            async def async_gen_wrapper(*args, **kwargs):
+                function_span = span(span_name, kind)
+                _, current = _step(_current.get(), function_span.__enter__)
+                exc_info = (None, None, None)
+                try:
+                    generator = function(*args, **kwargs)
+                    method, value = generator.asend, None
+                    while True:
+                        try:
+                            item, current = await _astep(current, method, value)
+                        except StopAsyncIteration:
+                            return
+                        try:
+                            value, method = (yield item), generator.asend
+                        except GeneratorExit:
+                            await _astep(current, generator.aclose)
+                            raise
+                        except BaseException as e:
+                            value, method = e, generator.athrow
+                except BaseException as e:
+                    exc_info = (type(e), e, e.__traceback__)
+                    raise
+                finally:
+                    _step(current, function_span.__exit__, *exc_info)
+            return async_gen_wrapper
+
+        if inspect.isgeneratorfunction(function):
+            @functools.wraps(function)
+            def gen_wrapper(*args, **kwargs):
+                function_span = span(span_name, kind)
+                _, current = _step(_current.get(), function_span.__enter__)
+                exc_info = (None, None, None)
+                try:
+                    generator = function(*args, **kwargs)
+                    method, value = generator.send, None
+                    while True:
+                        try:
+                            item, current = _step(current, method, value)
+                        except StopIteration as stop:
+                            return stop.value
+                        try:
+                            value, method = (yield item), generator.send
+                        except GeneratorExit:
+                            _step(current, generator.close)
+                            raise
+                        except BaseException as e:
+                            value, method = e, generator.throw
+                except BaseException as e:
+                    exc_info = (type(e), e, e.__traceback__)
+                    raise
+                finally:
+                    _step(current, function_span.__exit__, *exc_info)
+            return gen_wrapper
+
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name, kind):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(span_name, kind):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_span():
+    '''
+    The innermost open span, or a no-op span outside any.
+    '''
+    return _current.get() or _noop_span
+
+
+def record_cache(name: str, hit: bool):
+    '''
+    Count a lookup in the named cache and mark it on the current span.
+    '''
+    if not TRACING:
+        return
+    _tracer.record_cache(name, hit)
+    current_span().set(**{f'cache.{name}': 'hit' if hit else 'miss'})
+
+
+def token_usage(usage) -> dict:
+    '''
+    input_tokens/output_tokens/total_tokens from an OpenAI usage object or
+    a LangChain usage_metadata dict, for span attributes.
+    '''
+    if usage is None:
+        return {}
+    if not isinstance(usage, dict):
+        usage = {name: getattr(usage, name, None) for name in SUMMED_ATTRIBUTES}
+    return {name: usage[name] for name in SUMMED_ATTRIBUTES if usage.get(name) is not None}
+
+
+def in_context(function):
+    '''
+    Bind function to a copy of the current context, so that spans it opens
+    in a worker thread are children of the current span:
+
+        executor.submit(in_context(tool.invoke), args)
+
+    A context can only be entered by one thread at a time, so call this once
+    per submitted task.
+    '''
+    return functools.partial(contextvars.copy_context().run, function)
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def stats() -> dict:
+    return _tracer.stats()
+
+
+class StatsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip('/') not in ('', '/stats'):
+            self.send_error(404)
+            return
+        body = json.dumps(stats(), indent=2).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        _logs.debug('Stats request: ' + format, *args)
+
+
+def serve_stats(port: int = TRACE_STATS_PORT, host: str = TRACE_STATS_HOST):
+    '''
+    Serve stats() as JSON at http://host:port/stats from a daemon thread.
+    Returns the server, or None when port is 0 (the TRACE_STATS_PORT default).
+    '''
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), StatsHandler)
+    threading.Thread(target=server.serve_forever, name='trace-stats', daemon=True).start()
+    _logs.info('Serving trace stats at http://%s:%d/stats', host, server.server_port)
+    return server